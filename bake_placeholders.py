@@ -0,0 +1,40 @@
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+def bake_placeholders():
+    """
+    Создание на диске заглушек для всех изображений сюжета, файлов которых нет
+    (фоны по умолчанию и изображения персонажей)
+    """
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    from engine.game import Game
+    from engine.placeholders import bake_placeholder
+    from story.story import load_story
+
+    # Сюжет только регистрирует пути к изображениям, сами изображения не загружаются
+    game = Game()
+    load_story(game)
+
+    created = 0
+    for (category, name), image_path in game.asset_paths.items():
+        try:
+            if bake_placeholder(category, image_path):
+                print(f"Создана заглушка: {image_path}")
+                created += 1
+        except Exception as e:
+            print(f"Ошибка при создании заглушки {image_path}: {e}")
+
+    print(f"Создано заглушек: {created}")
+    if game.prefetcher is not None:
+        game.prefetcher.stop()
+    pygame.quit()
+
+if __name__ == "__main__":
+    bake_placeholders()
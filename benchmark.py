@@ -0,0 +1,731 @@
+"""
+Бенчмарки движка NovelEngine.
+
+Запускаются без окна (SDL_VIDEODRIVER=dummy):
+    python benchmark.py
+    python benchmark.py --suite micro --json results.json
+    python benchmark.py --suite micro --baseline results.json
+    python benchmark.py --suite replay --json replays.json
+    python benchmark.py --suite memory
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+# Допустимая загрузка процессора в режиме простоя (секунд CPU за минуту)
+IDLE_CPU_TARGET = 1.0
+
+# Допустимое время раскладки строки из 2000 символов (мс)
+TEXT_LAYOUT_TARGET_MS = 1.0
+TEXT_LAYOUT_LENGTH = 2000
+
+# Размеры экрана для измерения стоимости кадра
+DISPLAY_SIZES = [(800, 600), (1600, 1200), (1920, 1080), (3840, 2160)]
+
+# Размеры, до которых масштабируется фон при сравнении однопоточного и многопоточного масштабирования
+PARALLEL_SCALE_SIZES = [(1920, 1080), (3840, 2160)]
+
+# Размеры игровой поверхности для замера масштабирования фона
+BACKGROUND_SIZES = [(800, 600), (1280, 720), (1920, 1080), (2560, 1440)]
+
+# Масштабы персонажа (None - масштабирование по высоте CHARACTER_HEIGHT)
+CHARACTER_SCALES = [None, 0.5, 1.0, 1.5]
+
+# Количество вариантов в меню выбора
+CHOICE_COUNTS = [4, 16, 64]
+
+# Глубина деревьев условий
+CONDITION_DEPTHS = [2, 4, 6]
+
+# Количество сцен синтетического сюжета для сравнения хранилищ сцен
+SCENE_STORE_SIZE = 100_000
+
+# Персонажи и фоны синтетического сюжета
+SYNTHETIC_CHARACTERS = ("dr_carter", "lily", "ryan")
+SYNTHETIC_BACKGROUNDS = ("bg_lab", "bg_manufacture", "bg_music_class", "bg_residental_area")
+
+# Количества сцен синтетического сюжета для замера памяти сцен
+SCENE_MEMORY_SIZES = [10_000, 100_000, 1_000_000]
+
+# Директория с записями ввода для сквозных замеров (python main.py --record ...)
+REPLAYS_PATH = "replays"
+
+# Допустимое замедление относительно базовых результатов (доля)
+BASELINE_TOLERANCE = 0.15
+
+
+def create_game():
+    """
+    Создает экземпляр игры с загруженным сюжетом
+
+    :return: Экземпляр класса Game
+    """
+    from engine.game import Game
+    from story.story import load_story
+
+    game = Game()
+    load_story(game)
+    game.compile_story()
+    return game
+
+
+def run_game_for(game, seconds):
+    """
+    Запускает игровой цикл на заданное время
+
+    :param game: Экземпляр класса Game
+    :param seconds: Время работы в секундах
+    """
+    pygame.time.set_timer(pygame.QUIT, int(seconds * 1000), loops=1)
+    try:
+        game.run()
+    except SystemExit:
+        pass
+
+
+def bench_idle(seconds, idle_mode=True):
+    """
+    Измеряет загрузку процессора, пока на экране статичный текст
+
+    :param seconds: Длительность измерения в секундах
+    :param idle_mode: Включен ли режим простоя
+    :return: Секунды процессорного времени за минуту работы
+    """
+    game = create_game()
+    game.idle_mode = idle_mode
+
+    # Измеряем после первого кадра, чтобы не учитывать стоимость запуска
+    start = {}
+
+    def start_measure():
+        start["cpu"] = time.process_time()
+        start["wall"] = time.perf_counter()
+
+    game.schedule(500, start_measure)
+    run_game_for(game, seconds + 0.5)
+    cpu_time = time.process_time() - start["cpu"]
+    wall_time = time.perf_counter() - start["wall"]
+
+    return cpu_time / wall_time * 60
+
+
+def measure(function, repeats):
+    """
+    Измеряет среднее время вызова функции
+
+    :param function: Функция без аргументов
+    :param repeats: Количество повторов
+    :return: Среднее время вызова в миллисекундах
+    """
+    function()  # Прогрев
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def measure_best(function, repeats, rounds=5, setup=None):
+    """
+    Измеряет время вызова быстрой функции: лучшее среднее из нескольких серий,
+    что меньше зависит от посторонней нагрузки на машину
+
+    :param function: Функция без аргументов
+    :param repeats: Количество вызовов в серии
+    :param rounds: Количество серий
+    :param setup: Функция без аргументов, вызываемая перед каждым вызовом
+                  (например, сброс кэша); её время не учитывается
+    :return: Время одного вызова в миллисекундах
+    """
+    function()  # Прогрев
+    best = None
+    for _ in range(rounds):
+        elapsed = 0.0
+        for _ in range(repeats):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            function()
+            elapsed += time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / repeats * 1000
+
+
+def make_condition(depth, index=0):
+    """
+    Строит дерево условий заданной глубины с чередованием "and" и "or"
+
+    :param depth: Глубина дерева
+    :param index: Номер узла (для имен переменных)
+    :return: Словарь условия
+    """
+    condition = {"variable": f"flag_{depth}_{index}", "equals": True}
+    if depth > 1:
+        operator = "and" if depth % 2 else "or"
+        condition[operator] = [make_condition(depth - 1, index * 2 + i) for i in range(2)]
+    return condition
+
+
+def bench_hot_functions():
+    """
+    Микробенчмарки часто вызываемых функций Game. Для функций с кэшем
+    измеряется вызов с попаданием (warm) и с пустым кэшем (cold).
+
+    :return: Словарь {название_случая: время_в_мс}
+    """
+    from engine.config import STORY_PATH
+    from engine.scene import Choice, Scene
+    from engine.story_loader import read_story
+
+    game = create_game()
+    results = {}
+
+    # Текстовое окно: короткий, длинный и неразрывный текст
+    texts = {
+        "short": "Привет!",
+        "long": "Съешь же ещё этих мягких французских булок, да выпей чаю. " * 40,
+        "unbroken": "https://example.com/" + "a" * 2000,
+    }
+    for name, text in texts.items():
+        scene = Scene(text, character_name="Доктор Картер")
+        results[f"draw_text_box.{name}.warm"] = measure_best(lambda: game.draw_text_box(scene), 200)
+        results[f"draw_text_box.{name}.cold"] = measure_best(lambda: game.draw_text_box(scene), 20,
+                                                             setup=game.text_layout_cache.cache.clear)
+
+    # Персонаж в разных масштабах
+    game.load_character("dr_carter", game.pending_characters.pop("dr_carter"))
+    for scale in CHARACTER_SCALES:
+        name = f"draw_character.{scale or 'height'}"
+        draw = lambda: game.draw_character("dr_carter", "center", scale)
+        results[f"{name}.warm"] = measure_best(draw, 200)
+        results[f"{name}.cold"] = measure_best(draw, 5, setup=game.sprite_cache.cache.clear)
+
+    # Масштабирование фона под разные размеры игровой поверхности
+    game.load_background("bg_lab", game.pending_backgrounds.pop("bg_lab"))
+    original = game.original_backgrounds["bg_lab"]
+    game_surface = game.game_surface
+    for width, height in BACKGROUND_SIZES:
+        game.game_surface = pygame.Surface((width, height))
+        results[f"scale_background.{width}x{height}"] = measure_best(
+            lambda: game.scale_background(original), 3, rounds=7)
+    game.game_surface = game_surface
+
+    # Меню выбора из N вариантов с условиями (половина условий выполнена)
+    for count in CHOICE_COUNTS:
+        choices = []
+        targets = (0,) * count
+        for i in range(count):
+            game.set_variable(f"choice_{i}", i % 2 == 0)
+            choices.append(Choice(f"Вариант {i + 1}", "start", {"variable": f"choice_{i}", "equals": True}))
+
+        def reset_menu():
+            # Холодный случай - первая отрисовка: без меню, готовых кнопок и раскладок текста
+            game.choice_menu = None
+            game.ui.invalidate()
+            game.text_layout_cache.invalidate()
+
+        results[f"draw_choices.{count}.warm"] = measure_best(lambda: game.draw_choices(choices, targets), 20, rounds=10)
+        results[f"draw_choices.{count}.cold"] = measure_best(lambda: game.draw_choices(choices, targets), 20, rounds=10,
+                                                             setup=reset_menu)
+    game.choice_menu = None
+
+    # Проверка вложенных условий
+    for depth in CONDITION_DEPTHS:
+        condition = make_condition(depth)
+        results[f"check_condition.depth{depth}"] = measure_best(lambda: game.check_condition(condition), 2000)
+
+    # Переход между сценами (с действиями при входе)
+    scene_ids = ["music_class", "manufacturing", "residential", "start"]
+    state = {"index": 0}
+
+    def go_to_next_scene():
+        state["index"] = (state["index"] + 1) % len(scene_ids)
+        game.go_to_scene(scene_ids[state["index"]])
+
+    results["go_to_scene"] = measure_best(go_to_next_scene, 2000)
+
+    # Загрузка сюжета: компиляция файлов и загрузка из кэша, построение графа переходов
+    read_story(STORY_PATH)
+    results["read_story.compile"] = measure_best(lambda: read_story(STORY_PATH, use_cache=False), 50)
+    results["read_story.cached"] = measure_best(lambda: read_story(STORY_PATH), 50)
+    results["compile_story"] = measure_best(game.compile_story, 200)
+
+    if game.prefetcher is not None:
+        game.prefetcher.stop()
+    pygame.quit()
+    return results
+
+
+def bench_replays():
+    """
+    Воспроизводит записи ввода из REPLAYS_PATH с максимальной скоростью,
+    каждую в отдельном процессе (чтобы пик памяти не зависел от других замеров)
+
+    :return: Словарь {имя_записи: отчет о воспроизведении}
+    """
+    reports = {}
+    if not os.path.isdir(REPLAYS_PATH):
+        return reports
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy")
+    with tempfile.TemporaryDirectory() as directory:
+        for file_name in sorted(os.listdir(REPLAYS_PATH)):
+            if not file_name.endswith(".nvr"):
+                continue
+            report_path = os.path.join(directory, "report.json")
+            command = [sys.executable, "main.py", "--replay", os.path.join(REPLAYS_PATH, file_name),
+                       "--replay-report", report_path]
+            completed = subprocess.run(command, env=env, capture_output=True, text=True)
+            if not os.path.exists(report_path):
+                print(f"Ошибка при воспроизведении {file_name}:\n{completed.stdout}{completed.stderr}")
+                continue
+            with open(report_path, encoding="utf-8") as file:
+                reports[file_name[:-len(".nvr")]] = json.load(file)
+            os.remove(report_path)
+    return reports
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """
+    Сравнивает результаты с базовыми и выводит изменения
+
+    :param results: Словарь {название: значение} (меньше - лучше)
+    :param baseline: Словарь {название: значение} из сохраненного файла
+    :param tolerance: Допустимое замедление (доля)
+    :return: Список названий случаев, замедлившихся сильнее допустимого
+    """
+    regressions = []
+    print(f"Сравнение с базовыми результатами (допустимое замедление {tolerance:.0%}):")
+    for name, value in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"  {name}: {value:.4f} (нет в базовых результатах)")
+            continue
+        change = value / base - 1
+        mark = ""
+        if change > tolerance:
+            mark = "  ✗"
+            regressions.append(name)
+        print(f"  {name}: {value:.4f} (база {base:.4f}, {change:+.0%}){mark}")
+    return regressions
+
+
+def make_synthetic_scene(index, count):
+    """
+    Создает сцену синтетического сюжета в формате файла сюжета: цепочки из 10 сцен
+    с повторяющимися персонажами и фонами, первая сцена цепочки устанавливает переменную,
+    последняя - выбор из двух вариантов
+
+    :param index: Номер сцены
+    :param count: Количество сцен в сюжете
+    :return: Словарь полей сцены
+    """
+    chain = index // 10
+    character = SYNTHETIC_CHARACTERS[chain % len(SYNTHETIC_CHARACTERS)]
+    scene = {
+        "text": f"Реплика {index}: персонаж рассказывает о лаборатории и её проектах.",
+        "character": character,
+        "background": SYNTHETIC_BACKGROUNDS[chain % len(SYNTHETIC_BACKGROUNDS)],
+        "character_position": "center",
+        "character_name": character.capitalize(),
+        "scene_id": f"scene_{index}",
+    }
+    if index % 10 == 0:
+        scene["on_enter"] = [{"action": "set_variable", "variable": "visited", "value": True}]
+    if index % 10 == 9:
+        scene["choices"] = [
+            {"text": "Продолжить", "next_scene": f"scene_{(index + 1) % count}"},
+            {"text": "Вернуться", "next_scene": f"scene_{index - 9}",
+             "condition": {"variable": "visited", "equals": True}},
+        ]
+    else:
+        scene["next_scene_id"] = f"scene_{index + 1}"
+    return scene
+
+
+def load_synthetic_story(count, append, chapter_size=10_000):
+    """
+    Загружает синтетический сюжет тем же путем, что и файлы сюжета:
+    главы в JSON компилируются и превращаются в сцены
+
+    :param count: Количество сцен
+    :param append: Функция, которой передается каждая сцена (объект Scene)
+    :param chapter_size: Количество сцен в главе
+    """
+    from engine.scene import Scene, SceneInterner
+    from engine.story_loader import compile_chapter
+
+    interner = SceneInterner()
+    for start in range(0, count, chapter_size):
+        chapter = {"scenes": [make_synthetic_scene(index, count)
+                              for index in range(start, min(count, start + chapter_size))]}
+        content = json.dumps(chapter, ensure_ascii=False).encode("utf-8")
+        del chapter
+        records, errors = compile_chapter("synthetic", content)
+        for record in records:
+            append(Scene(*record, interner=interner))
+
+
+def bench_scene_memory(sizes=SCENE_MEMORY_SIZES):
+    """
+    Измеряет память Python, которую занимают сцены сюжета (вместе с общими объектами)
+
+    :param sizes: Количества сцен синтетического сюжета
+    :return: Словарь {количество_сцен: байт на сцену}
+    """
+    results = {}
+    for count in sizes:
+        gc.collect()
+        tracemalloc.start()
+        scenes = []
+        load_synthetic_story(count, scenes.append)
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results[count] = used / count
+        del scenes
+    return results
+
+
+def write_synthetic_story(directory, count, chapter_size=10_000):
+    """
+    Записывает синтетический сюжет в файлы сюжета: главный файл и главы
+
+    :param directory: Директория для файлов сюжета
+    :param count: Количество сцен
+    :param chapter_size: Количество сцен в главе
+    :return: Путь к главному файлу сюжета
+    """
+    chapters = []
+    for start in range(0, count, chapter_size):
+        name = f"chapter_{start // chapter_size}.json"
+        scenes = [make_synthetic_scene(index, count) for index in range(start, min(count, start + chapter_size))]
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as file:
+            json.dump({"scenes": scenes}, file, ensure_ascii=False)
+        chapters.append(name)
+
+    path = os.path.join(directory, "story.json")
+    manifest = {
+        "backgrounds": {name: f"{name}.png" for name in SYNTHETIC_BACKGROUNDS},
+        "characters": {name: f"{name}.png" for name in SYNTHETIC_CHARACTERS},
+        "variables": {"visited": False},
+        "chapters": chapters,
+    }
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file)
+    return path
+
+
+def bench_scene_stores(count=SCENE_STORE_SIZE, lookups=2000):
+    """
+    Сравнивает хранение сцен синтетического сюжета в списке и в базе SQLite
+    при загрузке тем же путем, что и в игре (load_story_file и compile_story):
+    память Python на сцену после загрузки и в пике загрузки (вместе с графом сюжета)
+    и время перехода к случайной сцене по ID. Для базы замеряются первый запуск
+    (сборка базы) и следующий (база уже собрана).
+
+    :param count: Количество сцен
+    :param lookups: Количество переходов в серии замера
+    :return: Словарь {название_случая: значение}
+    """
+    from engine.game import Game
+    from engine.story_loader import load_story_file
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_synthetic_story(directory, count)
+        for name, kind in (("memory", "memory"), ("sqlite.build", "sqlite"), ("sqlite.reuse", "sqlite")):
+            game = Game()
+            gc.collect()
+            tracemalloc.start()
+            load_story_file(game, path, kind)
+            game.compile_story()
+            gc.collect()
+            used, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results[f"{name}.bytes_per_scene"] = used / count
+            results[f"{name}.peak_bytes_per_scene"] = peak / count
+
+            # Переходы к случайным сценам (у базы - в основном промахи кэша)
+            scene_ids = [f"scene_{random.randrange(count)}" for _ in range(lookups)]
+            state = {"index": 0}
+
+            def go_to_random_scene():
+                state["index"] = (state["index"] + 1) % lookups
+                game.go_to_scene(scene_ids[state["index"]])
+
+            results[f"{name}.go_to_scene_ms"] = measure_best(go_to_random_scene, lookups, rounds=3)
+            if game.scene_store is not None:
+                results["sqlite.file_bytes_per_scene"] = os.path.getsize(game.scene_store.path) / count
+                game.scene_store.close()
+            if game.prefetcher is not None:
+                game.prefetcher.stop()
+            del game
+    pygame.quit()
+    return results
+
+
+def bench_text_layout(repeats=200):
+    """
+    Измеряет время раскладки длинной строки без отрисовки
+
+    :param repeats: Количество повторов
+    :return: Словарь {название_случая: время_в_мс}
+    """
+    from engine.config import FONT_SIZE, WINDOW_WIDTH, BUTTON_WIDTH, BUTTON_PADDING
+    from engine.text_layout import FontMetrics, wrap_text
+
+    pygame.init()
+    font = pygame.font.Font(None, FONT_SIZE)
+    metrics = FontMetrics(font)
+    width = WINDOW_WIDTH - 2 * (BUTTON_WIDTH + 2 * BUTTON_PADDING)
+
+    cases = {
+        "слова": ("Съешь же ещё этих мягких французских булок. " * 50)[:TEXT_LAYOUT_LENGTH],
+        "без пробелов": ("https://example.com/" + "a" * TEXT_LAYOUT_LENGTH)[:TEXT_LAYOUT_LENGTH],
+        "CJK": ("日本語のテキストはスペースなしで書かれます。" * 100)[:TEXT_LAYOUT_LENGTH],
+    }
+    return {name: measure(lambda: wrap_text(font, text, width, metrics), repeats)
+            for name, text in cases.items()}
+
+
+def bench_display_sizes(fixed_resolution, repeats=20):
+    """
+    Измеряет время полной перерисовки кадра при разных размерах экрана
+
+    :param fixed_resolution: Собирать кадр в фиксированном логическом разрешении
+    :param repeats: Количество повторов
+    :return: Словарь {размер_экрана: время_в_мс}
+    """
+    game = create_game()
+    game.fixed_resolution = fixed_resolution
+
+    def frame():
+        game.invalidate()
+        game.render_frame()
+        game.present_frame()
+
+    results = {}
+    for size in DISPLAY_SIZES:
+        game.screen = pygame.display.set_mode(size)
+        game.resize_display(*size)
+        results[size] = measure(frame, repeats)
+    pygame.quit()
+    return results
+
+
+def bench_asset_loading():
+    """
+    Сравнивает загрузку всех изображений из PNG-файлов и из архива с готовыми пикселями
+
+    :return: Словарь {способ: время_в_мс} и количество изображений
+    """
+    from engine.archive import AssetArchive, write_archive
+    from engine.assets import prepare_surface, scale_to_fill
+    from engine.config import ASSET_VARIANT_HEIGHTS, WINDOW_HEIGHT, WINDOW_WIDTH
+    from pack_assets import find_images
+
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    paths = find_images("Assets", None)
+
+    def load_png():
+        for path in paths:
+            prepare_surface(pygame.image.load(path))
+
+    with tempfile.TemporaryDirectory() as directory:
+        archive_path = os.path.join(directory, "assets.pak")
+        write_archive(archive_path, paths, lambda path: ASSET_VARIANT_HEIGHTS)
+
+        def load_archive():
+            archive = AssetArchive(archive_path)
+            for path in paths:
+                archive.load(path)
+
+        # Масштабирование под экран из исходного размера и из ближайшего варианта
+        archive = AssetArchive(archive_path)
+        size = (WINDOW_WIDTH, WINDOW_HEIGHT)
+
+        def scale_original():
+            for path in paths:
+                scale_to_fill(archive.load(path), size)
+
+        def scale_variant():
+            for path in paths:
+                scale_to_fill(archive.load(path, size), size)
+
+        results = {
+            "PNG": measure(load_png, 3),
+            "архив": measure(load_archive, 3),
+            "архив + масштабирование из исходного размера": measure(scale_original, 3),
+            "архив + масштабирование из ближайшего варианта": measure(scale_variant, 3),
+        }
+    pygame.quit()
+    return results, len(paths)
+
+
+def bench_parallel_scaling():
+    """
+    Сравнивает однопоточное pygame.transform.smoothscale и масштабирование
+    по частям в пуле потоков: кадр размером с окно (фон из ресурсов игры)
+    увеличивается до размеров экрана
+
+    :return: Словарь {размер: (однопоточное_мс, многопоточное_мс)} и количество потоков
+    """
+    from engine.config import BACKGROUNDS_PATH, WINDOW_HEIGHT, WINDOW_WIDTH
+    from engine.scaling import get_thread_count, smoothscale
+
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    background = pygame.image.load(os.path.join(BACKGROUNDS_PATH, "Laboratory.png")).convert()
+    background = pygame.transform.smoothscale(background, (WINDOW_WIDTH, WINDOW_HEIGHT))
+
+    results = {}
+    for size in PARALLEL_SCALE_SIZES:
+        results[size] = (measure(lambda: pygame.transform.smoothscale(background, size), 5),
+                         measure(lambda: smoothscale(background, size), 5))
+    pygame.quit()
+    return results, get_thread_count()
+
+
+def main():
+    """
+    Запуск бенчмарков
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарки NovelEngine")
+    parser.add_argument("--idle-seconds", type=float, default=5.0,
+                        help="Длительность измерения режима простоя")
+    parser.add_argument("--suite", choices=["all", "micro", "replay", "memory"], default="all",
+                        help="Набор бенчмарков: все, только микробенчмарки функций Game, "
+                             "только воспроизведение записей ввода или только память сцен")
+    parser.add_argument("--json", metavar="PATH",
+                        help="Сохранить результаты в JSON-файл (его можно использовать как базовый)")
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="Сравнить результаты с сохраненными базовыми результатами")
+    parser.add_argument("--tolerance", type=float, default=BASELINE_TOLERANCE,
+                        help="Допустимое замедление относительно базовых результатов (доля)")
+    args = parser.parse_args()
+
+    # Пути к файлам результатов указываются относительно текущей директории
+    json_path = os.path.abspath(args.json) if args.json else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    failed = False
+    results = {}  # Название случая -> значение (меньше - лучше), для JSON и сравнения
+
+    if args.suite == "all":
+        busy = bench_idle(args.idle_seconds, idle_mode=False)
+        idle = bench_idle(args.idle_seconds, idle_mode=True)
+        results["idle.busy_cpu_s_per_min"] = busy
+        results["idle.idle_cpu_s_per_min"] = idle
+        print(f"Простой без режима ожидания: {busy:.2f} с CPU/мин")
+        print(f"Простой в режиме ожидания:   {idle:.2f} с CPU/мин (цель <= {IDLE_CPU_TARGET:.2f})")
+        if idle > IDLE_CPU_TARGET:
+            print("  ✗ Превышена цель по загрузке процессора в режиме простоя")
+            failed = True
+
+        for name, elapsed in bench_text_layout().items():
+            results[f"text_layout.{name}"] = elapsed
+            print(f"Раскладка {TEXT_LAYOUT_LENGTH} символов ({name}): {elapsed:.3f} мс "
+                  f"(цель <= {TEXT_LAYOUT_TARGET_MS:.3f})")
+            if elapsed > TEXT_LAYOUT_TARGET_MS:
+                print("  ✗ Превышена цель по времени раскладки текста")
+                failed = True
+
+        loading, count = bench_asset_loading()
+        for name, elapsed in loading.items():
+            results[f"asset_loading.{name}"] = elapsed
+            print(f"Загрузка {count} изображений ({name}): {elapsed:.1f} мс")
+
+        scaling, threads = bench_parallel_scaling()
+        for (width, height), (single, parallel) in scaling.items():
+            results[f"parallel_scaling.{width}x{height}.single"] = single
+            results[f"parallel_scaling.{width}x{height}.pool"] = parallel
+            print(f"Масштабирование фона до {width}x{height}: {single:.1f} мс в одном потоке, "
+                  f"{parallel:.1f} мс в {threads} потоках")
+
+        for name, value in bench_scene_stores().items():
+            results[f"scene_store.{name}"] = value
+        print(f"Хранилища сцен ({SCENE_STORE_SIZE} сцен, память Python на сцену после загрузки / в пике):")
+        for name, title in (("memory", "список"), ("sqlite.build", "SQLite, сборка базы"),
+                            ("sqlite.reuse", "SQLite, готовая база")):
+            print(f"  {title}: {results[f'scene_store.{name}.bytes_per_scene']:.0f} / "
+                  f"{results[f'scene_store.{name}.peak_bytes_per_scene']:.0f} Б, "
+                  f"переход {results[f'scene_store.{name}.go_to_scene_ms'] * 1000:.1f} мкс")
+        print(f"  файл базы: {results['scene_store.sqlite.file_bytes_per_scene']:.0f} Б/сцену")
+
+        for fixed_resolution in (False, True):
+            mode = "логическое разрешение" if fixed_resolution else "разрешение окна"
+            for (width, height), elapsed in bench_display_sizes(fixed_resolution).items():
+                results[f"full_frame.{'logical' if fixed_resolution else 'window'}.{width}x{height}"] = elapsed
+                print(f"Полный кадр {width}x{height} ({mode}): {elapsed:.2f} мс")
+
+    if args.suite in ("all", "micro"):
+        print("Микробенчмарки функций Game:")
+        for name, elapsed in bench_hot_functions().items():
+            results[f"game.{name}"] = elapsed
+            print(f"  {name}: {elapsed:.4f} мс")
+
+    if args.suite in ("all", "replay"):
+        for name, report in bench_replays().items():
+            frame, scene_change = report["frame_ms"], report["scene_change_ms"]
+            results[f"replay.{name}.frame_p50_ms"] = frame["p50"]
+            results[f"replay.{name}.frame_p95_ms"] = frame["p95"]
+            results[f"replay.{name}.frame_p99_ms"] = frame["p99"]
+            if scene_change:
+                results[f"replay.{name}.scene_change_p95_ms"] = scene_change["p95"]
+            if report["peak_rss_mb"] is not None:
+                results[f"replay.{name}.peak_rss_mb"] = report["peak_rss_mb"]
+            print(f"Воспроизведение {name}: кадров {report['frames']}, "
+                  f"кадр p50/p95/p99 {frame['p50']:.2f}/{frame['p95']:.2f}/{frame['p99']:.2f} мс, "
+                  f"смена сцены p95 {scene_change.get('p95', 0):.2f} мс, "
+                  f"пик памяти {report['peak_rss_mb']} МБ")
+
+    if args.suite in ("all", "memory"):
+        for count, size in bench_scene_memory().items():
+            results[f"scene_memory.{count}.bytes_per_scene"] = size
+            print(f"Память сцен ({count} сцен): {size:.0f} Б/сцену")
+
+    if json_path:
+        data = {
+            "meta": {
+                "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "suite": args.suite,
+                "python": platform.python_version(),
+                "pygame": pygame.version.ver,
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            "results": results,
+        }
+        with open(json_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены: {json_path}")
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        if compare_with_baseline(results, baseline, args.tolerance):
+            print("  ✗ Есть замедления относительно базовых результатов")
+            failed = True
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
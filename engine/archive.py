@@ -0,0 +1,238 @@
+import json
+import mmap
+import os
+import struct
+
+import pygame
+from engine.assets import has_transparency
+
+# Формат архива:
+#   заголовок: сигнатура, версия, длина оглавления (ARCHIVE_HEADER)
+#   оглавление: JSON {путь: {opaque, source_size, source_mtime,
+#                            variants: [{offset, width, height, pitch}, ...]}},
+#               варианты - уменьшенные копии изображения, от большего к меньшему,
+#               смещения отсчитываются от начала данных
+#   данные: пиксели изображений в формате BGRA (порядок байт формата экрана ARGB8888),
+#           каждое изображение выровнено по границе DATA_ALIGNMENT байт
+ARCHIVE_MAGIC = b"NVPK"
+ARCHIVE_VERSION = 2
+ARCHIVE_HEADER = struct.Struct("<4sII")
+PIXEL_FORMAT = "BGRA"
+DATA_ALIGNMENT = 64
+
+# Расширения файлов, которые упаковываются в архив
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tga")
+
+# Минимальная сторона уменьшенного варианта изображения
+MIN_VARIANT_SIZE = 64
+
+def matches_display(surface):
+    """
+    Проверяет, совпадает ли формат пикселей поверхности с форматом экрана.
+    Пиксели архива хранятся в BGRA (ARGB8888), но экран может иметь другой
+    порядок каналов или глубину цвета.
+
+    :param surface: Поверхность
+    :return: True, если поверхность можно выводить на экран без преобразования
+             (или экран еще не создан)
+    """
+    display = pygame.display.get_surface()
+    if display is None:
+        return True
+    # Альфа-канал экрана не сравнивается: у окна его обычно нет
+    return (display.get_bytesize() == surface.get_bytesize()
+            and display.get_masks()[:3] == surface.get_masks()[:3])
+
+def normalize_path(path):
+    """
+    Приводит путь к ресурсу к виду, в котором он хранится в оглавлении архива
+
+    :param path: Путь к файлу
+    :return: Нормализованный путь с прямыми слэшами
+    """
+    return os.path.normpath(path).replace(os.sep, "/")
+
+def get_source_stamp(path):
+    """
+    Возвращает отметку исходного файла, по которой определяется устаревание архива
+
+    :param path: Путь к файлу
+    :return: Пара (размер, время изменения в наносекундах) или None, если файла нет
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+def get_variant_sizes(size, heights=(), min_size=MIN_VARIANT_SIZE):
+    """
+    Вычисляет размеры уменьшенных вариантов изображения: последовательные
+    уменьшения вдвое (уровни детализации) и варианты под заданные высоты экрана
+
+    :param size: Размер исходного изображения (ширина, высота)
+    :param heights: Высоты, под которые нужны отдельные варианты
+    :param min_size: Минимальная сторона варианта
+    :return: Список размеров от большего к меньшему, без исходного
+    """
+    width, height = size
+    targets = set(heights)
+    level = height // 2
+    while min(width, height) * level // height >= min_size:
+        targets.add(level)
+        level //= 2
+
+    sizes = {}
+    for target in targets:
+        if min_size <= target < height:
+            sizes[target] = (max(1, round(width * target / height)), target)
+    return [sizes[target] for target in sorted(sizes, reverse=True)]
+
+def write_archive(archive_path, image_paths, variant_heights=None):
+    """
+    Упаковывает изображения в архив с готовыми пикселями.
+    Экран Pygame уже должен быть создан.
+
+    :param archive_path: Путь к создаваемому архиву
+    :param image_paths: Пути к изображениям
+    :param variant_heights: Функция, возвращающая для пути к изображению высоты
+                            дополнительных вариантов (None - только уровни детализации)
+    :return: Количество упакованных изображений
+    """
+    index = {}
+    blobs = []
+    offset = 0
+    for path in image_paths:
+        try:
+            image = pygame.image.load(path)
+        except pygame.error as e:
+            print(f"Ошибка при упаковке {path}: {e}")
+            continue
+
+        opaque = not has_transparency(image)
+        image = image.convert_alpha()
+        heights = variant_heights(path) if variant_heights else ()
+        variant_images = [image]
+        for variant_size in get_variant_sizes(image.get_size(), heights):
+            variant_images.append(pygame.transform.smoothscale(image, variant_size))
+
+        variants = []
+        for variant in variant_images:
+            pixels = pygame.image.tobytes(variant, PIXEL_FORMAT)
+            padding = -offset % DATA_ALIGNMENT
+            offset += padding
+            variants.append({
+                "offset": offset,
+                "width": variant.get_width(),
+                "height": variant.get_height(),
+                "pitch": variant.get_width() * 4,
+            })
+            blobs.append((padding, pixels))
+            offset += len(pixels)
+
+        source_size, source_mtime = get_source_stamp(path)
+        index[normalize_path(path)] = {
+            "opaque": opaque,
+            "source_size": source_size,
+            "source_mtime": source_mtime,
+            "variants": variants,
+        }
+
+    index_data = json.dumps(index, ensure_ascii=False).encode("utf-8")
+    data_start = ARCHIVE_HEADER.size + len(index_data)
+    data_start += -data_start % DATA_ALIGNMENT
+
+    with open(archive_path, "wb") as archive:
+        archive.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, len(index_data)))
+        archive.write(index_data)
+        archive.write(b"\0" * (data_start - ARCHIVE_HEADER.size - len(index_data)))
+        for padding, pixels in blobs:
+            archive.write(b"\0" * padding)
+            archive.write(pixels)
+
+    return len(index)
+
+class AssetArchive:
+    """
+    Архив с готовыми пикселями изображений. Файл отображается в память,
+    поверхности создаются прямо поверх отображения без копирования и декодирования.
+    """
+    def __init__(self, path, check_sources=True):
+        """
+        Открывает архив и читает оглавление.
+
+        :param path: Путь к архиву
+        :param check_sources: Сверять записи с исходными файлами (при разработке)
+        :raises ValueError: Если файл не является архивом поддерживаемой версии
+        """
+        self.path = path
+        self.check_sources = check_sources
+        with open(path, "rb") as archive:
+            # Копирование при записи: страницы общие с файлом, пока в них не пишут
+            self.data = mmap.mmap(archive.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        magic, version, index_length = ARCHIVE_HEADER.unpack_from(self.data)
+        if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION:
+            raise ValueError(f"Неподдерживаемый формат архива: {path}")
+
+        index_end = ARCHIVE_HEADER.size + index_length
+        self.index = json.loads(bytes(self.data[ARCHIVE_HEADER.size:index_end]).decode("utf-8"))
+        self.data_start = index_end + (-index_end % DATA_ALIGNMENT)
+        self.view = memoryview(self.data)
+
+    def get_entry(self, path):
+        """
+        Возвращает запись оглавления для изображения, если она актуальна.
+        При сверке с исходными файлами запись не используется, если файл
+        изменился после упаковки (при разработке изображения загружаются из файлов).
+
+        :param path: Путь к изображению
+        :return: Словарь с записью или None
+        """
+        entry = self.index.get(normalize_path(path))
+        if entry is None or not self.check_sources:
+            return entry
+        stamp = get_source_stamp(path)
+        if stamp is not None and stamp != (entry["source_size"], entry["source_mtime"]):
+            return None
+        return entry
+
+    def load(self, path, min_size=None):
+        """
+        Создает поверхность изображения поверх данных архива
+
+        :param path: Путь к изображению
+        :param min_size: Минимальный нужный размер (ширина, высота). Если указан,
+                         возвращается наименьший вариант не меньше этого размера
+                         (или исходное изображение, если больших вариантов нет)
+        :return: Поверхность в формате архива (BGRA) или None, если изображения нет в архиве.
+                 Метод вызывается и из потока предзагрузки, поэтому поверхность не
+                 преобразуется в формат экрана (convert) - это делает основной поток,
+                 если формат экрана отличается (matches_display)
+        """
+        entry = self.get_entry(path)
+        if entry is None:
+            return None
+
+        variant = entry["variants"][0]
+        if min_size is not None:
+            min_width, min_height = min_size
+            for candidate in entry["variants"]:
+                if candidate["width"] < min_width or candidate["height"] < min_height:
+                    break
+                variant = candidate
+
+        start = self.data_start + variant["offset"]
+        end = start + variant["pitch"] * variant["height"]
+        surface = pygame.image.frombuffer(self.view[start:end], (variant["width"], variant["height"]),
+                                          PIXEL_FORMAT)
+        if entry["opaque"]:
+            # Непрозрачное изображение выводится простым копированием без смешивания
+            surface.set_alpha(None)
+        return surface
+
+    def __contains__(self, path):
+        return self.get_entry(path) is not None
+
+    def __len__(self):
+        return len(self.index)
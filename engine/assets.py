@@ -0,0 +1,153 @@
+import pygame
+from engine.scaling import smoothscale
+
+def has_transparency(surface):
+    """
+    Проверяет, есть ли в изображении прозрачные пиксели
+
+    :param surface: Поверхность Pygame
+    :return: True, если есть прозрачный цветовой ключ или пиксели с alpha < 255
+    """
+    if surface.get_colorkey() is not None:
+        return True
+    if not surface.get_flags() & pygame.SRCALPHA:
+        return False
+    # Маска отмечает пиксели с alpha > 254, то есть полностью непрозрачные
+    width, height = surface.get_size()
+    return pygame.mask.from_surface(surface, 254).count() < width * height
+
+def describe_format(surface):
+    """
+    Возвращает краткое описание формата пикселей поверхности
+
+    :param surface: Поверхность Pygame
+    :return: Строка вида "32 бит ARGB, alpha, RLE"
+    """
+    flags = surface.get_flags()
+    # Порядок каналов - от старших битов пикселя к младшим
+    channels = [(shift, name) for shift, mask, name
+                in zip(surface.get_shifts(), surface.get_masks(), "RGBA") if mask]
+    order = "".join(name for shift, name in sorted(channels, reverse=True))
+    parts = [f"{surface.get_bitsize()} бит {order}"]
+    if flags & pygame.SRCALPHA:
+        parts.append("alpha")
+    if surface.get_colorkey() is not None:
+        parts.append("colorkey")
+    if flags & pygame.RLEACCEL:
+        parts.append("RLE")
+    return ", ".join(parts)
+
+def enable_rle(surface):
+    """
+    Включает RLE-ускорение вывода для прозрачной поверхности.
+    Подходит только для поверхностей, которые выводятся на экран, но не читаются
+    (например, уже масштабированных), так как чтение пикселей требует распаковки.
+
+    :param surface: Поверхность Pygame
+    :return: Та же поверхность
+    """
+    colorkey = surface.get_colorkey()
+    if colorkey is not None:
+        surface.set_colorkey(colorkey, pygame.RLEACCEL)
+    elif surface.get_flags() & pygame.SRCALPHA:
+        surface.set_alpha(255, pygame.RLEACCEL)
+    return surface
+
+def prepare_surface(surface, rle=False):
+    """
+    Приводит поверхность к формату пикселей экрана, чтобы вывод не требовал
+    попиксельного преобразования. Изображения с прозрачностью сохраняют
+    альфа-канал или цветовой ключ, полностью непрозрачные теряют лишний альфа-канал.
+
+    :param surface: Поверхность Pygame (экран уже должен быть создан)
+    :param rle: Включить RLE-ускорение для прозрачных изображений
+    :return: Поверхность в формате экрана
+    """
+    colorkey = surface.get_colorkey()
+    if colorkey is not None:
+        prepared = surface.convert()
+        prepared.set_colorkey(colorkey)
+    elif has_transparency(surface):
+        prepared = surface.convert_alpha()
+    else:
+        prepared = surface.convert()
+
+    if rle:
+        enable_rle(prepared)
+    return prepared
+
+def scale_to_fill(image, size):
+    """
+    Масштабирует изображение так, чтобы оно заполняло область без рамок
+    (с сохранением пропорций, лишнее обрезается по краям)
+
+    :param image: Исходное изображение
+    :param size: Размер области (ширина, высота)
+    :return: Поверхность размером с область
+    """
+    # Получаем размеры исходного изображения
+    bg_width, bg_height = image.get_size()
+    game_width, game_height = size
+    
+    # Вычисляем соотношение сторон
+    bg_ratio = bg_width / bg_height
+    game_ratio = game_width / game_height
+    
+    # Определяем размеры для масштабирования
+    if bg_ratio > game_ratio:
+        # Изображение шире области (по соотношению сторон)
+        # Масштабируем по высоте, ширина будет обрезана
+        new_height = game_height
+        new_width = int(new_height * bg_ratio)
+    else:
+        # Изображение уже области (по соотношению сторон)
+        # Масштабируем по ширине, высота будет обрезана
+        new_width = game_width
+        new_height = int(new_width / bg_ratio)
+    
+    # Масштабируем изображение (большие фоны - в нескольких потоках)
+    scaled = smoothscale(image, (new_width, new_height))
+    
+    # Создаем поверхность размером с область и центрируем на ней изображение
+    final = pygame.Surface((game_width, game_height))
+    final.blit(scaled, ((game_width - new_width) // 2, (game_height - new_height) // 2))
+    return final
+
+class AssetReport:
+    """
+    Отчет о подготовке ресурсов: какие изображения были преобразованы
+    в формат экрана и в какой именно.
+    """
+    def __init__(self):
+        """
+        Инициализация отчета.
+        """
+        self.entries = {}  # Имя ресурса -> (исходный формат, итоговый формат)
+
+    def add(self, name, original, prepared):
+        """
+        Добавляет запись о подготовленном ресурсе
+
+        :param name: Имя ресурса
+        :param original: Исходная поверхность
+        :param prepared: Подготовленная поверхность
+        """
+        self.entries[name] = (describe_format(original), describe_format(prepared))
+
+    def converted(self):
+        """
+        Возвращает имена ресурсов, формат которых был изменен
+
+        :return: Список имен ресурсов
+        """
+        return [name for name, (before, after) in self.entries.items() if before != after]
+
+    def print_report(self):
+        """
+        Выводит отчет в консоль
+        """
+        converted = self.converted()
+        print(f"Подготовлено изображений: {len(self.entries)}, преобразовано в формат экрана: {len(converted)}")
+        for name in converted:
+            before, after = self.entries[name]
+            print(f"  {name}: {before} -> {after}")
@@ -0,0 +1,100 @@
+from collections import OrderedDict
+
+def surface_bytes(surface):
+    """
+    Возвращает объем памяти, занимаемый пикселями поверхности
+
+    :param surface: Поверхность Pygame
+    :return: Размер в байтах
+    """
+    return surface.get_pitch() * surface.get_height()
+
+class LRUCache:
+    """
+    Кэш с вытеснением давно не использованных элементов (LRU).
+    Ограничивается количеством элементов и/или суммарным размером в байтах.
+    Считает попадания и промахи для оценки эффективности.
+    """
+    def __init__(self, max_items=None, max_bytes=None, sizeof=None):
+        """
+        Инициализация кэша.
+
+        :param max_items: Максимальное количество элементов в кэше (None - без ограничения)
+        :param max_bytes: Максимальный суммарный размер элементов в байтах (None - без ограничения)
+        :param sizeof: Функция, возвращающая размер элемента в байтах
+        """
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.items = OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        Возвращает элемент по ключу и отмечает его как недавно использованный
+
+        :param key: Ключ элемента
+        :param default: Значение, если элемента нет в кэше
+        :return: Элемент кэша или значение по умолчанию
+        """
+        if key in self.items:
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """
+        Добавляет элемент в кэш, вытесняя самые старые при переполнении
+
+        :param key: Ключ элемента
+        :param value: Значение элемента
+        """
+        if key in self.items:
+            self.total_bytes -= self.sizes.pop(key)
+        self.items[key] = value
+        self.items.move_to_end(key)
+        self.sizes[key] = self.sizeof(value) if self.sizeof else 0
+        self.total_bytes += self.sizes[key]
+        
+        # Вытесняем самые старые элементы, но не только что добавленный
+        while len(self.items) > 1 and self.is_over_budget():
+            old_key, old_value = self.items.popitem(last=False)
+            self.total_bytes -= self.sizes.pop(old_key)
+
+    def is_over_budget(self):
+        """
+        Проверяет, превышены ли ограничения кэша
+
+        :return: True, если нужно вытеснять элементы
+        """
+        if self.max_items is not None and len(self.items) > self.max_items:
+            return True
+        return self.max_bytes is not None and self.total_bytes > self.max_bytes
+
+    def clear(self):
+        """
+        Очищает кэш
+        """
+        self.items.clear()
+        self.sizes.clear()
+        self.total_bytes = 0
+
+    def hit_rate(self):
+        """
+        Возвращает долю попаданий в кэш
+
+        :return: Доля попаданий от 0 до 1
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
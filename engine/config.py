@@ -11,6 +11,7 @@ BLACK = (0, 0, 0)
 BLUE = (50, 50, 150)
 GRAY = (200, 200, 200)
 DARK_GRAY = (100, 100, 100)
+LIGHT_GRAY = (225, 225, 225)
 TEXT_BOX_COLOR = (0, 0, 0, 180)
 
 # Настройки текста
@@ -28,20 +29,84 @@ BUTTON_HEIGHT = 40
 BUTTON_PADDING = 20
 BUTTON_Y = WINDOW_HEIGHT - TEXT_BOX_HEIGHT // 2 - BUTTON_HEIGHT // 2
 
+# Количество готовых элементов интерфейса (текстовое окно, кнопки) в кэше
+UI_CACHE_SIZE = 128
+
 # Настройки области текста
 TEXT_AREA_WIDTH = WINDOW_WIDTH - 2 * (BUTTON_WIDTH + 2 * BUTTON_PADDING)
 TEXT_LINE_SPACING = 4
 MAX_TEXT_LINES = 5
+TEXT_LAYOUT_CACHE_SIZE = 128  # Количество раскладок текста в кэше
 
 # Настройки персонажей
 CHARACTER_HEIGHT = int(WINDOW_HEIGHT * 0.25)
 CHARACTER_Y_POSITION = WINDOW_HEIGHT - TEXT_BOX_HEIGHT - CHARACTER_HEIGHT
+CHARACTER_SMOOTH_SCALING = True  # Сглаживать персонажей при масштабировании (smoothscale)
+SPRITE_CACHE_BUDGET = 64 * 1024 * 1024  # Бюджет памяти кэша масштабированных персонажей (байт)
 
 # Позиции персонажей по горизонтали
 CHARACTER_LEFT = WINDOW_WIDTH * 0.2
 CHARACTER_CENTER = WINDOW_WIDTH * 0.5
 CHARACTER_RIGHT = WINDOW_WIDTH * 0.8
 
+# Настройки рендеринга
+FPS = 60
+DIRTY_RECT_RENDERING = True  # Обновлять на экране только изменившиеся области
+IDLE_MODE = True  # Ждать событий вместо постоянной перерисовки, пока ничего не анимируется
+IDLE_MAX_WAIT = 1000  # Максимальное время ожидания события в режиме простоя (мс)
+IDLE_POLL_INTERVAL = 100  # Интервал опроса событий для драйверов без ожидания событий (мс)
+RESIZE_DELAY = 100  # Задержка применения размера окна, объединяющая серию событий изменения размера (мс)
+BACKGROUND_WARMUP_INTERVAL = 50  # Интервал фонового масштабирования неиспользуемых фонов (мс)
+
+SCALING_THREADS = 0  # Потоков для масштабирования больших изображений (0 - по числу ядер процессора)
+PARALLEL_SCALE_MIN_PIXELS = 1280 * 720  # Изображения меньше этого размера масштабируются в одном потоке
+
+# Фиксированное логическое разрешение: кадр собирается в LOGICAL_WIDTH x LOGICAL_HEIGHT
+# при любом размере окна и выводится на экран одним масштабированием с черными полями
+FIXED_LOGICAL_RESOLUTION = False
+LOGICAL_WIDTH = WINDOW_WIDTH
+LOGICAL_HEIGHT = WINDOW_HEIGHT
+INTEGER_SCALING = False  # Масштабировать только в целое число раз (четкие пиксели, более широкие поля)
+
+# Замер времени этапов кадра и оверлей производительности (F3 - оверлей, F4 - запись профиля cProfile)
+FRAME_PROFILING = True
+FRAME_PROFILE_HISTORY = 600  # Количество последних замеров каждого этапа для перцентилей
+FRAME_OVERLAY_INTERVAL = 500  # Интервал обновления оверлея (мс)
+FRAME_CAPTURE_FRAMES = 120  # Количество кадров в профиле cProfile
+FRAME_CAPTURE_PATH = "frame_profile.prof"  # Файл профиля cProfile
+
+# Бюджет памяти загруженных изображений (персонажи, фоны и их масштабированные копии), байт.
+# Размер изображения - ширина * высота * байт на пиксель
+TEXTURE_BUDGET = 256 * 1024 * 1024
+
+# Предзагрузка ресурсов
+PREFETCH_ENABLED = True  # Загружать изображения следующих сцен в фоновом потоке
+PREFETCH_DEPTH = 2  # На сколько переходов вперед заглядывать по графу сцен
+PREFETCH_QUEUE_SIZE = 16  # Максимальное количество изображений в очереди загрузки
+
 # Пути к ресурсам
 CHARACTERS_PATH = "Assets/Characters/"
-BACKGROUNDS_PATH = "Assets/Backgrounds/" 
\ No newline at end of file
+BACKGROUNDS_PATH = "Assets/Backgrounds/"
+
+# Сюжет: главный JSON-файл и скомпилированный кэш рядом с ним
+STORY_PATH = "story/story.json"
+STORY_CACHE_ENABLED = True  # Загружать сюжет из кэша, если файлы сюжета не менялись
+STORY_COMPILE_PROCESSES = 0  # Процессов для компиляции глав (0 - по числу ядер процессора)
+STORY_PARALLEL_MIN_BYTES = 1024 * 1024  # Сюжеты меньше этого размера компилируются в одном процессе
+
+# Хранилище сцен: "memory" - список в памяти, "sqlite" - база SQLite для очень больших сюжетов
+# (в памяти остаются только SCENE_CACHE_SIZE недавно использованных сцен и граф переходов).
+# База собирается рядом с главным файлом сюжета и пересобирается при изменении файлов сюжета.
+# Сцены, добавленные из кода (game.add_scene) после загрузки сюжета, записываются
+# во временную копию базы, а общая база не изменяется
+SCENE_STORE = "memory"
+SCENE_CACHE_SIZE = 256  # Количество сцен в кэше
+SCENE_PREFETCH_DEPTH = 8  # Сколько следующих сцен загружать вместе со сценой
+
+# Архив с готовыми пикселями изображений (собирается командой python pack_assets.py).
+# Если архива нет или изображения в нем нет, изображение загружается из файла
+ASSET_ARCHIVE_PATH = "Assets/assets.pak"
+ASSET_ARCHIVE_CHECK_SOURCES = True  # Не использовать записи архива для измененных после упаковки файлов
+# Высоты экрана, под которые в архив добавляются уменьшенные варианты фонов
+# (кроме них для всех изображений сохраняются уменьшения вдвое)
+ASSET_VARIANT_HEIGHTS = (WINDOW_HEIGHT, 720, 1080, 1440) 
\ No newline at end of file
@@ -0,0 +1,173 @@
+import cProfile
+import csv
+import pstats
+import time
+from collections import deque
+
+import pygame
+
+# Перцентили, которые выводятся в оверлее и в CSV
+PERCENTILES = (50, 95, 99)
+
+class PhaseTimer:
+    """
+    Замер одного этапа кадра в блоке with. Объект создается один раз
+    для каждого этапа, поэтому замер не создает новых объектов в каждом кадре.
+    """
+    def __init__(self, samples):
+        """
+        Инициализация замера.
+
+        :param samples: Очередь последних замеров этапа (deque)
+        """
+        self.samples = samples
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.samples.append((time.perf_counter() - self.start) * 1000)
+        return False
+
+def percentile(sorted_samples, percent):
+    """
+    Возвращает перцентиль по методу ближайшего ранга
+
+    :param sorted_samples: Отсортированный список замеров
+    :param percent: Перцентиль от 0 до 100
+    :return: Значение перцентиля или 0, если замеров нет
+    """
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, -(-len(sorted_samples) * percent // 100))
+    return sorted_samples[rank - 1]
+
+class FrameProfiler:
+    """
+    Замер времени этапов кадра (обработка событий, отрисовка слоев, вывод на экран)
+    со скользящей историей последних замеров для перцентилей p50/p95/p99.
+    Может записать профиль cProfile для следующих N кадров.
+    """
+    def __init__(self, history):
+        """
+        Инициализация профилировщика.
+
+        :param history: Количество последних замеров, хранимых для каждого этапа
+        """
+        self.history = history
+        self.samples = {}  # Этап -> deque последних замеров в мс (в порядке первого замера)
+        self.timers = {}
+        self.frames = 0
+        # Запись профиля cProfile
+        self.capture = None
+        self.capture_frames = 0
+        self.capture_path = None
+
+    def phase(self, name):
+        """
+        Возвращает замер этапа для блока with
+
+        :param name: Название этапа
+        :return: Объект PhaseTimer
+        """
+        timer = self.timers.get(name)
+        if timer is None:
+            self.samples[name] = deque(maxlen=self.history)
+            timer = PhaseTimer(self.samples[name])
+            self.timers[name] = timer
+        return timer
+
+    def frame_done(self):
+        """
+        Отмечает вывод кадра. Завершает запись профиля cProfile после N кадров.
+        """
+        self.frames += 1
+        if self.capture is not None:
+            self.capture_frames -= 1
+            if self.capture_frames <= 0:
+                self.finish_capture()
+
+    def start_capture(self, frames, path):
+        """
+        Начинает запись профиля cProfile на следующие кадры
+
+        :param frames: Количество кадров
+        :param path: Путь к файлу профиля (.prof, открывается pstats или snakeviz)
+        """
+        if self.capture is not None:
+            return
+        print(f"Запись профиля cProfile на {frames} кадров...")
+        self.capture = cProfile.Profile()
+        self.capture_frames = frames
+        self.capture_path = path
+        self.capture.enable()
+
+    def finish_capture(self):
+        """
+        Завершает запись профиля cProfile, сохраняет его в файл
+        и выводит самые затратные функции в консоль
+        """
+        if self.capture is None:
+            return
+        self.capture.disable()
+        try:
+            self.capture.dump_stats(self.capture_path)
+            print(f"Профиль cProfile сохранен: {self.capture_path}")
+        except OSError as e:
+            print(f"Ошибка при сохранении профиля cProfile: {e}")
+        pstats.Stats(self.capture).sort_stats("cumulative").print_stats(15)
+        self.capture = None
+
+    def get_stats(self):
+        """
+        Возвращает статистику по этапам
+
+        :return: Список (этап, количество замеров, среднее, p50, p95, p99, максимум) в мс
+        """
+        stats = []
+        for name, samples in self.samples.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            stats.append((name, len(ordered), sum(ordered) / len(ordered),
+                          *(percentile(ordered, percent) for percent in PERCENTILES), ordered[-1]))
+        return stats
+
+    def dump_csv(self, path):
+        """
+        Сохраняет статистику по этапам в CSV-файл
+
+        :param path: Путь к файлу
+        """
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["phase", "samples", "mean_ms"]
+                            + [f"p{percent}_ms" for percent in PERCENTILES] + ["max_ms"])
+            for name, count, *values in self.get_stats():
+                writer.writerow([name, count] + [f"{value:.3f}" for value in values])
+
+def draw_overlay(surface, font, lines):
+    """
+    Рисует полупрозрачную панель с текстом в левом верхнем углу поверхности
+
+    :param surface: Поверхность для отрисовки
+    :param font: Шрифт
+    :param lines: Строки текста
+    :return: Прямоугольник панели
+    """
+    padding = 6
+    rendered = [font.render(line, True, (255, 255, 255)) for line in lines]
+    width = max((text.get_width() for text in rendered), default=0) + padding * 2
+    height = sum(text.get_height() for text in rendered) + padding * 2
+    rect = pygame.Rect(0, 0, width, height).clip(surface.get_rect())
+
+    panel = pygame.Surface(rect.size, pygame.SRCALPHA)
+    panel.fill((0, 0, 0, 180))
+    surface.blit(panel, rect)
+    y = padding
+    for text in rendered:
+        surface.blit(text, (padding, y))
+        y += text.get_height()
+    return rect
@@ -1,64 +1,201 @@
 import pygame
 import sys
+import time
+from contextlib import nullcontext
 from pygame import mixer
 import os
+from engine.archive import AssetArchive, matches_display
+from engine.assets import AssetReport, prepare_surface, scale_to_fill
+from engine.cache import surface_bytes
 from engine.config import *
+from engine.frame_profiler import FrameProfiler, draw_overlay
+from engine.placeholders import draw_character_placeholder, draw_default_background
+from engine.prefetch import PREFETCH_EVENT, AssetPrefetcher, get_upcoming_scenes
+from engine.scaling import smoothscale
+from engine.scene import to_plain
+from engine.sprites import SpriteCache
+from engine.story_graph import NO_SCENE, StoryError, compile_story
+from engine.surface_store import SurfaceStore
+from engine.text_layout import TextLayoutCache
+from engine.ui import (ChoiceMenu, UIChrome, darken, get_dialog_buttons, get_dialog_rect,
+                       get_navigation_buttons)
 
 class Game:
     """
     Основной класс игрового движка визуальной новеллы.
     Управляет сценами, персонажами, фонами и игровым циклом.
     """
-    def __init__(self):
+    def __init__(self, profiler=None):
         """
         Инициализация игрового движка.
+        
+        :param profiler: Профилировщик запуска (StartupProfiler) или None
         """
+        # Замер времени запуска до вывода первого кадра
+        self.profiler = profiler
+        self.exit_after_first_frame = False  # Завершить работу после первого кадра (замер запуска)
+        
         # Инициализация Pygame
-        pygame.init()
-        mixer.init()
+        with self.profile_phase("pygame.init"):
+            pygame.init()
+        with self.profile_phase("mixer.init"):
+            mixer.init()
         
         # Настройка экрана
-        self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.RESIZABLE)
-        pygame.display.set_caption(WINDOW_TITLE)
+        with self.profile_phase("создание окна"):
+            self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.RESIZABLE)
+            pygame.display.set_caption(WINDOW_TITLE)
         
         # Флаг полноэкранного режима
         self.is_fullscreen = False
         self.window_width = WINDOW_WIDTH
         self.window_height = WINDOW_HEIGHT
         
-        # Создаем основную поверхность для рендеринга
-        self.game_surface = pygame.Surface((self.window_width, self.window_height))
+        # Создаем основную поверхность для рендеринга. В режиме фиксированного
+        # логического разрешения её размер не зависит от размера окна
+        self.fixed_resolution = FIXED_LOGICAL_RESOLUTION
+        if self.fixed_resolution:
+            self.game_surface = pygame.Surface((LOGICAL_WIDTH, LOGICAL_HEIGHT))
+        else:
+            self.game_surface = pygame.Surface((self.window_width, self.window_height))
+        self.update_scale_params()
         
         # Шрифты
-        self.font = pygame.font.Font(None, FONT_SIZE)
-        self.name_font = pygame.font.Font(None, NAME_FONT_SIZE)
-        self.button_font = pygame.font.Font(None, BUTTON_FONT_SIZE)
+        with self.profile_phase("шрифты"):
+            self.font = pygame.font.Font(None, FONT_SIZE)
+            self.name_font = pygame.font.Font(None, NAME_FONT_SIZE)
+            self.button_font = pygame.font.Font(None, BUTTON_FONT_SIZE)
+        
+        # Кэш раскладки и отрисовки текста
+        self.text_layout_cache = TextLayoutCache(TEXT_LAYOUT_CACHE_SIZE)
+        
+        # Заранее построенные элементы интерфейса
+        with self.profile_phase("элементы интерфейса"):
+            self.ui = UIChrome(self.font, self.button_font)
         
         # Сцены
         self.scenes = []
         self.scene_map = {}  # Словарь для быстрого доступа к сценам по ID
+        self.scene_store = None  # База сцен SQLite (SCENE_STORE = "sqlite"), задается при загрузке сюжета
+        self.story = None  # Скомпилированный граф переходов (StoryGraph), строится после загрузки сюжета
         self.current_scene = 0
         
         # Флаг отображения выбора
         self.showing_choices = False
         self.choice_buttons = []
+        self.choice_menu = None  # Меню выбора, вычисленное при открытии
         
         # Переменные для отслеживания состояния игры
         self.variables = {}
         
         # Персонажи и фоны
-        self.characters = {}
-        self.backgrounds = {}
-        self.original_backgrounds = {}  # Сохраняем оригинальные изображения фонов
+        # Зарегистрированные, но еще не загруженные ресурсы: имя -> путь к файлу.
+        # Изображение загружается, когда его использует показываемая сцена
+        self.pending_characters = {}
+        self.pending_backgrounds = {}
+        self.asset_paths = {}  # Пути ко всем зарегистрированным изображениям: (категория, имя) -> путь
+        
+        # Архив с готовыми пикселями изображений (если собран через pack_assets.py)
+        with self.profile_phase("архив изображений"):
+            self.archive = self.open_archive()
+        
+        # Загруженные изображения хранятся в общем хранилище с бюджетом памяти;
+        # вытесненные изображения загружаются заново при следующем использовании
+        self.surface_store = SurfaceStore(TEXTURE_BUDGET, self.on_asset_evicted)
+        self.pinned_scene = None  # Сцена, для которой закреплены изображения
+        self.characters = self.surface_store.category("character")
+        self.backgrounds = self.surface_store.category("background_scaled")  # Фоны, масштабированные под игровую поверхность (заполняются по мере использования)
+        self.original_backgrounds = self.surface_store.category("background")  # Сохраняем оригинальные изображения фонов
+        self.background_warmup_scheduled = False  # Запланировано ли фоновое масштабирование
+        
+        # Предзагрузка изображений сцен, достижимых из текущей
+        self.prefetcher = None
+        if PREFETCH_ENABLED:
+            with self.profile_phase("поток предзагрузки"):
+                self.prefetcher = AssetPrefetcher(PREFETCH_DEPTH, PREFETCH_QUEUE_SIZE, self.archive)
+        
+        # Отложенное изменение размера окна: события изменения размера объединяются
+        self.pending_resize = None
+        
+        # Отчет о приведении изображений к формату экрана
+        self.asset_report = AssetReport()
+        
+        # Кэш масштабированных изображений персонажей
+        self.sprite_cache = SpriteCache(SPRITE_CACHE_BUDGET, CHARACTER_SMOOTH_SCALING,
+                                        self.get_character_variant)
         
         # Кнопки навигации
         self.back_button = pygame.Rect(BUTTON_PADDING, BUTTON_Y, BUTTON_WIDTH, BUTTON_HEIGHT)
         self.forward_button = pygame.Rect(WINDOW_WIDTH - BUTTON_WIDTH - BUTTON_PADDING, 
                                       BUTTON_Y, BUTTON_WIDTH, BUTTON_HEIGHT)
         
+        # Флаг отображения диалога подтверждения выхода
+        self.show_exit_dialog = False
+
+        # Кнопка под курсором мыши (для подсветки)
+        self.hovered_button = None
+
+        # Отслеживание изменившихся областей экрана
+        self.dirty_rendering = DIRTY_RECT_RENDERING
+        self.needs_full_redraw = True
+        self.dirty_rects = []
+        self.last_frame_state = None
+
+        # Режим простоя: цикл ждет событий, пока нет анимаций и таймеров
+        self.idle_mode = IDLE_MODE
+        self.animating = False  # Пока флаг установлен, цикл работает с частотой FPS
+        self.timers = []  # Отложенные вызовы в формате [(время_срабатывания_мс, функция), ...]
+        # Драйверы без окна (dummy) не умеют ждать события: вместо ожидания цикл спит
+        # до ближайшего таймера, но не дольше IDLE_POLL_INTERVAL, и затем опрашивает очередь
+        self.native_event_wait = pygame.display.get_driver() not in ("dummy", "offscreen")
+
+        # Замер времени этапов кадра и оверлей производительности
+        self.frame_profiler = FrameProfiler(FRAME_PROFILE_HISTORY) if FRAME_PROFILING else None
+        self.show_performance_overlay = False
+        self.overlay_font = None  # Шрифт оверлея (создается при первом показе)
+        self.overlay_rect = None  # Область оверлея на игровой поверхности
+
+        # Запись и воспроизведение ввода (InputRecorder и InputReplayer из engine.replay)
+        self.recorder = None
+        self.replayer = None
+
         # Флаг работы игры
         self.running = True
+
+    def profile_phase(self, name):
+        """
+        Замеряет этап запуска, если идет замер времени запуска
+        
+        :param name: Название этапа
+        :return: Контекстный менеджер для блока with
+        """
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.phase(name)
+
+    def profile_asset(self, name, stage):
+        """
+        Замеряет загрузку или масштабирование изображения, если идет замер времени запуска
+        
+        :param name: Имя изображения (например, "background:bg_lab")
+        :param stage: Этап обработки ("load" или "scale")
+        :return: Контекстный менеджер для блока with
+        """
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.asset(name, stage)
+
+    def frame_phase(self, name):
+        """
+        Замеряет этап кадра, если включен замер времени кадров
         
+        :param name: Название этапа
+        :return: Контекстный менеджер для блока with
+        """
+        if self.frame_profiler is None:
+            return nullcontext()
+        return self.frame_profiler.phase(name)
+
     def add_scene(self, scene):
         """
         Добавление сцены в игру
@@ -70,144 +207,337 @@ class Game:
         # Если у сцены есть ID, добавляем её в словарь для быстрого доступа
         if scene.scene_id is not None:
             self.scene_map[scene.scene_id] = len(self.scenes) - 1
+        
+        # Граф переходов нужно построить заново
+        self.story = None
+    
+    def add_choice(self, scene_id, text, next_scene, condition=None):
+        """
+        Добавляет вариант выбора к сцене игры. В отличие от Scene.add_choice,
+        граф переходов, если он уже построен, строится заново.
+        
+        :param scene_id: ID сцены
+        :param text: Текст варианта выбора
+        :param next_scene: ID сцены, к которой ведет этот выбор
+        :param condition: Условие для отображения варианта выбора
+        :raises ValueError: Если сцены хранятся в базе (SCENE_STORE = "sqlite")
+        :raises StoryError: Если в сюжете с новым вариантом есть ошибки
+        """
+        if self.scene_store is not None:
+            # Сцена из базы - только копия в кэше, вариант пропал бы при её вытеснении
+            raise ValueError("Варианты выбора сцен из базы сцен изменяются только в файлах сюжета")
+        scene = self.scenes[self.scene_map[scene_id]]
+        choices = scene.choices
+        scene.add_choice(text, next_scene, condition)
+        self.choice_menu = None
+        if self.story is not None:
+            try:
+                self.compile_story()
+            except StoryError:
+                # Граф остается прежним, поэтому и сцена возвращается к прежним вариантам
+                scene.choices = choices
+                raise
+    
+    def set_scene_store(self, store):
+        """
+        Заменяет сцены игры сценами из базы: в памяти остаются только недавно
+        использованные сцены, scenes и scene_map используются так же, как список и словарь
+        
+        :param store: Хранилище сцен (SQLiteSceneStore)
+        """
+        self.scene_store = store
+        self.scenes = store
+        self.scene_map = store.id_index
+        self.story = None
+    
+    def compile_story(self):
+        """
+        Проверяет сюжет и строит граф переходов между сценами.
+        Вызывается один раз после загрузки сюжета (или при запуске игрового цикла).
+        
+        :return: Объект StoryGraph
+        :raises StoryError: Если в сюжете есть ошибки
+        """
+        if self.scene_store is not None:
+            # Граф строится запросами к базе и сохраняется в ней вместе со сценами
+            self.story = self.scene_store.compile_story(self.asset_paths)
+        else:
+            self.story = compile_story(self.scenes, self.asset_paths)
+        return self.story
             
     def add_character(self, name, image_path):
         """
-        Добавление персонажа в игру.
+        Добавление персонажа в игру. Запоминается только путь к изображению,
+        загрузка откладывается до показа сцены с этим персонажем.
+        
+        :param name: Имя персонажа (ключ)
+        :param image_path: Путь к изображению персонажа
+        """
+        self.pending_characters[name] = image_path
+        self.asset_paths[("character", name)] = image_path
+        if self.characters.pop(name, None) is not None:
+            # Сбрасываем масштабированные копии, если персонаж заменен
+            self.sprite_cache.invalidate()
+
+    def add_background(self, name, image_path):
+        """
+        Добавление фонового изображения. Запоминается только путь к изображению,
+        загрузка и масштабирование откладываются до показа сцены с этим фоном.
+        
+        :param name: Имя фона
+        :param image_path: Путь к изображению
+        """
+        self.pending_backgrounds[name] = image_path
+        self.asset_paths[("background", name)] = image_path
+        self.original_backgrounds.pop(name, None)
+        self.backgrounds.pop(name, None)
+
+    def get_character(self, name):
+        """
+        Возвращает изображение персонажа, загружая его при первом обращении
+        
+        :param name: Имя персонажа
+        :return: Поверхность персонажа или None, если персонаж не найден или не загрузился
+        """
+        if name in self.pending_characters:
+            self.load_character(name, self.pending_characters.pop(name))
+        return self.characters.get(name)
+
+    def on_asset_evicted(self, category, name):
+        """
+        Вызывается хранилищем при вытеснении изображения: изображение снова
+        становится незагруженным и будет загружено при следующем использовании
+        
+        :param category: Категория изображения
+        :param name: Имя изображения
+        """
+        path = self.asset_paths.get((category, name))
+        if path is None:
+            return
+        if category == "character":
+            self.pending_characters[name] = path
+        elif category == "background":
+            self.pending_backgrounds[name] = path
+
+    def pin_scene_assets(self):
+        """
+        Закрепляет в хранилище изображения текущей сцены и сцен,
+        достижимых из неё (их загружает предзагрузчик), чтобы они не были вытеснены
+        """
+        indexes = [self.current_scene] + get_upcoming_scenes(self, PREFETCH_DEPTH)
+        keys = []
+        for index in indexes:
+            scene = self.scenes[index]
+            if scene.background:
+                keys.append(("background", scene.background))
+                keys.append(("background_scaled", scene.background))
+            if scene.character:
+                keys.append(("character", scene.character))
+        self.surface_store.pin(keys)
+
+    def load_scene_assets(self, scene):
+        """
+        Загружает изображения, которые использует сцена, если они еще не загружены
+        
+        :param scene: Объект класса Scene
+        """
+        if scene.background in self.pending_backgrounds:
+            with self.profile_asset(f"background:{scene.background}", "load"):
+                self.load_background(scene.background, self.pending_backgrounds.pop(scene.background))
+        if scene.character in self.pending_characters:
+            with self.profile_asset(f"character:{scene.character}", "load"):
+                self.load_character(scene.character, self.pending_characters.pop(scene.character))
+
+    def load_character(self, name, image_path):
+        """
+        Загрузка изображения персонажа. Если файл отсутствует, используется заглушка.
         
         :param name: Имя персонажа (ключ)
         :param image_path: Путь к изображению персонажа
         """
         try:
-            # Создаем директорию для персонажей, если её нет
-            os.makedirs(os.path.dirname(image_path), exist_ok=True)
-            
-            # Если файл не существует, создаем заглушку
-            if not os.path.exists(image_path):
-                # Создаем простое изображение персонажа
-                character_surface = pygame.Surface((200, 400))
-                character_surface.fill(WHITE)
-                pygame.draw.rect(character_surface, BLUE, (0, 0, 200, 400), 2)
-                pygame.draw.ellipse(character_surface, BLUE, (50, 50, 100, 100))  # Голова
-                pygame.draw.rect(character_surface, BLUE, (75, 150, 50, 200))    # Тело
-                try:
-                    pygame.image.save(character_surface, image_path)
-                    print(f"Created placeholder image for character: {name}")
-                except Exception as e:
-                    print(f"Error creating placeholder for character {name}: {e}")
-                    return
+            # Если файл не существует, используем заглушку (только в памяти,
+            # сохранить заглушки на диск можно командой python bake_placeholders.py)
+            if not self.asset_exists(image_path):
+                print(f"Character image not found, using placeholder: {name}")
+                self.characters[name] = self.prepare_asset(f"character:{name}", draw_character_placeholder())
+                return
                 
             try:
-                character_img = pygame.image.load(image_path)
-                self.characters[name] = character_img
+                character_img, packed = self.load_image(image_path)
+                self.characters[name] = self.prepare_asset(f"character:{name}", character_img, packed)
             except pygame.error as e:
                 print(f"Error loading character image {name}: {e}")
         except Exception as e:
             print(f"Error adding character {name}: {e}")
         
-    def add_background(self, name, image_path):
+    def load_background(self, name, image_path):
         """
-        Добавление фонового изображения
+        Загрузка фонового изображения. Если файл отсутствует или поврежден,
+        используется заглушка.
         
         :param name: Имя фона
         :param image_path: Путь к изображению
         """
         try:
-            # Создаем директорию для фонов, если она не существует
-            os.makedirs(os.path.dirname(image_path), exist_ok=True)
-            
-            if os.path.exists(image_path):
+            if self.asset_exists(image_path):
                 try:
-                    background = pygame.image.load(image_path).convert()
-                    # Сохраняем оригинальное изображение
+                    image, packed = self.load_image(image_path)
+                    background = self.prepare_asset(f"background:{name}", image, packed)
+                    # Сохраняем оригинальное изображение, масштабированное
+                    # под экран создается при первом использовании
                     self.original_backgrounds[name] = background
-                    # Масштабируем фон для заполнения экрана
-                    self.backgrounds[name] = self.scale_background(background)
+                    self.backgrounds.pop(name, None)
                 except pygame.error as e:
                     print(f"Ошибка при загрузке фона {name}: {e}")
                     # Создаем заглушку для фона
-                    placeholder = self.create_placeholder_background()
+                    placeholder = self.prepare_asset(f"background:{name}", self.create_placeholder_background(name))
                     self.original_backgrounds[name] = placeholder
-                    self.backgrounds[name] = placeholder
+                    self.backgrounds.pop(name, None)
             else:
                 print(f"Фоновое изображение не найдено: {image_path}")
                 # Создаем заглушку для фона
-                placeholder = self.create_placeholder_background()
+                placeholder = self.prepare_asset(f"background:{name}", self.create_placeholder_background(name))
                 self.original_backgrounds[name] = placeholder
-                self.backgrounds[name] = placeholder
+                self.backgrounds.pop(name, None)
         except Exception as e:
             print(f"Ошибка при добавлении фона {name}: {e}")
             # Создаем заглушку для фона
-            placeholder = self.create_placeholder_background()
+            placeholder = self.prepare_asset(f"background:{name}", self.create_placeholder_background(name))
             self.original_backgrounds[name] = placeholder
-            self.backgrounds[name] = placeholder
+            self.backgrounds.pop(name, None)
 
-    def scale_background(self, background_image):
+    def open_archive(self):
         """
-        Масштабирует фоновое изображение, чтобы оно заполняло весь экран без рамок
+        Открывает архив изображений, если он есть
         
-        :param background_image: Исходное изображение фона
-        :return: Масштабированное изображение
+        :return: Объект AssetArchive или None
         """
-        # Получаем размеры исходного изображения
-        bg_width, bg_height = background_image.get_size()
-        
-        # Используем фактические размеры игровой поверхности
-        game_width, game_height = self.game_surface.get_size()
+        if not os.path.exists(ASSET_ARCHIVE_PATH):
+            return None
+        try:
+            archive = AssetArchive(ASSET_ARCHIVE_PATH, ASSET_ARCHIVE_CHECK_SOURCES)
+            print(f"Открыт архив изображений: {ASSET_ARCHIVE_PATH} ({len(archive)} шт.)")
+            return archive
+        except (OSError, ValueError) as e:
+            print(f"Ошибка при открытии архива изображений: {e}")
+            return None
+
+    def asset_exists(self, image_path):
+        """
+        Проверяет, доступно ли изображение в архиве или в виде файла
         
-        # Вычисляем соотношение сторон
-        bg_ratio = bg_width / bg_height
-        game_ratio = game_width / game_height
+        :param image_path: Путь к изображению
+        :return: True, если изображение можно загрузить
+        """
+        if self.archive is not None and image_path in self.archive:
+            return True
+        return os.path.exists(image_path)
+
+    def load_image(self, image_path):
+        """
+        Загружает изображение из архива, а если его там нет - из файла
         
-        # Определяем размеры для масштабирования
-        if bg_ratio > game_ratio:
-            # Изображение шире игровой поверхности (по соотношению сторон)
-            # Масштабируем по высоте, ширина будет обрезана
-            new_height = game_height
-            new_width = int(new_height * bg_ratio)
-        else:
-            # Изображение уже игровой поверхности (по соотношению сторон)
-            # Масштабируем по ширине, высота будет обрезана
-            new_width = game_width
-            new_height = int(new_width / bg_ratio)
+        :param image_path: Путь к изображению
+        :return: Пара (поверхность, взята ли она из архива)
+        """
+        if self.archive is not None:
+            surface = self.archive.load(image_path)
+            if surface is not None:
+                return surface, True
+        return pygame.image.load(image_path), False
+
+    def prepare_asset(self, name, surface, packed=False):
+        """
+        Приводит изображение к формату пикселей экрана и записывает результат в отчет
         
-        # Масштабируем изображение
-        scaled_bg = pygame.transform.smoothscale(background_image, (new_width, new_height))
+        :param name: Имя ресурса для отчета
+        :param surface: Исходная поверхность
+        :param packed: Изображение взято из архива (оно преобразуется, только если
+                       формат экрана отличается от формата архива)
+        :return: Поверхность в формате экрана
+        """
+        prepared = surface if packed and matches_display(surface) else prepare_surface(surface)
+        self.asset_report.add(name, surface, prepared)
+        return prepared
+
+    def get_background(self, name):
+        """
+        Возвращает фон, масштабированный под текущий размер игровой поверхности.
+        Фон загружается при первом использовании и масштабируется при первом
+        использовании после загрузки или изменения размера.
         
-        # Создаем поверхность размером с игровую поверхность
-        final_bg = pygame.Surface((game_width, game_height))
+        :param name: Имя фона
+        :return: Поверхность фона или None, если фон не зарегистрирован
+        """
+        if name in self.pending_backgrounds:
+            with self.profile_asset(f"background:{name}", "load"):
+                self.load_background(name, self.pending_backgrounds.pop(name))
+        
+        original = self.original_backgrounds.get(name)
+        if original is None:
+            return None
+        
+        game_size = self.game_surface.get_size()
+        if original.get_size() == game_size:
+            # Фон уже нужного размера, масштабированная копия не нужна
+            return original
+        
+        background = self.backgrounds.get(name)
+        if background is None or background.get_size() != game_size:
+            # Масштабируем ближайший по размеру заранее уменьшенный вариант, если он есть
+            with self.profile_asset(f"background:{name}", "scale"):
+                source = self.load_variant(("background", name), game_size) or original
+                background = self.scale_background(source)
+            self.backgrounds[name] = background
+        return background
+
+    def load_variant(self, key, min_size):
+        """
+        Возвращает наименьший заранее уменьшенный вариант изображения из архива,
+        который не меньше указанного размера
         
-        # Вычисляем позицию для центрирования
-        pos_x = (game_width - new_width) // 2
-        pos_y = (game_height - new_height) // 2
+        :param key: Ключ изображения (категория, имя)
+        :param min_size: Минимальный размер (ширина, высота)
+        :return: Поверхность в формате экрана или None, если изображения нет в архиве
+        """
+        path = self.asset_paths.get(key)
+        if self.archive is None or path is None:
+            return None
+        surface = self.archive.load(path, min_size)
+        if surface is not None and not matches_display(surface):
+            surface = prepare_surface(surface)
+        return surface
+
+    def get_character_variant(self, name, size):
+        """
+        Возвращает заранее уменьшенный вариант изображения персонажа для кэша спрайтов
         
-        # Отображаем масштабированное изображение на поверхности
-        final_bg.blit(scaled_bg, (pos_x, pos_y))
+        :param name: Имя персонажа
+        :param size: Размер, до которого будет масштабировано изображение
+        :return: Поверхность или None
+        """
+        return self.load_variant(("character", name), size)
+
+    def scale_background(self, background_image):
+        """
+        Масштабирует фоновое изображение, чтобы оно заполняло весь экран без рамок
         
-        return final_bg
+        :param background_image: Исходное изображение фона
+        :return: Масштабированное изображение
+        """
+        # Используем фактические размеры игровой поверхности
+        return scale_to_fill(background_image, self.game_surface.get_size())
 
-    def create_placeholder_background(self):
+    def create_placeholder_background(self, name):
         """
-        Создает заглушку для фонового изображения
+        Создает заглушку для фонового изображения - фон по умолчанию,
+        тот же, что сохраняет bake_placeholders.py
         
+        :param name: Имя фона (от него зависит оформление)
         :return: Поверхность с заглушкой
         """
-        placeholder = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
-        placeholder.fill((200, 200, 200))  # Светло-серый фон
-        
-        # Добавляем сетку
-        for x in range(0, WINDOW_WIDTH, 50):
-            pygame.draw.line(placeholder, (180, 180, 180), (x, 0), (x, WINDOW_HEIGHT))
-        for y in range(0, WINDOW_HEIGHT, 50):
-            pygame.draw.line(placeholder, (180, 180, 180), (0, y), (WINDOW_WIDTH, y))
-        
-        # Добавляем текст "Фон отсутствует"
-        font = pygame.font.Font(None, 48)
-        text = font.render("Фон отсутствует", True, (100, 100, 100))
-        text_rect = text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2))
-        placeholder.blit(text, text_rect)
-        
-        return placeholder
+        return draw_default_background(name)
 
     def draw_character(self, character_name, position=None, scale=None):
         """
@@ -218,11 +548,10 @@ class Game:
         :param scale: Масштаб персонажа (float)
         """
         try:
-            if character_name not in self.characters:
+            character_image = self.get_character(character_name)
+            if character_image is None:
                 print(f"Персонаж {character_name} не найден")
                 return
-                
-            character_image = self.characters[character_name]
             
             # Получаем размеры игровой поверхности
             game_width, game_height = self.game_surface.get_size()
@@ -235,18 +564,11 @@ class Game:
             # Вычисляем позицию персонажа по вертикали
             character_y_position = game_height - TEXT_BOX_HEIGHT - CHARACTER_HEIGHT
             
-            # Масштабирование изображения персонажа
+            # Масштабированное изображение персонажа берется из кэша
             try:
-                if scale:
-                    original_size = character_image.get_size()
-                    new_size = (int(original_size[0] * scale), int(original_size[1] * scale))
-                    character_image = pygame.transform.scale(character_image, new_size)
-                else:
-                    # Масштабируем персонажа по высоте
-                    original_size = character_image.get_size()
-                    height_ratio = CHARACTER_HEIGHT / original_size[1]
-                    new_width = int(original_size[0] * height_ratio)
-                    character_image = pygame.transform.scale(character_image, (new_width, CHARACTER_HEIGHT))
+                with self.profile_asset(f"character:{character_name}", "scale"):
+                    character_image = self.sprite_cache.get_sprite(character_name, character_image, scale,
+                                                                   (game_width, game_height))
             except pygame.error as e:
                 print(f"Ошибка при масштабировании изображения персонажа {character_name}: {e}")
                 return
@@ -277,23 +599,15 @@ class Game:
             
             text_box_y = game_height - TEXT_BOX_HEIGHT
             
-            # Создаем полупрозрачную поверхность для текстового окна
-            text_box_surface = pygame.Surface((game_width, TEXT_BOX_HEIGHT), pygame.SRCALPHA)
-            text_box_surface.fill(TEXT_BOX_COLOR)
-            self.game_surface.blit(text_box_surface, (0, text_box_y))
-            
-            # Внутренняя часть текстового окна
-            pygame.draw.rect(self.game_surface, WHITE, 
-                            (TEXT_BOX_PADDING, 
-                            text_box_y + TEXT_BOX_PADDING, 
-                            game_width - 2*TEXT_BOX_PADDING, 
-                            TEXT_BOX_HEIGHT - 2*TEXT_BOX_PADDING))
+            # Текстовое окно (полупрозрачная подложка с белой внутренней частью)
+            self.game_surface.blit(self.ui.get_text_box(game_width), (0, text_box_y))
             
             # Отрисовка имени персонажа
             name_height = 0
             if current_scene.character_name:
                 try:
-                    name_surface = self.name_font.render(current_scene.character_name, True, BLUE)
+                    name_surface = self.text_layout_cache.render(current_scene.character_name, 
+                                                                 self.name_font, BLUE)
                     name_rect = name_surface.get_rect(topleft=(20, text_box_y + 15))
                     self.game_surface.blit(name_surface, name_rect)
                     name_height = name_rect.height + 10
@@ -303,70 +617,25 @@ class Game:
             # Рассчитываем ширину текстовой области с учетом размера окна
             text_area_width = game_width - 2 * (BUTTON_WIDTH + 2 * BUTTON_PADDING)
             
-            # Разбиваем текст на слова
-            words = current_scene.text.split()
-            lines = []
-            current_line = []
-            current_width = 0
-            
             # Рассчитываем отступ слева для текста, чтобы не перекрывать кнопку "Назад"
             left_margin = BUTTON_WIDTH + 2 * BUTTON_PADDING
             
-            for word in words:
-                # Проверяем, не слишком ли длинное слово
-                word_surface = self.font.render(word + " ", True, BLACK)
-                word_width = word_surface.get_width()
-                
-                # Если слово слишком длинное, разбиваем его
-                if word_width > text_area_width:
-                    if current_line:
-                        lines.append(" ".join(current_line))
-                        current_line = []
-                        current_width = 0
-                    
-                    # Разбиваем длинное слово на части
-                    chars = list(word)
-                    part = ""
-                    for char in chars:
-                        test_part = part + char
-                        test_surface = self.font.render(test_part + " ", True, BLACK)
-                        if test_surface.get_width() <= text_area_width:
-                            part = test_part
-                        else:
-                            if part:
-                                lines.append(part)
-                            part = char
-                    if part:
-                        current_line = [part]
-                        current_width = self.font.render(part + " ", True, BLACK).get_width()
-                else:
-                    if current_width + word_width <= text_area_width:
-                        current_line.append(word)
-                        current_width += word_width
-                    else:
-                        if current_line:
-                            lines.append(" ".join(current_line))
-                        current_line = [word]
-                        current_width = word_width
-            
-            if current_line:
-                lines.append(" ".join(current_line))
-            
-            # Ограничиваем количество строк
-            lines = lines[:MAX_TEXT_LINES]
+            # Раскладка текста по строкам вычисляется один раз и берется из кэша
+            try:
+                layout = self.text_layout_cache.get_layout(current_scene.text, self.font, 
+                                                           text_area_width, MAX_TEXT_LINES)
+            except pygame.error as e:
+                print(f"Error rendering text line: {e}")
+                return
             
             # Отрисовка текста
             text_start_y = text_box_y + TEXT_BOX_PADDING + name_height
-            for i, line in enumerate(lines):
-                try:
-                    text_surface = self.font.render(line, True, BLACK)
-                    text_rect = text_surface.get_rect(
-                        topleft=(left_margin, 
-                                text_start_y + i * (self.font.get_height() + TEXT_LINE_SPACING))
-                    )
-                    self.game_surface.blit(text_surface, text_rect)
-                except pygame.error as e:
-                    print(f"Error rendering text line: {e}")
+            for i, text_surface in enumerate(layout.surfaces):
+                text_rect = text_surface.get_rect(
+                    topleft=(left_margin, 
+                            text_start_y + i * (self.font.get_height() + TEXT_LINE_SPACING))
+                )
+                self.game_surface.blit(text_surface, text_rect)
         except Exception as e:
             print(f"Error drawing text box: {e}")
     
@@ -374,35 +643,34 @@ class Game:
         """
         Отрисовка кнопок навигации
         """
-        # Получаем размеры игровой поверхности
-        game_width, game_height = self.game_surface.get_size()
-        
-        # Вычисляем позицию кнопок
-        button_y = game_height - TEXT_BOX_HEIGHT // 2 - BUTTON_HEIGHT // 2
+        back_button, forward_button = get_navigation_buttons(self.game_surface.get_size())
         
         # Кнопка "Назад"
-        back_button = pygame.Rect(BUTTON_PADDING, button_y, BUTTON_WIDTH, BUTTON_HEIGHT)
-        pygame.draw.rect(self.game_surface, GRAY if self.current_scene > 0 else DARK_GRAY, back_button)
-        pygame.draw.rect(self.game_surface, BLACK, back_button, 2)
-        
-        back_text = self.button_font.render("Назад", True, BLACK)
-        back_rect = back_text.get_rect(center=back_button.center)
-        self.game_surface.blit(back_text, back_rect)
+        back_color = self.get_button_color(back_button, self.current_scene > 0)
+        self.game_surface.blit(self.ui.get_button("Назад", back_button.size, back_color), back_button)
         
         # Кнопка "Вперед"
-        forward_button = pygame.Rect(game_width - BUTTON_WIDTH - BUTTON_PADDING, 
-                                   button_y, BUTTON_WIDTH, BUTTON_HEIGHT)
-        pygame.draw.rect(self.game_surface, GRAY if self.current_scene < len(self.scenes) - 1 else DARK_GRAY, 
-                       forward_button)
-        pygame.draw.rect(self.game_surface, BLACK, forward_button, 2)
-        
-        forward_text = self.button_font.render("Вперед", True, BLACK)
-        forward_rect = forward_text.get_rect(center=forward_button.center)
-        self.game_surface.blit(forward_text, forward_rect)
+        forward_color = self.get_button_color(forward_button, self.story.can_advance(self.current_scene))
+        self.game_surface.blit(self.ui.get_button("Вперед", forward_button.size, forward_color), 
+                               forward_button)
         
         self.back_button = back_button
         self.forward_button = forward_button
 
+    def get_button_color(self, button, enabled=True):
+        """
+        Возвращает цвет кнопки с учетом её доступности и наведения курсора
+        
+        :param button: Прямоугольник кнопки
+        :param enabled: Доступна ли кнопка
+        :return: Цвет кнопки
+        """
+        if not enabled:
+            return DARK_GRAY
+        if self.hovered_button is not None and self.hovered_button == button:
+            return LIGHT_GRAY
+        return GRAY
+
     def handle_navigation(self, pos):
         """
         Обработка нажатий на кнопки навигации
@@ -413,77 +681,46 @@ class Game:
         if self.back_button.collidepoint(pos) and self.current_scene > 0:
             self.current_scene -= 1
             return True
-        elif self.forward_button.collidepoint(pos) and self.current_scene < len(self.scenes) - 1:
-            current_scene = self.scenes[self.current_scene]
-            # Проверяем, есть ли у текущей сцены варианты выбора
-            if current_scene.has_choices():
-                # Если есть, показываем диалог с выбором
-                self.showing_choices = True
-                self.choice_buttons = self.draw_choices(current_scene.choices)
-                return True
-            else:
-                # Проверяем, есть ли у текущей сцены идентификатор следующей сцены
-                if current_scene.next_scene_id:
-                    # Если есть, переходим к указанной сцене
-                    self.go_to_scene(current_scene.next_scene_id)
-                    return True
-                else:
-                    # Если нет, переходим к следующей сцене по порядку
-                    self.current_scene += 1
-                    return True
+        elif self.forward_button.collidepoint(pos) and self.story.can_advance(self.current_scene):
+            return self.advance()
         return False
 
+    def advance(self):
+        """
+        Переход вперед из текущей сцены по графу сюжета: показывает варианты
+        выбора или переходит к следующей сцене
+        
+        :return: True, если из сцены есть переход вперед, иначе False
+        """
+        if self.story.has_choices(self.current_scene):
+            self.show_choices(self.scenes[self.current_scene])
+            return True
+        next_index = self.story.next_scene[self.current_scene]
+        if next_index == NO_SCENE:
+            return False
+        self.go_to_index(next_index)
+        return True
+
     def draw_confirmation_dialog(self):
         """
         Отрисовка диалогового окна подтверждения выхода
+        
+        :return: Пара прямоугольников кнопок ("Да", "Нет")
         """
-        # Получаем размеры игровой поверхности
-        game_width, game_height = self.game_surface.get_size()
+        surface_size = self.game_surface.get_size()
         
         # Затемнение фона
-        overlay = pygame.Surface((game_width, game_height), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 128))
-        self.game_surface.blit(overlay, (0, 0))
-        
-        # Окно диалога
-        dialog_width = 400
-        dialog_height = 150
-        dialog_x = (game_width - dialog_width) // 2
-        dialog_y = (game_height - dialog_height) // 2
-        
-        # Фон диалога
-        pygame.draw.rect(self.game_surface, WHITE, 
-                        (dialog_x, dialog_y, dialog_width, dialog_height))
-        pygame.draw.rect(self.game_surface, BLACK, 
-                        (dialog_x, dialog_y, dialog_width, dialog_height), 2)
-        
-        # Текст
-        text = self.font.render("Вы хотите выйти из игры?", True, BLACK)
-        text_rect = text.get_rect(center=(game_width // 2, dialog_y + 40))
-        self.game_surface.blit(text, text_rect)
+        darken(self.game_surface, 128)
+        
+        # Окно диалога с текстом
+        self.game_surface.blit(self.ui.get_dialog_panel(), get_dialog_rect(surface_size))
         
         # Кнопки
-        button_width = 100
-        button_height = 40
-        padding = 20
-        
-        # Кнопка "Да"
-        yes_button = pygame.Rect(dialog_x + padding, 
-                               dialog_y + dialog_height - button_height - padding,
-                               button_width, button_height)
-        pygame.draw.rect(self.game_surface, GRAY, yes_button)
-        yes_text = self.button_font.render("Да", True, BLACK)
-        yes_rect = yes_text.get_rect(center=yes_button.center)
-        self.game_surface.blit(yes_text, yes_rect)
-        
-        # Кнопка "Нет"
-        no_button = pygame.Rect(dialog_x + dialog_width - button_width - padding,
-                              dialog_y + dialog_height - button_height - padding,
-                              button_width, button_height)
-        pygame.draw.rect(self.game_surface, GRAY, no_button)
-        no_text = self.button_font.render("Нет", True, BLACK)
-        no_rect = no_text.get_rect(center=no_button.center)
-        self.game_surface.blit(no_text, no_rect)
+        yes_button, no_button = get_dialog_buttons(surface_size)
+        self.game_surface.blit(self.ui.get_button("Да", yes_button.size, 
+                                                  self.get_button_color(yes_button), 0), yes_button)
+        self.game_surface.blit(self.ui.get_button("Нет", no_button.size, 
+                                                  self.get_button_color(no_button), 0), no_button)
         
         return yes_button, no_button
 
@@ -509,144 +746,584 @@ class Game:
             print(f"Переключение в полноэкранный режим: {screen_width}x{screen_height}")
             
             # Обновляем размеры игровой поверхности
-            self.game_surface = pygame.Surface((screen_width, screen_height))
+            self.resize_display(screen_width, screen_height)
         else:
             # Возвращаемся в оконный режим
             self.screen = pygame.display.set_mode((self.window_width, self.window_height), pygame.RESIZABLE)
             print(f"Возврат в оконный режим: {self.window_width}x{self.window_height}")
             
             # Обновляем размеры игровой поверхности
-            self.game_surface = pygame.Surface((self.window_width, self.window_height))
+            self.resize_display(self.window_width, self.window_height)
+
+    def resize_display(self, width, height):
+        """
+        Подстраивает вывод под новый размер экрана. В режиме фиксированного
+        логического разрешения меняется только масштаб вывода, иначе
+        игровая поверхность пересоздается под размер экрана.
+        
+        :param width: Новая ширина экрана
+        :param height: Новая высота экрана
+        """
+        self.update_scale_params()
+        if not self.fixed_resolution:
+            self.resize_game_surface(width, height)
+
+    def resize_game_surface(self, width, height):
+        """
+        Пересоздает игровую поверхность под новый размер и сбрасывает
+        все данные, зависящие от размера
+        
+        :param width: Новая ширина
+        :param height: Новая высота
+        """
+        self.game_surface = pygame.Surface((width, height))
+        
+        # Сбрасываем раскладку текста (изменилась ширина текстовой области)
+        # и масштабированных персонажей
+        self.text_layout_cache.invalidate()
+        self.sprite_cache.invalidate()
         
-        # Перемасштабируем все фоны
-        self.rescale_all_backgrounds()
+        # Фон текущей сцены перемасштабируется при отрисовке кадра,
+        # остальные - постепенно, пока игра простаивает
+        self.schedule_background_warmup()
 
     def rescale_all_backgrounds(self):
         """
-        Перемасштабирует все фоновые изображения при изменении размера окна
+        Перемасштабирует все загруженные фоновые изображения под текущий размер игровой поверхности
         """
-        for name, original_bg in self.original_backgrounds.items():
-            self.backgrounds[name] = self.scale_background(original_bg)
+        for name in list(self.original_backgrounds):
+            self.get_background(name)
 
-    def scale_to_screen(self):
+    def get_stale_backgrounds(self):
         """
-        Масштабирует игровую поверхность на весь экран
+        Возвращает имена загруженных фонов, которые еще не масштабированы под текущий размер
+        
+        :return: Список имен фонов
         """
-        # Всегда обновляем параметры масштабирования
-        self.update_scale_params()
+        game_size = self.game_surface.get_size()
+        stale = []
+        for name, original in self.original_backgrounds.items():
+            background = self.backgrounds.peek(name)
+            if original.get_size() != game_size and (background is None or background.get_size() != game_size):
+                stale.append(name)
+        return stale
+
+    def schedule_background_warmup(self):
+        """
+        Планирует постепенное масштабирование фонов, еще не подготовленных под текущий размер
+        """
+        if not self.background_warmup_scheduled:
+            self.background_warmup_scheduled = True
+            self.schedule(BACKGROUND_WARMUP_INTERVAL, self.warm_up_background)
+
+    def warm_up_background(self):
+        """
+        Масштабирует один устаревший фон и планирует следующий.
+        Пока идет изменение размера окна, масштабирование откладывается.
+        Масштабирование прекращается, если копия фона не помещается в бюджет памяти.
+        """
+        self.background_warmup_scheduled = False
+        if self.pending_resize is None:
+            stale = self.get_stale_backgrounds()
+            if not stale or not self.surface_store.has_room(surface_bytes(self.game_surface)):
+                return
+            self.get_background(stale[0])
+            if len(stale) == 1:
+                return
+        self.schedule_background_warmup()
+
+    def scale_to_screen(self, rects=None):
+        """
+        Выводит игровую поверхность на экран одним масштабированием
+        с сохранением пропорций (по краям остаются черные поля)
+        
+        :param rects: Изменившиеся области игровой поверхности (None - весь кадр)
+        :return: Список областей экрана, которые нужно обновить
+        """
+        target = self.scale_params['target']
+        factor = self.scale_params['factor']
+        game_rect = self.game_surface.get_rect()
+        
+        if rects is None:
+            # Поля закрашиваем только при полной перерисовке
+            self.screen.fill(BLACK)
+            rects = [game_rect]
+        rects = [rect.clip(game_rect) for rect in rects]
+        rects = [rect for rect in rects if rect.w and rect.h]
+        
+        if factor:
+            # Целочисленный масштаб: пиксели просто повторяются, поэтому
+            # масштабируем только изменившиеся области
+            screen_rects = []
+            for rect in rects:
+                dest = pygame.Rect(rect.x * factor, rect.y * factor, rect.w * factor, rect.h * factor)
+                if factor == 1:
+                    target.blit(self.game_surface, dest, rect)
+                else:
+                    pygame.transform.scale(self.game_surface.subsurface(rect), dest.size,
+                                           target.subsurface(dest))
+                screen_rects.append(dest.move(target.get_offset()))
+            return screen_rects
+        
+        # Дробный масштаб: сглаживание захватывает соседние пиксели, поэтому
+        # масштабируем весь кадр (в нескольких потоках), а на экране обновляем
+        # только изменившиеся области
+        try:
+            smoothscale(self.game_surface, target.get_size(), target)
+        except ValueError:
+            # Формат экрана не совпадает с форматом игровой поверхности
+            target.blit(smoothscale(self.game_surface, target.get_size()), (0, 0))
+        return [self.game_to_screen_rect(rect) for rect in rects]
+
+    def game_to_screen_rect(self, rect):
+        """
+        Преобразует прямоугольник игровой поверхности в прямоугольник экрана
+        с запасом в один пиксель на сглаживание
+        
+        :param rect: Прямоугольник на игровой поверхности
+        :return: Прямоугольник на экране
+        """
+        target = self.scale_params['target']
+        scale_x = target.get_width() / self.game_surface.get_width()
+        scale_y = target.get_height() / self.game_surface.get_height()
+        left = int(rect.left * scale_x) - 1
+        top = int(rect.top * scale_y) - 1
+        right = int(rect.right * scale_x) + 2
+        bottom = int(rect.bottom * scale_y) + 2
+        screen_rect = pygame.Rect(left, top, right - left, bottom - top)
+        return screen_rect.clip(target.get_rect()).move(target.get_offset())
+
+    def get_mouse_pos(self, screen_pos=None):
+        """
+        Возвращает позицию курсора в координатах игровой поверхности
+        
+        :param screen_pos: Позиция на экране (по умолчанию текущая позиция курсора)
+        :return: Координаты на игровой поверхности (x, y)
+        """
+        if screen_pos is None:
+            # При воспроизведении курсор находится там, где он был при записи
+            screen_pos = self.replayer.mouse_pos if self.replayer is not None else pygame.mouse.get_pos()
+        if self.fixed_resolution:
+            return self.screen_to_game_coordinates(screen_pos)
+        return screen_pos
+
+    def handle_event(self, event):
+        """
+        Обработка одного события Pygame
+        
+        :param event: Событие Pygame
+        """
+        if event.type == pygame.QUIT:
+            self.running = False
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_ESCAPE:
+                self.show_exit_dialog = True
+            elif event.key == pygame.K_F11:
+                self.toggle_fullscreen()
+            elif event.key == pygame.K_RETURN and (event.mod & pygame.KMOD_ALT):
+                self.toggle_fullscreen()
+            elif event.key == pygame.K_F3 and self.frame_profiler is not None:
+                self.toggle_performance_overlay()
+            elif event.key == pygame.K_F4 and self.frame_profiler is not None:
+                self.frame_profiler.start_capture(FRAME_CAPTURE_FRAMES, FRAME_CAPTURE_PATH)
+        elif event.type == pygame.VIDEORESIZE and not self.is_fullscreen:
+            # При перетаскивании края окна события идут сериями, поэтому
+            # применяем только последний размер после небольшой задержки
+            if self.pending_resize is None:
+                self.schedule(RESIZE_DELAY, self.apply_pending_resize)
+            self.pending_resize = (event.w, event.h)
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            # Содержимое окна потеряно, перерисовываем его полностью
+            self.invalidate()
+        elif event.type == pygame.MOUSEMOTION:
+            self.update_hover(self.get_mouse_pos(event.pos))
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            mouse_pos = self.get_mouse_pos(event.pos)
             
-        scaled_width = self.scale_params['scaled_width']
-        scaled_height = self.scale_params['scaled_height']
-        pos_x = self.scale_params['pos_x']
-        pos_y = self.scale_params['pos_y']
+            if self.show_exit_dialog:
+                yes_button, no_button = get_dialog_buttons(self.game_surface.get_size())
+                if yes_button.collidepoint(mouse_pos):
+                    self.running = False
+                elif no_button.collidepoint(mouse_pos):
+                    self.show_exit_dialog = False
+            elif self.showing_choices:
+                # Обработка выбора
+                self.handle_choice(mouse_pos)
+            else:
+                # Обработка навигации
+                if not self.handle_navigation(mouse_pos):
+                    # Клик не по кнопкам: показываем выбор или переходим к следующей сцене
+                    self.advance()
+
+    def apply_pending_resize(self):
+        """
+        Применяет последний размер окна из серии событий изменения размера
+        """
+        if self.pending_resize is None or self.is_fullscreen:
+            self.pending_resize = None
+            return
         
-        # Масштабируем игровую поверхность
-        scaled_surface = pygame.transform.smoothscale(self.game_surface, (scaled_width, scaled_height))
+        width, height = self.pending_resize
+        self.pending_resize = None
         
-        # Очищаем экран
-        self.screen.fill((0, 0, 0))
+        # Обновляем размеры окна при изменении размера
+        self.window_width = width
+        self.window_height = height
+        self.screen = pygame.display.set_mode((width, height), pygame.RESIZABLE)
+        print(f"Изменение размера окна: {width}x{height}")
+        
+        # Обновляем размеры игровой поверхности
+        self.resize_display(width, height)
+
+    def invalidate(self, rect=None):
+        """
+        Помечает область экрана как требующую перерисовки
         
-        # Отображаем масштабированную поверхность
-        self.screen.blit(scaled_surface, (pos_x, pos_y))
+        :param rect: Прямоугольник области или None для всего экрана
+        """
+        if rect is None:
+            self.needs_full_redraw = True
+        else:
+            self.dirty_rects.append(pygame.Rect(rect))
+
+    def get_frame_state(self):
+        """
+        Возвращает состояние, от которого зависит содержимое всего кадра.
+        Изменение состояния (смена сцены, открытие диалога или выбора,
+        изменение размера поверхности или окна) требует полной перерисовки.
+        
+        :return: Кортеж с состоянием кадра
+        """
+        return (self.current_scene, len(self.scenes), self.showing_choices,
+                self.show_exit_dialog, self.game_surface.get_size(), self.screen.get_size())
+
+    def get_hover_targets(self):
+        """
+        Возвращает прямоугольники кнопок, которые сейчас реагируют на наведение
+        
+        :return: Список прямоугольников кнопок
+        """
+        if self.show_exit_dialog:
+            return list(get_dialog_buttons(self.game_surface.get_size()))
+        if self.showing_choices:
+            return [button for button, target in self.choice_buttons]
+        return [self.back_button, self.forward_button]
+
+    def update_hover(self, pos):
+        """
+        Обновляет кнопку под курсором и помечает изменившиеся кнопки для перерисовки
+        
+        :param pos: Позиция курсора (x, y)
+        """
+        hovered = None
+        for button in self.get_hover_targets():
+            if button.collidepoint(pos):
+                hovered = button
+                break
+        
+        if hovered != self.hovered_button:
+            if self.hovered_button is not None:
+                self.invalidate(self.hovered_button)
+            if hovered is not None:
+                self.invalidate(hovered)
+            self.hovered_button = hovered
+
+    def render_frame(self):
+        """
+        Отрисовка всех слоев кадра на игровую поверхность
+        """
+        if self.current_scene >= len(self.scenes):
+            return
+        
+        current_scene = self.scenes[self.current_scene]
+        
+        # Загружаем изображения сцены перед её первым показом,
+        # а изображения следующих сцен - заранее в фоновом потоке
+        if self.prefetcher is not None:
+            self.prefetcher.scene_shown(self)
+        if self.pinned_scene != self.current_scene:
+            self.pinned_scene = self.current_scene
+            self.pin_scene_assets()
+        self.load_scene_assets(current_scene)
+        
+        # Рендерим на игровую поверхность
+        self.game_surface.fill(WHITE)
+        
+        # Отрисовка фона
+        with self.frame_phase("background"):
+            background = self.get_background(current_scene.background)
+            if background is not None:
+                self.game_surface.blit(background, (0, 0))
+        
+        # Отрисовка персонажей
+        if current_scene.character in self.characters:
+            with self.frame_phase("draw_character"):
+                self.draw_character(current_scene.character, 
+                                 current_scene.character_position, 
+                                 current_scene.character_scale)
+        
+        # Отрисовка текстового окна и текста
+        with self.frame_phase("draw_text_box"):
+            self.draw_text_box(current_scene)
+        
+        # Отрисовка кнопок навигации
+        if not self.showing_choices:
+            with self.frame_phase("draw_navigation_buttons"):
+                self.draw_navigation_buttons()
+        
+        # Отрисовка диалога подтверждения выхода, если нужно
+        if self.show_exit_dialog:
+            with self.frame_phase("dialog"):
+                self.draw_confirmation_dialog()
+        
+        # Отрисовка вариантов выбора, если нужно
+        if self.showing_choices:
+            with self.frame_phase("draw_choices"):
+                self.choice_buttons = self.draw_choices(current_scene.choices,
+                                                        self.story.get_choice_targets(self.current_scene))
+        
+        # Оверлей производительности рисуется поверх всех слоев
+        if self.show_performance_overlay:
+            self.draw_performance_overlay()
+
+    def toggle_performance_overlay(self):
+        """
+        Показывает или скрывает оверлей производительности
+        """
+        self.show_performance_overlay = not self.show_performance_overlay
+        self.overlay_rect = None
+        self.invalidate()
+        if self.show_performance_overlay:
+            self.schedule(FRAME_OVERLAY_INTERVAL, self.refresh_performance_overlay)
+
+    def refresh_performance_overlay(self):
+        """
+        Периодически перерисовывает оверлей, пока он показан
+        """
+        if not self.show_performance_overlay:
+            return
+        if self.overlay_rect is not None:
+            self.invalidate(self.overlay_rect)
+        self.schedule(FRAME_OVERLAY_INTERVAL, self.refresh_performance_overlay)
+
+    def get_performance_lines(self):
+        """
+        Возвращает строки оверлея производительности: перцентили этапов кадра,
+        доли попаданий в кэши и память изображений
+        
+        :return: Список строк
+        """
+        lines = ["этап: p50 / p95 / p99 мс"]
+        for name, count, mean, p50, p95, p99, maximum in self.frame_profiler.get_stats():
+            lines.append(f"{name}: {p50:.2f} / {p95:.2f} / {p99:.2f}")
+        lines.append(f"кэш текста: {self.text_layout_cache.cache.hit_rate():.0%}, "
+                     f"интерфейса: {self.ui.cache.hit_rate():.0%}, "
+                     f"спрайтов: {self.sprite_cache.cache.hit_rate():.0%}")
+        if self.prefetcher is not None:
+            lines.append(f"предзагрузка: {self.prefetcher.hit_rate():.0%}")
+        store = self.surface_store
+        budget = f"{store.max_bytes / 1024 / 1024:.0f}" if store.max_bytes is not None else "-"
+        lines.append(f"изображения: {store.total_bytes / 1024 / 1024:.1f} / {budget} МБ, "
+                     f"вытеснено {store.evictions}")
+        return lines
+
+    def draw_performance_overlay(self):
+        """
+        Отрисовка оверлея производительности в левом верхнем углу
+        """
+        if self.overlay_font is None:
+            self.overlay_font = pygame.font.Font(None, 20)
+        rect = draw_overlay(self.game_surface, self.overlay_font, self.get_performance_lines())
+        # Оверлей может вырасти, поэтому обновляем область, покрывающую и прежний размер
+        self.overlay_rect = rect.union(self.overlay_rect) if self.overlay_rect else rect
+
+    def present_frame(self):
+        """
+        Вывод игровой поверхности на экран.
+        При полной перерисовке обновляется весь экран, иначе только изменившиеся области.
+        """
+        if self.fixed_resolution:
+            if self.needs_full_redraw or not self.dirty_rendering:
+                self.scale_to_screen()
+                pygame.display.flip()
+            else:
+                pygame.display.update(self.scale_to_screen(self.dirty_rects))
+        elif self.needs_full_redraw or not self.dirty_rendering:
+            self.screen.blit(self.game_surface, (0, 0))
+            pygame.display.flip()
+        else:
+            screen_rect = self.screen.get_rect()
+            rects = [rect.clip(screen_rect) for rect in self.dirty_rects]
+            for rect in rects:
+                self.screen.blit(self.game_surface, rect, rect)
+            pygame.display.update(rects)
+        
+        self.needs_full_redraw = False
+        self.dirty_rects = []
+
+    def schedule(self, delay_ms, callback):
+        """
+        Откладывает вызов функции. В режиме простоя цикл проснется к нужному времени.
+        
+        :param delay_ms: Задержка в миллисекундах
+        :param callback: Функция без аргументов
+        """
+        self.timers.append((pygame.time.get_ticks() + delay_ms, callback))
+
+    def run_timers(self):
+        """
+        Выполняет отложенные вызовы, время которых наступило
+        """
+        if not self.timers:
+            return
+        
+        now = pygame.time.get_ticks()
+        due = [timer for timer in self.timers if timer[0] <= now]
+        self.timers = [timer for timer in self.timers if timer[0] > now]
+        for deadline, callback in due:
+            callback()
+
+    def get_idle_timeout(self):
+        """
+        Возвращает время ожидания события в режиме простоя
+        
+        :return: Время в миллисекундах или None, если ждать нельзя
+        """
+        if not self.idle_mode or self.animating:
+            return None
+        if self.needs_full_redraw or self.dirty_rects:
+            return None
+        
+        timeout = IDLE_MAX_WAIT
+        if self.timers:
+            next_deadline = min(deadline for deadline, callback in self.timers)
+            timeout = min(timeout, max(next_deadline - pygame.time.get_ticks(), 0))
+        return timeout
+
+    def get_events(self):
+        """
+        Получает события из очереди. В режиме простоя блокируется до прихода
+        события или срабатывания ближайшего таймера.
+        
+        :return: Список событий
+        """
+        if self.replayer is not None:
+            return self.replayer.get_events(self)
+        
+        timeout = self.get_idle_timeout()
+        if not timeout:
+            return pygame.event.get()
+        
+        if not self.native_event_wait:
+            pygame.time.wait(min(timeout, IDLE_POLL_INTERVAL))
+            return pygame.event.get()
+        
+        event = pygame.event.wait(timeout)
+        if event.type == pygame.NOEVENT:
+            return []
+        return [event] + pygame.event.get()
+
+    def set_allowed_events(self):
+        """
+        Ограничивает очередь событий типами, которые обрабатывает движок,
+        чтобы лишние события не будили цикл в режиме простоя
+        """
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([
+            pygame.QUIT,
+            pygame.KEYDOWN,
+            pygame.MOUSEBUTTONDOWN,
+            pygame.MOUSEMOTION,
+            pygame.VIDEORESIZE,
+            pygame.VIDEOEXPOSE,
+            pygame.WINDOWEXPOSED,
+            pygame.USEREVENT,
+            PREFETCH_EVENT,
+        ])
 
     def run(self):
         """
         Основной игровой цикл
         """
-        show_exit_dialog = False
         clock = pygame.time.Clock()
+        self.set_allowed_events()
+        
+        # Граф сюжета строится здесь, если его не построили сразу после загрузки сюжета
+        if self.story is None:
+            self.compile_story()
+        
+        # Замер времени запуска продолжается до вывода первого кадра
+        first_frame = self.profiler.begin("первый кадр") if self.profiler is not None else None
+        
+        if self.recorder is not None:
+            self.recorder.start(self)
+        if self.replayer is not None:
+            self.replayer.start(self)
+        # Воспроизведение с максимальной скоростью не ограничивается FPS,
+        # иначе время кадра в отчете было бы временем ожидания ограничителя
+        limit_fps = self.replayer is None or self.replayer.realtime
         
         while self.running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        show_exit_dialog = True
-                    elif event.key == pygame.K_F11:
-                        self.toggle_fullscreen()
-                    elif event.key == pygame.K_RETURN and (event.mod & pygame.KMOD_ALT):
-                        self.toggle_fullscreen()
-                elif event.type == pygame.VIDEORESIZE and not self.is_fullscreen:
-                    # Обновляем размеры окна при изменении размера
-                    self.window_width = event.w
-                    self.window_height = event.h
-                    self.screen = pygame.display.set_mode((event.w, event.h), pygame.RESIZABLE)
-                    print(f"Изменение размера окна: {event.w}x{event.h}")
-                    
-                    # Обновляем размеры игровой поверхности
-                    self.game_surface = pygame.Surface((event.w, event.h))
-                    
-                    # Перемасштабируем все фоны
-                    self.rescale_all_backgrounds()
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    # Обрабатываем клики мыши напрямую, без преобразования координат
-                    mouse_pos = pygame.mouse.get_pos()
-                    
-                    if show_exit_dialog:
-                        yes_button, no_button = self.draw_confirmation_dialog()
-                        if yes_button.collidepoint(mouse_pos):
-                            self.running = False
-                        elif no_button.collidepoint(mouse_pos):
-                            show_exit_dialog = False
-                    elif self.showing_choices:
-                        # Обработка выбора
-                        self.handle_choice(mouse_pos)
-                    else:
-                        # Обработка навигации
-                        if not self.handle_navigation(mouse_pos):
-                            # Если клик не по кнопкам и у текущей сцены есть выбор, показываем его
-                            current_scene = self.scenes[self.current_scene]
-                            if current_scene.has_choices():
-                                self.showing_choices = True
-                                self.choice_buttons = self.draw_choices(current_scene.choices)
-                            # Иначе переходим к следующей сцене
-                            elif current_scene.next_scene_id:
-                                # Если у сцены есть идентификатор следующей сцены, переходим к ней
-                                self.go_to_scene(current_scene.next_scene_id)
-                            elif self.current_scene < len(self.scenes) - 1:
-                                self.current_scene += 1
-                    
-            if self.current_scene < len(self.scenes):
-                current_scene = self.scenes[self.current_scene]
-                
-                # Рендерим на игровую поверхность
-                self.game_surface.fill(WHITE)
-                
-                # Отрисовка фона
-                if current_scene.background in self.backgrounds:
-                    self.game_surface.blit(self.backgrounds[current_scene.background], (0, 0))
-                
-                # Отрисовка персонажей
-                if current_scene.character in self.characters:
-                    self.draw_character(current_scene.character, 
-                                     current_scene.character_position, 
-                                     current_scene.character_scale)
-                
-                # Отрисовка текстового окна и текста
-                self.draw_text_box(current_scene)
-                
-                # Отрисовка кнопок навигации
-                if not self.showing_choices:
-                    self.draw_navigation_buttons()
-                
-                # Отрисовка диалога подтверждения выхода, если нужно
-                if show_exit_dialog:
-                    self.draw_confirmation_dialog()
-                
-                # Отрисовка вариантов выбора, если нужно
-                if self.showing_choices:
-                    self.choice_buttons = self.draw_choices(current_scene.choices)
-                
-                # Отображаем игровую поверхность на экране
-                self.screen.blit(self.game_surface, (0, 0))
-                
-            pygame.display.flip()
-            clock.tick(60)  # Ограничиваем FPS до 60
+            events = self.get_events()
+            input_time = time.perf_counter()
+            if self.recorder is not None:
+                self.recorder.record(events)
+            if events:
+                with self.frame_phase("events"):
+                    for event in events:
+                        self.handle_event(event)
+            
+            self.run_timers()
+            
+            # Забираем изображения, загруженные фоновым потоком
+            if self.prefetcher is not None:
+                self.prefetcher.collect(self)
+            
+            # Смена сцены, диалога или размера окна требует полной перерисовки
+            frame_state = self.get_frame_state()
+            if frame_state != self.last_frame_state or not self.dirty_rendering:
+                self.last_frame_state = frame_state
+                self.invalidate()
+                self.update_hover(self.get_mouse_pos())
             
+            # Перерисовываем кадр, только если что-то изменилось
+            if self.needs_full_redraw or self.dirty_rects:
+                frame_start = time.perf_counter()
+                with self.profile_phase("отрисовка кадра"), self.frame_phase("render_frame"):
+                    self.render_frame()
+                with self.profile_phase("вывод на экран"), self.frame_phase("flip"):
+                    self.present_frame()
+                if self.frame_profiler is not None:
+                    self.frame_profiler.frame_done()
+                if self.replayer is not None:
+                    self.replayer.frame_presented(self, input_time, frame_start)
+                if first_frame is not None:
+                    self.finish_startup_profile(first_frame)
+                    first_frame = None
+                if limit_fps:
+                    clock.tick(FPS)  # Ограничиваем FPS
+            elif limit_fps and (not self.idle_mode or self.animating):
+                clock.tick(FPS)
+        
+        if self.replayer is not None:
+            self.replayer.finish()
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
         pygame.quit()
         sys.exit()
         
+    def finish_startup_profile(self, first_frame):
+        """
+        Завершает замер времени запуска после вывода первого кадра
+        
+        :param first_frame: Метка этапа первого кадра (StartupProfiler.begin)
+        """
+        self.profiler.end(first_frame)
+        self.profiler.finish()
+        self.profiler = None
+        if self.exit_after_first_frame:
+            self.running = False
+
     def screen_to_game_coordinates(self, screen_pos):
         """
         Преобразует координаты экрана в координаты игровой поверхности
@@ -654,10 +1331,6 @@ class Game:
         :param screen_pos: Координаты на экране (x, y)
         :return: Координаты на игровой поверхности (x, y)
         """
-        # Обновляем параметры масштабирования, если они не установлены
-        if not hasattr(self, 'scale_params'):
-            self.update_scale_params()
-            
         x, y = screen_pos
         pos_x = self.scale_params['pos_x']
         pos_y = self.scale_params['pos_y']
@@ -670,97 +1343,45 @@ class Game:
             return (-1, -1)  # Точка вне игровой области
         
         # Преобразуем координаты
-        game_x = int((x - pos_x) * WINDOW_WIDTH / scaled_width)
-        game_y = int((y - pos_y) * WINDOW_HEIGHT / scaled_height)
+        game_width, game_height = self.game_surface.get_size()
+        game_x = int((x - pos_x) * game_width / scaled_width)
+        game_y = int((y - pos_y) * game_height / scaled_height)
         
         return (game_x, game_y)
         
-    def create_default_background(self, name="bg_room"):
-        """
-        Создает фоновое изображение по умолчанию, если оно не существует
-        
-        :param name: Имя фона
-        :return: Путь к созданному изображению
-        """
-        image_path = f"{BACKGROUNDS_PATH}{name}.png"
-        
-        # Проверяем, существует ли директория для фонов
-        os.makedirs(os.path.dirname(image_path), exist_ok=True)
-        
-        # Если файл уже существует, просто возвращаем путь
-        if os.path.exists(image_path):
-            return image_path
-        
-        # Создаем простой фон в зависимости от имени
-        bg_surface = pygame.Surface((1280, 720))  # Создаем с большим разрешением для лучшего качества
-        
-        if "room" in name.lower():
-            # Комната
-            bg_surface.fill((220, 220, 240))  # Светло-голубой фон для стен
-            pygame.draw.rect(bg_surface, (180, 150, 100), (0, 500, 1280, 220))  # Пол
-            pygame.draw.rect(bg_surface, (150, 150, 150), (500, 150, 300, 350))  # Окно
-            pygame.draw.rect(bg_surface, (120, 120, 120), (500, 150, 300, 350), 10)  # Рама окна
-        elif "lab" in name.lower():
-            # Лаборатория
-            bg_surface.fill((240, 240, 240))  # Белый фон для стен
-            pygame.draw.rect(bg_surface, (200, 200, 200), (0, 500, 1280, 220))  # Пол
-            # Лабораторное оборудование
-            for i in range(3):
-                pygame.draw.rect(bg_surface, (100, 100, 120), (100 + i*400, 200, 200, 300))  # Шкафы
-                pygame.draw.rect(bg_surface, (80, 80, 100), (100 + i*400, 200, 200, 300), 5)  # Контуры шкафов
-        elif "manufacture" in name.lower():
-            # Производственная зона
-            bg_surface.fill((200, 200, 200))  # Серый фон для стен
-            pygame.draw.rect(bg_surface, (100, 100, 100), (0, 500, 1280, 220))  # Пол
-            # Оборудование
-            pygame.draw.rect(bg_surface, (80, 80, 80), (200, 300, 400, 200))  # Станок
-            pygame.draw.rect(bg_surface, (80, 80, 80), (700, 300, 300, 200))  # Станок 2
-        elif "music" in name.lower():
-            # Музыкальный класс
-            bg_surface.fill((250, 240, 230))  # Теплый фон для стен
-            pygame.draw.rect(bg_surface, (180, 160, 140), (0, 500, 1280, 220))  # Деревянный пол
-            # Музыкальные инструменты
-            pygame.draw.ellipse(bg_surface, (60, 40, 20), (300, 200, 300, 400))  # Пианино
-            pygame.draw.rect(bg_surface, (60, 40, 20), (700, 300, 200, 200))  # Шкаф с нотами
-        elif "residential" in name.lower():
-            # Жилая зона
-            bg_surface.fill((240, 230, 220))  # Теплый фон для стен
-            pygame.draw.rect(bg_surface, (180, 150, 120), (0, 500, 1280, 220))  # Деревянный пол
-            # Мебель
-            pygame.draw.rect(bg_surface, (150, 120, 90), (200, 300, 400, 200))  # Диван
-            pygame.draw.rect(bg_surface, (140, 110, 80), (700, 350, 150, 150))  # Стол
-        else:
-            # Общий фон по умолчанию
-            bg_surface.fill((220, 220, 240))  # Светло-голубой фон
-            pygame.draw.rect(bg_surface, (180, 150, 100), (0, 500, 1280, 220))  # Пол
-        
-        try:
-            pygame.image.save(bg_surface, image_path)
-            print(f"Создан фон по умолчанию: {name}")
-        except Exception as e:
-            print(f"Ошибка при создании фона {name}: {e}")
-        
-        return image_path
-
     def update_scale_params(self):
         """
-        Обновляет параметры масштабирования на основе текущего размера экрана
+        Обновляет параметры масштабирования на основе текущего размера экрана.
+        Вызывается только при изменении размера или режима экрана.
         """
         screen_width = self.screen.get_width()
         screen_height = self.screen.get_height()
+        game_width, game_height = self.game_surface.get_size()
         
-        # Вычисляем соотношение сторон
-        game_ratio = WINDOW_WIDTH / WINDOW_HEIGHT
-        screen_ratio = screen_width / screen_height
+        # Наибольший целый масштаб, при котором кадр помещается на экран
+        factor = min(screen_width // game_width, screen_height // game_height)
         
-        if screen_ratio > game_ratio:
-            # Экран шире, чем игра
-            scaled_height = screen_height
-            scaled_width = int(scaled_height * game_ratio)
+        if INTEGER_SCALING and factor >= 1:
+            scaled_width = game_width * factor
+            scaled_height = game_height * factor
         else:
-            # Экран уже, чем игра
-            scaled_width = screen_width
-            scaled_height = int(scaled_width / game_ratio)
+            # Вычисляем соотношение сторон
+            game_ratio = game_width / game_height
+            screen_ratio = screen_width / screen_height
+            
+            if screen_ratio > game_ratio:
+                # Экран шире, чем игра
+                scaled_height = screen_height
+                scaled_width = int(scaled_height * game_ratio)
+            else:
+                # Экран уже, чем игра
+                scaled_width = screen_width
+                scaled_height = int(scaled_width / game_ratio)
+            
+            # Масштаб оказался целым - можно обойтись без сглаживания
+            if (factor < 1 or scaled_width != game_width * factor
+                    or scaled_height != game_height * factor):
+                factor = 0
         
         # Вычисляем позицию для центрирования
         pos_x = (screen_width - scaled_width) // 2
@@ -771,10 +1392,11 @@ class Game:
             'scaled_width': scaled_width,
             'scaled_height': scaled_height,
             'pos_x': pos_x,
-            'pos_y': pos_y
+            'pos_y': pos_y,
+            'factor': factor,  # Целый масштаб или 0, если масштаб дробный
+            # Область экрана, в которую выводится кадр
+            'target': self.screen.subsurface((pos_x, pos_y, scaled_width, scaled_height))
         }
-        
-        print(f"Обновлены параметры масштабирования: {self.scale_params}") 
 
     def go_to_scene(self, scene_id):
         """
@@ -784,80 +1406,97 @@ class Game:
         :return: True, если переход выполнен успешно, иначе False
         """
         if scene_id in self.scene_map:
-            self.current_scene = self.scene_map[scene_id]
-            self.showing_choices = False
-            self.choice_buttons = []
-            
-            # Выполняем действия при входе в сцену
-            current_scene = self.scenes[self.current_scene]
-            for action in current_scene.on_enter:
-                action_type = action.get("action")
-                if action_type == "set_variable":
-                    self.set_variable(action["variable"], action["value"])
-                    
+            self.go_to_index(self.scene_map[scene_id])
             return True
         return False
+
+    def go_to_index(self, index):
+        """
+        Переход к сцене по её индексу в скомпилированном графе сюжета
+        
+        :param index: Индекс сцены
+        """
+        self.current_scene = index
+        self.showing_choices = False
+        self.choice_buttons = []
+        self.choice_menu = None
         
-    def draw_choices(self, choices):
+        # Выполняем действия при входе в сцену
+        current_scene = self.scenes[index]
+        self.check_compiled_choices(index, current_scene)
+        for action in current_scene.on_enter:
+            action_type = action.get("action")
+            if action_type == "set_variable":
+                self.set_variable(action["variable"], to_plain(action["value"]))
+        
+    def show_choices(self, scene):
+        """
+        Открывает меню выбора сцены
+        
+        :param scene: Сцена с вариантами выбора
+        """
+        self.check_compiled_choices(self.current_scene, scene)
+        self.showing_choices = True
+        self.choice_buttons = self.get_choice_menu(scene.choices,
+                                                   self.story.get_choice_targets(self.current_scene)).choice_buttons
+
+    def check_compiled_choices(self, index, scene):
+        """
+        Проверяет, что варианты выбора сцены не менялись после построения графа
+        переходов (Scene.add_choice после компиляции сюжета)
+        
+        :param index: Индекс сцены
+        :param scene: Сцена
+        :raises StoryError: Если количество вариантов не совпадает с графом
+        """
+        if self.story is not None and len(scene.choices) != self.story.get_choice_count(index):
+            source = f"сцена '{scene.scene_id}'" if scene.scene_id is not None else f"сцена #{index}"
+            raise StoryError([f"{source}: варианты выбора изменены после компиляции сюжета, "
+                              f"добавляйте их через Game.add_choice"])
+
+    def get_choice_menu(self, choices, targets):
+        """
+        Возвращает меню выбора, вычисляя его только при открытии, после изменения
+        переменных из условий вариантов или размера игровой поверхности
+        
+        :param choices: Список вариантов выбора
+        :param targets: Индексы сцен, к которым ведут варианты (из графа сюжета)
+        :return: Объект ChoiceMenu
+        """
+        surface_size = self.game_surface.get_size()
+        if self.choice_menu is None or not self.choice_menu.is_valid(choices, surface_size):
+            # Фильтруем выборы по условиям
+            filtered_choices = []
+            for choice, target in zip(choices, targets):
+                if not choice.condition or self.check_condition(choice.condition):
+                    filtered_choices.append((choice, target))
+            self.choice_menu = ChoiceMenu(choices, filtered_choices, surface_size)
+        return self.choice_menu
+
+    def draw_choices(self, choices, targets):
         """
         Отрисовка вариантов выбора
         
         :param choices: Список вариантов выбора
+        :param targets: Индексы сцен, к которым ведут варианты
         :return: Список прямоугольников кнопок выбора
         """
-        # Фильтруем выборы по условиям
-        filtered_choices = []
-        for choice in choices:
-            condition = choice.get("condition")
-            if not condition or self.check_condition(condition):
-                filtered_choices.append(choice)
+        menu = self.get_choice_menu(choices, targets)
         
         # Если нет доступных выборов, возвращаем пустой список
-        if not filtered_choices:
+        if not menu.buttons:
             return []
         
-        # Получаем размеры игровой поверхности
-        game_width, game_height = self.game_surface.get_size()
-        
-        # Параметры кнопок выбора
-        choice_width = game_width * 0.8
-        choice_height = 50
-        choice_padding = 10
-        
-        # Вычисляем общую высоту всех кнопок
-        total_height = len(filtered_choices) * (choice_height + choice_padding) - choice_padding
-        
-        # Начальная позиция Y для первой кнопки
-        start_y = (game_height - total_height) // 2
-        
-        # Создаем затемнение фона
-        overlay = pygame.Surface((game_width, game_height), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 160))  # Полупрозрачный черный
-        self.game_surface.blit(overlay, (0, 0))
+        # Затемнение фона
+        darken(self.game_surface, 160)
         
         # Отрисовываем кнопки выбора
-        choice_buttons = []
-        for i, choice in enumerate(filtered_choices):
-            # Вычисляем позицию кнопки
-            button_x = (game_width - choice_width) // 2
-            button_y = start_y + i * (choice_height + choice_padding)
-            
-            # Создаем прямоугольник кнопки
-            button_rect = pygame.Rect(button_x, button_y, choice_width, choice_height)
-            
-            # Отрисовываем кнопку
-            pygame.draw.rect(self.game_surface, (200, 200, 200), button_rect)
-            pygame.draw.rect(self.game_surface, (0, 0, 0), button_rect, 2)
-            
-            # Отрисовываем текст кнопки
-            text_surface = self.font.render(choice["text"], True, (0, 0, 0))
-            text_rect = text_surface.get_rect(center=button_rect.center)
-            self.game_surface.blit(text_surface, text_rect)
-            
-            # Добавляем кнопку в список
-            choice_buttons.append((button_rect, choice["next_scene"]))
+        for button_rect, choice in menu.buttons:
+            button = self.ui.get_button(choice.text, button_rect.size, 
+                                        self.get_button_color(button_rect), font=self.font)
+            self.game_surface.blit(button, button_rect)
         
-        return choice_buttons
+        return menu.choice_buttons
         
     def handle_choice(self, pos):
         """
@@ -866,9 +1505,9 @@ class Game:
         :param pos: Позиция клика (x, y)
         :return: True, если клик был по варианту выбора, иначе False
         """
-        for button, next_scene in self.choice_buttons:
+        for button, target in self.choice_buttons:
             if button.collidepoint(pos):
-                self.go_to_scene(next_scene)
+                self.go_to_index(target)
                 return True
         return False
         
@@ -879,8 +1518,14 @@ class Game:
         :param name: Имя переменной
         :param value: Значение переменной
         """
+        changed = self.variables.get(name) != value or name not in self.variables
         self.variables[name] = value
         
+        # Меню выбора зависит от переменных в условиях вариантов
+        if changed and self.choice_menu is not None and name in self.choice_menu.dependencies:
+            self.choice_menu = None
+            self.invalidate()
+        
     def get_variable(self, name, default=None):
         """
         Возвращает значение переменной
@@ -938,11 +1583,11 @@ class Game:
         
         # Проверка на равенство
         if "equals" in condition:
-            return actual_value == condition["equals"]
+            return actual_value == to_plain(condition["equals"])
             
         # Проверка на неравенство
         if "not_equals" in condition:
-            return actual_value != condition["not_equals"]
+            return actual_value != to_plain(condition["not_equals"])
             
         # Проверка на больше
         if "greater_than" in condition:
@@ -961,5 +1606,5 @@ class Game:
             return actual_value not in condition["not_in"]
             
         # По умолчанию проверяем на равенство expected_value
-        expected_value = condition.get("value")
+        expected_value = to_plain(condition.get("value"))
         return actual_value == expected_value 
\ No newline at end of file
@@ -0,0 +1,91 @@
+import os
+
+import pygame
+from engine.config import BLUE, WHITE
+
+def draw_default_background(name):
+    """
+    Рисует фон по умолчанию, оформление которого зависит от имени
+    (комната, лаборатория, производство, музыкальный класс, жилая зона)
+
+    :param name: Имя фона
+    :return: Поверхность с фоном
+    """
+    # Создаем простой фон в зависимости от имени
+    bg_surface = pygame.Surface((1280, 720))  # Создаем с большим разрешением для лучшего качества
+    
+    if "room" in name.lower():
+        # Комната
+        bg_surface.fill((220, 220, 240))  # Светло-голубой фон для стен
+        pygame.draw.rect(bg_surface, (180, 150, 100), (0, 500, 1280, 220))  # Пол
+        pygame.draw.rect(bg_surface, (150, 150, 150), (500, 150, 300, 350))  # Окно
+        pygame.draw.rect(bg_surface, (120, 120, 120), (500, 150, 300, 350), 10)  # Рама окна
+    elif "lab" in name.lower():
+        # Лаборатория
+        bg_surface.fill((240, 240, 240))  # Белый фон для стен
+        pygame.draw.rect(bg_surface, (200, 200, 200), (0, 500, 1280, 220))  # Пол
+        # Лабораторное оборудование
+        for i in range(3):
+            pygame.draw.rect(bg_surface, (100, 100, 120), (100 + i*400, 200, 200, 300))  # Шкафы
+            pygame.draw.rect(bg_surface, (80, 80, 100), (100 + i*400, 200, 200, 300), 5)  # Контуры шкафов
+    elif "manufacture" in name.lower():
+        # Производственная зона
+        bg_surface.fill((200, 200, 200))  # Серый фон для стен
+        pygame.draw.rect(bg_surface, (100, 100, 100), (0, 500, 1280, 220))  # Пол
+        # Оборудование
+        pygame.draw.rect(bg_surface, (80, 80, 80), (200, 300, 400, 200))  # Станок
+        pygame.draw.rect(bg_surface, (80, 80, 80), (700, 300, 300, 200))  # Станок 2
+    elif "music" in name.lower():
+        # Музыкальный класс
+        bg_surface.fill((250, 240, 230))  # Теплый фон для стен
+        pygame.draw.rect(bg_surface, (180, 160, 140), (0, 500, 1280, 220))  # Деревянный пол
+        # Музыкальные инструменты
+        pygame.draw.ellipse(bg_surface, (60, 40, 20), (300, 200, 300, 400))  # Пианино
+        pygame.draw.rect(bg_surface, (60, 40, 20), (700, 300, 200, 200))  # Шкаф с нотами
+    elif "residential" in name.lower():
+        # Жилая зона
+        bg_surface.fill((240, 230, 220))  # Теплый фон для стен
+        pygame.draw.rect(bg_surface, (180, 150, 120), (0, 500, 1280, 220))  # Деревянный пол
+        # Мебель
+        pygame.draw.rect(bg_surface, (150, 120, 90), (200, 300, 400, 200))  # Диван
+        pygame.draw.rect(bg_surface, (140, 110, 80), (700, 350, 150, 150))  # Стол
+    else:
+        # Общий фон по умолчанию
+        bg_surface.fill((220, 220, 240))  # Светло-голубой фон
+        pygame.draw.rect(bg_surface, (180, 150, 100), (0, 500, 1280, 220))  # Пол
+    
+    return bg_surface
+
+def draw_character_placeholder():
+    """
+    Рисует заглушку для отсутствующего изображения персонажа
+
+    :return: Поверхность с заглушкой
+    """
+    character_surface = pygame.Surface((200, 400))
+    character_surface.fill(WHITE)
+    pygame.draw.rect(character_surface, BLUE, (0, 0, 200, 400), 2)
+    pygame.draw.ellipse(character_surface, BLUE, (50, 50, 100, 100))  # Голова
+    pygame.draw.rect(character_surface, BLUE, (75, 150, 50, 200))    # Тело
+    return character_surface
+
+def bake_placeholder(category, image_path):
+    """
+    Сохраняет заглушку для отсутствующего изображения на диск
+
+    :param category: Категория изображения ("background" или "character")
+    :param image_path: Путь к изображению
+    :return: True, если файл создан
+    """
+    if os.path.exists(image_path):
+        return False
+
+    if category == "background":
+        name = os.path.splitext(os.path.basename(image_path))[0]
+        surface = draw_default_background(name)
+    else:
+        surface = draw_character_placeholder()
+
+    os.makedirs(os.path.dirname(image_path), exist_ok=True)
+    pygame.image.save(surface, image_path)
+    return True
@@ -0,0 +1,247 @@
+import os
+import queue
+import threading
+from collections import deque
+
+import pygame
+from engine.assets import scale_to_fill
+
+# Событие, которым фоновый поток будит игровой цикл в режиме простоя
+PREFETCH_EVENT = pygame.USEREVENT + 1
+
+def get_scene_neighbors(game, index):
+    """
+    Возвращает индексы сцен, в которые можно перейти из сцены за один шаг
+
+    :param game: Экземпляр класса Game
+    :param index: Индекс сцены
+    :return: Список индексов сцен
+    """
+    neighbors = list(game.story.get_successors(index))
+
+    # Кнопка "Назад" возвращает к предыдущей сцене по порядку
+    if index > 0:
+        neighbors.append(index - 1)
+    return neighbors
+
+def get_upcoming_scenes(game, depth):
+    """
+    Обходит граф сцен в ширину от текущей сцены
+
+    :param game: Экземпляр класса Game
+    :param depth: Количество переходов, на которое заглядывать вперед
+    :return: Список индексов достижимых сцен, ближайшие первыми
+    """
+    if game.story is None or game.current_scene >= len(game.story):
+        return []
+
+    visited = {game.current_scene}
+    order = []
+    frontier = deque([(game.current_scene, 0)])
+    while frontier:
+        index, distance = frontier.popleft()
+        if distance >= depth:
+            continue
+        for neighbor in get_scene_neighbors(game, index):
+            if neighbor not in visited:
+                visited.add(neighbor)
+                order.append(neighbor)
+                frontier.append((neighbor, distance + 1))
+    return order
+
+class AssetPrefetcher:
+    """
+    Предзагрузка изображений сцен, достижимых за несколько переходов.
+    Фоновый поток декодирует файлы и масштабирует фоны, а игровой цикл
+    забирает готовые поверхности и приводит их к формату экрана
+    (это можно делать только в основном потоке).
+    """
+    def __init__(self, depth, queue_size, archive=None):
+        """
+        Инициализация предзагрузчика.
+
+        :param depth: Количество переходов, на которое заглядывать вперед
+        :param queue_size: Максимальное количество заданий в очереди
+        :param archive: Архив с готовыми пикселями изображений (AssetArchive)
+        """
+        self.depth = depth
+        self.archive = archive
+        self.requests = queue.Queue(queue_size)
+        self.results = queue.Queue()
+        self.queued = set()  # Ресурсы в очереди или в обработке: (вид, имя)
+        self.failed = set()  # Ресурсы, которые не удалось загрузить в фоне
+
+        # Статистика: при показе сцены её ресурсы уже загружены (попадание) или нет (промах)
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.last_scene = None
+
+        self.stopping = threading.Event()
+
+        self.thread = threading.Thread(target=self.worker, name="AssetPrefetcher", daemon=True)
+        self.thread.start()
+
+    def worker(self):
+        """
+        Цикл фонового потока: декодирование и масштабирование изображений
+        """
+        while not self.stopping.is_set():
+            request = self.requests.get()
+            if request is None:
+                break
+
+            kind, name, path, size = request
+            try:
+                image = self.archive.load(path) if self.archive is not None else None
+                packed = image is not None
+                if not packed:
+                    if not os.path.exists(path):
+                        # Заглушку создаст основной поток при показе сцены
+                        self.results.put((kind, name, path, None, False, None, size))
+                        continue
+                    image = pygame.image.load(path)
+                scaled = None
+                if kind == "background" and image.get_size() != size:
+                    # Масштабируем ближайший по размеру заранее уменьшенный вариант
+                    source = self.archive.load(path, size) if packed else image
+                    scaled = scale_to_fill(source, size)
+                self.results.put((kind, name, path, image, packed, scaled, size))
+            except Exception as e:
+                print(f"Ошибка при предзагрузке {name}: {e}")
+                self.results.put((kind, name, path, None, False, None, size))
+
+            # Будим игровой цикл, чтобы он забрал результат
+            try:
+                pygame.event.post(pygame.event.Event(PREFETCH_EVENT))
+            except pygame.error:
+                pass
+
+    def scene_shown(self, game):
+        """
+        Вызывается перед отрисовкой каждого кадра. При смене сцены учитывает
+        в статистике, загружены ли её ресурсы, и ставит в очередь ресурсы
+        сцен, достижимых из новой.
+
+        :param game: Экземпляр класса Game
+        """
+        if game.current_scene == self.last_scene:
+            return
+        self.last_scene = game.current_scene
+        self.record_scene(game, game.scenes[game.current_scene])
+
+        size = game.game_surface.get_size()
+        for index in get_upcoming_scenes(game, self.depth):
+            scene = game.scenes[index]
+            if scene.background in game.pending_backgrounds:
+                path = game.pending_backgrounds[scene.background]
+                if not self.request("background", scene.background, path, size):
+                    break
+            if scene.character in game.pending_characters:
+                path = game.pending_characters[scene.character]
+                if not self.request("character", scene.character, path, size):
+                    break
+
+    def request(self, kind, name, path, size):
+        """
+        Добавляет ресурс в очередь фонового потока
+
+        :param kind: Вид ресурса ("background" или "character")
+        :param name: Имя ресурса
+        :param path: Путь к файлу
+        :param size: Размер игровой поверхности
+        :return: False, если очередь заполнена
+        """
+        key = (kind, name)
+        if key in self.queued or key in self.failed:
+            return True
+        try:
+            self.requests.put_nowait((kind, name, path, size))
+        except queue.Full:
+            return False
+        self.queued.add(key)
+        return True
+
+    def collect(self, game):
+        """
+        Передает игре ресурсы, загруженные фоновым потоком
+
+        :param game: Экземпляр класса Game
+        """
+        while True:
+            try:
+                kind, name, path, image, packed, scaled, size = self.results.get_nowait()
+            except queue.Empty:
+                return
+
+            self.queued.discard((kind, name))
+            if image is None:
+                # Ресурс загрузится обычным путем (с заглушкой) при показе сцены
+                self.failed.add((kind, name))
+                continue
+
+            # Ресурс могли загрузить синхронно или заменить, пока поток работал
+            if kind == "background":
+                if game.pending_backgrounds.get(name) != path:
+                    continue
+                del game.pending_backgrounds[name]
+                original = game.prepare_asset(f"background:{name}", image, packed)
+                game.original_backgrounds[name] = original
+                if size == game.game_surface.get_size():
+                    # Фон уже нужного размера используется без копии и повторного преобразования
+                    game.backgrounds[name] = original if scaled is None else scaled.convert()
+            else:
+                if game.pending_characters.get(name) != path:
+                    continue
+                del game.pending_characters[name]
+                game.characters[name] = game.prepare_asset(f"character:{name}", image, packed)
+            self.prefetched += 1
+
+    def is_idle(self):
+        """
+        Проверяет, что все поставленные в очередь ресурсы загружены и переданы игре
+
+        :return: True, если фоновый поток ничего не загружает
+        """
+        return not self.queued
+
+    def record_scene(self, game, scene):
+        """
+        Учитывает в статистике, были ли ресурсы сцены загружены заранее
+
+        :param game: Экземпляр класса Game
+        :param scene: Показываемая сцена
+        """
+        for name, pending, loaded in ((scene.background, game.pending_backgrounds, game.original_backgrounds),
+                                      (scene.character, game.pending_characters, game.characters)):
+            if name in pending:
+                self.misses += 1
+            elif name in loaded:
+                self.hits += 1
+
+    def hit_rate(self):
+        """
+        Возвращает долю ресурсов, загруженных до показа сцены
+
+        :return: Доля попаданий от 0 до 1
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def print_report(self):
+        """
+        Выводит статистику предзагрузки в консоль
+        """
+        print(f"Предзагрузка (глубина {self.depth}): загружено заранее {self.prefetched}, "
+              f"попаданий {self.hits}, промахов {self.misses}, доля попаданий {self.hit_rate():.0%}")
+
+    def stop(self):
+        """
+        Останавливает фоновый поток
+        """
+        self.stopping.set()
+        try:
+            self.requests.put_nowait(None)
+        except queue.Full:
+            # Поток завершится после текущего задания
+            pass
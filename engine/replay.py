@@ -0,0 +1,345 @@
+import gzip
+import json
+import random
+import sys
+import time
+
+import pygame
+
+# Версия формата файла записи
+REPLAY_VERSION = 1
+
+# Записываемые события и их атрибуты. Внутренние события движка
+# (предзагрузка, таймеры) не записываются: они возникают сами при воспроизведении
+RECORDED_EVENTS = {
+    pygame.QUIT: (),
+    pygame.KEYDOWN: ("key", "mod"),
+    pygame.MOUSEBUTTONDOWN: ("pos", "button"),
+    pygame.MOUSEMOTION: ("pos",),
+    pygame.VIDEORESIZE: ("w", "h"),
+    pygame.VIDEOEXPOSE: (),
+    pygame.WINDOWEXPOSED: (),
+}
+
+# Формат файла записи (JSON, сжатый gzip):
+#   {"version": 1, "seed": ..., "start_scene": id или номер сцены,
+#    "window_size": [ширина, высота],
+#    "batches": [[время_мс, [[тип, {атрибуты}], ...]], ...]}
+# Пачка - события, полученные за одну итерацию игрового цикла,
+# время отсчитывается от запуска цикла
+
+def get_peak_rss():
+    """
+    Возвращает пиковый объем физической памяти процесса
+
+    :return: Объем в байтах или None, если его не удалось определить
+    """
+    try:
+        import resource
+    except ImportError:
+        resource = None
+
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux возвращает килобайты, macOS - байты
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    return None
+
+def percentiles(samples, percents=(50, 95, 99)):
+    """
+    Вычисляет перцентили по методу ближайшего ранга
+
+    :param samples: Список значений
+    :param percents: Перцентили от 0 до 100
+    :return: Словарь {"p50": ..., ..., "max": ...} (пустой, если значений нет)
+    """
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    result = {}
+    for percent in percents:
+        rank = max(1, -(-len(ordered) * percent // 100))
+        result[f"p{percent}"] = round(ordered[rank - 1], 3)
+    result["max"] = round(ordered[-1], 3)
+    return result
+
+def get_scene_key(game):
+    """
+    Возвращает идентификатор текущей сцены для записи
+
+    :param game: Экземпляр класса Game
+    :return: scene_id сцены или её номер, если идентификатора нет
+    """
+    if game.current_scene < len(game.scenes):
+        scene_id = game.scenes[game.current_scene].scene_id
+        if scene_id is not None:
+            return scene_id
+    return game.current_scene
+
+class InputRecorder:
+    """
+    Запись событий, поступающих в игровой цикл, для последующего воспроизведения
+    """
+    def __init__(self, path):
+        """
+        Инициализация записи.
+
+        :param path: Путь к файлу записи
+        """
+        self.path = path
+        self.seed = int(time.time())
+        self.start_scene = None
+        self.window_size = None
+        self.start_ticks = 0
+        self.batches = []
+
+    def start(self, game):
+        """
+        Начинает запись (вызывается при запуске игрового цикла)
+
+        :param game: Экземпляр класса Game
+        """
+        random.seed(self.seed)
+        self.start_scene = get_scene_key(game)
+        self.window_size = list(game.screen.get_size())
+        self.start_ticks = pygame.time.get_ticks()
+
+    def record(self, events):
+        """
+        Записывает события одной итерации игрового цикла
+
+        :param events: Список событий Pygame
+        """
+        recorded = []
+        for event in events:
+            attributes = RECORDED_EVENTS.get(event.type)
+            if attributes is None:
+                continue
+            recorded.append([pygame.event.event_name(event.type),
+                             {name: getattr(event, name) for name in attributes}])
+        if recorded:
+            self.batches.append([pygame.time.get_ticks() - self.start_ticks, recorded])
+
+    def save(self):
+        """
+        Сохраняет запись в файл
+        """
+        data = {
+            "version": REPLAY_VERSION,
+            "seed": self.seed,
+            "start_scene": self.start_scene,
+            "window_size": self.window_size,
+            "batches": self.batches,
+        }
+        with gzip.open(self.path, "wt", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, separators=(",", ":"))
+        events = sum(len(batch[1]) for batch in self.batches)
+        print(f"Запись ввода сохранена: {self.path} (событий: {events})")
+
+class InputReplayer:
+    """
+    Воспроизведение записанных событий вместо реального ввода
+    и замер производительности: кадры, время кадра, задержка смены сцены, пик памяти
+    """
+    def __init__(self, path, realtime=False, wait_prefetch=True):
+        """
+        Загружает запись.
+
+        :param path: Путь к файлу записи
+        :param realtime: Воспроизводить с записанными паузами (иначе - с максимальной скоростью)
+        :param wait_prefetch: При максимальной скорости подавать ввод только после окончания
+                              предзагрузки: результаты повторяемы, но задержка из-за незагруженных
+                              изображений не попадает в задержку смены сцены (время ожидания
+                              выводится в отчете отдельно)
+        :raises ValueError: Если файл записи неподдерживаемой версии
+        """
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            data = json.load(file)
+        if data.get("version") != REPLAY_VERSION:
+            raise ValueError(f"Неподдерживаемая версия записи: {path}")
+
+        self.path = path
+        self.realtime = realtime
+        self.wait_prefetch = wait_prefetch and not realtime
+        self.seed = data["seed"]
+        self.start_scene = data["start_scene"]
+        self.window_size = tuple(data["window_size"])
+        self.batches = data["batches"]
+        self.event_types = {pygame.event.event_name(event_type): event_type
+                            for event_type in RECORDED_EVENTS}
+        self.position = 0
+        self.start_ticks = 0
+        self.mouse_pos = (0, 0)  # Последняя записанная позиция курсора
+        # Результаты замера
+        self.start_time = 0.0
+        self.frame_times = []  # Время отрисовки и вывода каждого кадра, мс
+        self.scene_latencies = []  # Время от ввода до вывода кадра новой сцены, мс
+        self.presented_scene = None
+        self.duration = 0.0
+        self.prefetch_wait = 0.0  # Суммарное ожидание предзагрузки перед вводом, с
+        self.prefetch_wait_start = None
+
+    def start(self, game):
+        """
+        Восстанавливает начальное состояние записи (вызывается при запуске игрового цикла)
+
+        :param game: Экземпляр класса Game
+        """
+        random.seed(self.seed)
+        if isinstance(self.start_scene, str):
+            game.go_to_scene(self.start_scene)
+        else:
+            game.current_scene = self.start_scene
+        if game.screen.get_size() != self.window_size:
+            game.screen = pygame.display.set_mode(self.window_size, pygame.RESIZABLE)
+            game.window_width, game.window_height = self.window_size
+            game.resize_display(*self.window_size)
+        self.start_ticks = pygame.time.get_ticks()
+        self.start_time = time.perf_counter()
+
+    def get_events(self, game):
+        """
+        Возвращает события следующей записанной итерации вместо реального ввода.
+        После окончания записи возвращает событие выхода.
+
+        :param game: Экземпляр класса Game
+        :return: Список событий
+        """
+        # Реальный ввод не используется, но окно можно закрыть
+        real_events = [event for event in pygame.event.get() if event.type == pygame.QUIT]
+        if real_events:
+            return real_events
+
+        # Ввод поступает, когда на экране уже показан результат предыдущего ввода,
+        # поэтому при любой скорости воспроизведения выводятся те же кадры
+        if game.needs_full_redraw or game.dirty_rects:
+            return []
+
+        # Изменение размера окна применяется через RESIZE_DELAY, а отложенные вызовы -
+        # в следующей итерации цикла: записанный после них ввод должен попасть
+        # в те же размеры и раскладку кнопок, что и при записи
+        now = pygame.time.get_ticks()
+        if game.pending_resize is not None or any(deadline <= now for deadline, callback in game.timers):
+            pygame.time.wait(1)
+            return []
+
+        # Без пауз между вводом фоновая загрузка не успевала бы за воспроизведением,
+        # и результаты зависели бы от планировщика потоков. Поэтому ввод поступает
+        # после того, как предзагрузка закончила работу (как при обычной игре)
+        if self.wait_prefetch and game.prefetcher is not None:
+            if not game.prefetcher.is_idle():
+                if self.prefetch_wait_start is None:
+                    self.prefetch_wait_start = time.perf_counter()
+                pygame.time.wait(1)
+                return []
+            if self.prefetch_wait_start is not None:
+                self.prefetch_wait += time.perf_counter() - self.prefetch_wait_start
+                self.prefetch_wait_start = None
+
+        if self.position >= len(self.batches):
+            return [pygame.event.Event(pygame.QUIT)]
+
+        deadline, recorded = self.batches[self.position]
+        if self.realtime:
+            remaining = self.start_ticks + deadline - pygame.time.get_ticks()
+            if remaining > 0:
+                # Ждем порциями, чтобы между ними срабатывали таймеры движка
+                pygame.time.wait(min(remaining, 10))
+                return []
+
+        self.position += 1
+        events = []
+        for name, attributes in recorded:
+            if "pos" in attributes:
+                attributes = dict(attributes, pos=tuple(attributes["pos"]))
+                self.mouse_pos = attributes["pos"]
+            events.append(pygame.event.Event(self.event_types[name], attributes))
+        return events
+
+    def frame_presented(self, game, input_time, frame_start):
+        """
+        Записывает время кадра и задержку смены сцены (вызывается после вывода кадра)
+
+        :param game: Экземпляр класса Game
+        :param input_time: Время получения событий этой итерации цикла (perf_counter)
+        :param frame_start: Время начала отрисовки кадра (perf_counter)
+        """
+        now = time.perf_counter()
+        self.frame_times.append((now - frame_start) * 1000)
+        if game.current_scene != self.presented_scene:
+            if self.presented_scene is not None:
+                self.scene_latencies.append((now - input_time) * 1000)
+            self.presented_scene = game.current_scene
+
+    def finish(self):
+        """
+        Завершает замер (вызывается при выходе из игрового цикла)
+        """
+        if not self.duration:
+            self.duration = time.perf_counter() - self.start_time
+
+    def get_report(self):
+        """
+        Возвращает результаты воспроизведения
+
+        :return: Словарь с результатами
+        """
+        self.finish()
+        peak_rss = get_peak_rss()
+        return {
+            "replay": self.path,
+            "realtime": self.realtime,
+            "wait_prefetch": self.wait_prefetch,
+            "prefetch_wait_ms": round(self.prefetch_wait * 1000, 3),
+            "duration_s": round(self.duration, 3),
+            "frames": len(self.frame_times),
+            "frame_ms": percentiles(self.frame_times),
+            "scene_changes": len(self.scene_latencies),
+            "scene_change_ms": percentiles(self.scene_latencies),
+            "peak_rss_mb": round(peak_rss / 1024 / 1024, 1) if peak_rss is not None else None,
+        }
+
+    def save_report(self, path):
+        """
+        Сохраняет результаты воспроизведения в JSON-файл
+
+        :param path: Путь к файлу
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.get_report(), file, ensure_ascii=False, indent=2)
+
+    def print_report(self):
+        """
+        Выводит результаты воспроизведения в консоль
+        """
+        report = self.get_report()
+        print(f"Воспроизведение {report['replay']}: {report['duration_s']:.2f} с, "
+              f"кадров {report['frames']}, смен сцены {report['scene_changes']}")
+        for title, key in (("Время кадра", "frame_ms"), ("Задержка смены сцены", "scene_change_ms")):
+            values = report[key]
+            if values:
+                print(f"  {title}: p50 {values['p50']:.2f} мс, p95 {values['p95']:.2f} мс, "
+                      f"p99 {values['p99']:.2f} мс, максимум {values['max']:.2f} мс")
+        if report["wait_prefetch"]:
+            print(f"  Ожидание предзагрузки перед вводом (не входит в задержку смены сцены): "
+                  f"{report['prefetch_wait_ms']:.2f} мс")
+        if report["peak_rss_mb"] is not None:
+            print(f"  Пик памяти процесса: {report['peak_rss_mb']:.1f} МБ")
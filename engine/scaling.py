@@ -0,0 +1,128 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+from engine.config import PARALLEL_SCALE_MIN_PIXELS, SCALING_THREADS
+
+# Пул потоков для масштабирования (создается при первом использовании).
+# Масштабирование вызывается из основного потока и из потока предзагрузки,
+# поэтому пул создается и заменяется под блокировкой
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+def get_thread_count():
+    """
+    Возвращает количество потоков для масштабирования
+
+    :return: Количество потоков (1 - масштабирование в одном потоке)
+    """
+    return SCALING_THREADS or os.cpu_count() or 1
+
+def get_pool(threads):
+    """
+    Возвращает пул потоков для масштабирования
+
+    :param threads: Количество потоков
+    :return: Объект ThreadPoolExecutor
+    """
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != threads:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="Scaling")
+            _pool_size = threads
+        return _pool
+
+def get_bands(length, count):
+    """
+    Делит отрезок на примерно равные части
+
+    :param length: Длина отрезка (строк или столбцов)
+    :param count: Количество частей
+    :return: Список (начало, длина) непустых частей
+    """
+    count = max(1, min(count, length))
+    bounds = [length * i // count for i in range(count + 1)]
+    return [(bounds[i], bounds[i + 1] - bounds[i]) for i in range(count)]
+
+def scale_band(surface, rect, size):
+    """
+    Масштабирует часть изображения (выполняется в потоке пула)
+
+    :param surface: Исходная поверхность
+    :param rect: Часть изображения (x, y, ширина, высота)
+    :param size: Размер масштабированной части
+    :return: Масштабированная поверхность
+    """
+    return pygame.transform.smoothscale(surface.subsurface(rect), size)
+
+def scale_pass(pool, threads, surface, dest, size, horizontal):
+    """
+    Один проход масштабирования по одной оси, разделенный между потоками.
+    Горизонтальный проход не смешивает строки, поэтому изображение делится
+    на полосы строк; вертикальный проход не смешивает столбцы - на полосы столбцов.
+
+    :param pool: Пул потоков
+    :param threads: Количество частей, на которые делится проход
+    :param surface: Исходная поверхность
+    :param dest: Поверхность для результата размером size
+    :param size: Размер результата (по одной оси совпадает с исходным)
+    :param horizontal: True - масштабирование по ширине, False - по высоте
+    """
+    width, height = surface.get_size()
+    target_width, target_height = size
+    futures = []
+    if horizontal:
+        for y, rows in get_bands(height, threads):
+            futures.append((y, pool.submit(scale_band, surface, (0, y, width, rows),
+                                           (target_width, rows))))
+    else:
+        for x, columns in get_bands(width, threads):
+            futures.append((x, pool.submit(scale_band, surface, (x, 0, columns, height),
+                                           (columns, target_height))))
+
+    for position, future in futures:
+        scaled = future.result()
+        # Часть копируется вместе с альфа-каналом, без смешивания
+        scaled.set_alpha(None)
+        dest.blit(scaled, (0, position) if horizontal else (position, 0))
+
+def smoothscale(surface, size, dest=None):
+    """
+    Сглаживающее масштабирование, для больших изображений - в нескольких потоках
+    (Pygame отпускает GIL внутри преобразований).
+    Pygame масштабирует сначала по ширине, затем по высоте; здесь эти проходы
+    выполняются так же, но каждый делится между потоками, поэтому результат
+    совпадает с pygame.transform.smoothscale до бита.
+
+    :param surface: Исходная поверхность (24 или 32 бита)
+    :param size: Размер результата (ширина, высота)
+    :param dest: Поверхность для результата размером size (по умолчанию создается новая)
+    :return: Масштабированная поверхность
+    """
+    threads = get_thread_count()
+    target_width, target_height = size
+    if (threads <= 1 or target_width * target_height < PARALLEL_SCALE_MIN_PIXELS
+            or size == surface.get_size()):
+        if dest is not None:
+            return pygame.transform.smoothscale(surface, size, dest)
+        return pygame.transform.smoothscale(surface, size)
+
+    pool = get_pool(threads)
+    flags = surface.get_flags() & pygame.SRCALPHA
+    if dest is None:
+        dest = pygame.Surface(size, flags, surface)
+
+    width, height = surface.get_size()
+    if target_height == height:
+        scale_pass(pool, threads, surface, dest, size, True)
+        return dest
+    if target_width != width:
+        stretched = pygame.Surface((target_width, height), flags, surface)
+        scale_pass(pool, threads, surface, stretched, (target_width, height), True)
+        surface = stretched
+    scale_pass(pool, threads, surface, dest, size, False)
+    return dest
@@ -1,14 +1,253 @@
+import sys
+from collections import namedtuple
+from types import MappingProxyType
+
+# Поля сцены в порядке параметров Scene (формат файлов сюжета, кэша сюжета и базы сцен)
+SCENE_FIELDS = ("text", "character", "background", "character_position", "character_scale",
+                "character_name", "choices", "scene_id", "next_scene_id", "on_enter")
+
+# Оформление сцены: персонаж, фон и их параметры. Различных сочетаний в сюжете немного,
+# поэтому сцены с одинаковым оформлением ссылаются на один экземпляр (SceneInterner.get_presentation)
+Presentation = namedtuple("Presentation", ("character", "background", "character_position",
+                                           "character_scale", "character_name"))
+
+def intern_string(value):
+    """
+    Возвращает общий экземпляр строки (sys.intern), чтобы одинаковые ID и имена
+    разных сцен не хранились отдельными копиями
+
+    :param value: Строка или другое значение
+    :return: Общая строка или значение без изменений
+    """
+    return sys.intern(value) if type(value) is str else value
+
+def make_presentation(character, background, character_position, character_scale, character_name):
+    """
+    Создает оформление сцены с общими экземплярами строк
+
+    :param character: Имя персонажа в словаре персонажей
+    :param background: Имя фона в словаре фонов
+    :param character_position: Позиция персонажа
+    :param character_scale: Масштаб персонажа
+    :param character_name: Отображаемое имя персонажа
+    :return: Объект Presentation
+    """
+    return Presentation(intern_string(character), intern_string(background), intern_string(character_position),
+                        character_scale, intern_string(character_name))
+
+def freeze(value):
+    """
+    Преобразует значение из словарей и списков в хэшируемый ключ для поиска одинаковых значений
+
+    :param value: Значение (словарь, список, строка, число...)
+    :return: Кортеж, однозначно описывающий значение
+    """
+    if isinstance(value, (dict, MappingProxyType)):
+        return (dict, tuple(sorted((key, freeze(item)) for key, item in value.items())))
+    if isinstance(value, (list, tuple)):
+        return (list, tuple(freeze(item) for item in value))
+    # Тип входит в ключ, чтобы не путать True и 1
+    return (type(value), value)
+
+def read_only(value):
+    """
+    Возвращает неизменяемую копию данных сюжета: словари заменяются на
+    MappingProxyType, списки - на кортежи. Условия и действия общие
+    для многих сцен, поэтому их нельзя изменить через одну из сцен.
+
+    :param value: Значение (словарь, список, строка, число...)
+    :return: Неизменяемое значение
+    """
+    if isinstance(value, (dict, MappingProxyType)):
+        return MappingProxyType({key: read_only(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(read_only(item) for item in value)
+    return value
+
+def to_plain(value):
+    """
+    Обратное преобразование для read_only: возвращает обычные словари и списки
+    (для файлов сюжета, сохранений и переменных игры)
+
+    :param value: Значение
+    :return: Значение из обычных словарей и списков
+    """
+    if isinstance(value, (dict, MappingProxyType)):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [to_plain(item) for item in value]
+    return value
+
+class Choice(namedtuple("Choice", ("text", "next_scene", "condition"))):
+    """
+    Вариант выбора сцены. Не изменяется после создания, поэтому
+    одинаковые варианты разных сцен могут быть одним объектом.
+    Поля доступны и как у словаря варианта в файле сюжета: choice["text"], choice.get("condition").
+    """
+    __slots__ = ()
+
+    def __new__(cls, text, next_scene, condition=None):
+        """
+        Создает вариант выбора.
+
+        :param text: Текст варианта
+        :param next_scene: ID сцены, к которой ведет вариант
+        :param condition: Условие отображения варианта или None
+        """
+        return super().__new__(cls, text, intern_string(next_scene), read_only(condition) if condition else None)
+
+    def __getitem__(self, key):
+        """
+        Возвращает поле по имени, как у словаря варианта (или по номеру, как у кортежа)
+
+        :param key: Имя поля ("text", "next_scene", "condition") или номер
+        :return: Значение поля
+        :raises KeyError: Если поля нет (или у варианта нет условия)
+        """
+        if not isinstance(key, str):
+            return super().__getitem__(key)
+        # Как и в словаре варианта, поля condition нет, если условие не задано
+        if key not in self._fields or (key == "condition" and self.condition is None):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        """
+        Возвращает поле по имени или значение по умолчанию, как dict.get
+
+        :param key: Имя поля
+        :param default: Значение, если поля нет
+        :return: Значение поля
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        """
+        Возвращает вариант в формате файла сюжета
+
+        :return: Словарь {"text": ..., "next_scene": ..., "condition": ...}
+        """
+        choice = {"text": self.text, "next_scene": self.next_scene}
+        if self.condition:
+            choice["condition"] = to_plain(self.condition)
+        return choice
+
+def make_choice(choice):
+    """
+    Приводит вариант выбора к объекту Choice
+
+    :param choice: Объект Choice или словарь {"text": ..., "next_scene": ..., "condition": ...}
+    :return: Объект Choice
+    """
+    if isinstance(choice, Choice):
+        return choice
+    return Choice(choice["text"], choice["next_scene"], choice.get("condition"))
+
+class SceneInterner:
+    """
+    Общие объекты для сцен одного сюжета: одинаковые оформления, варианты выбора,
+    условия, наборы вариантов и действия при входе хранятся в одном экземпляре.
+    Используется на время загрузки сюжета, после неё таблица не нужна.
+    """
+    def __init__(self):
+        """
+        Инициализация таблицы общих объектов.
+        """
+        self.shared = {}  # Ключ (freeze или id общих объектов) -> общий объект
+
+    def __len__(self):
+        return len(self.shared)
+
+    def share(self, key, value):
+        """
+        Возвращает общий объект для ключа, запоминая value, если объекта еще нет
+
+        :param key: Ключ
+        :param value: Объект
+        :return: Общий объект
+        """
+        return self.shared.setdefault(key, value)
+
+    def get_presentation(self, *fields):
+        """
+        Возвращает общее оформление сцены
+
+        :param fields: Поля оформления в порядке Presentation
+        :return: Объект Presentation
+        """
+        presentation = make_presentation(*fields)
+        return self.share(("presentation", presentation), presentation)
+
+    def get_choice(self, choice):
+        """
+        Возвращает общий вариант выбора
+
+        :param choice: Объект Choice или словарь варианта
+        :return: Объект Choice
+        """
+        data = choice.to_dict() if isinstance(choice, Choice) else choice
+        key = ("choice", freeze(data))
+        shared = self.shared.get(key)
+        if shared is None:
+            shared = make_choice(choice)
+            if shared.condition:
+                condition = self.share(("condition", freeze(shared.condition)), shared.condition)
+                shared = shared._replace(condition=condition)
+            self.shared[key] = shared
+        return shared
+
+    def get_choices(self, choices):
+        """
+        Возвращает общий кортеж вариантов выбора
+
+        :param choices: Список вариантов
+        :return: Кортеж объектов Choice
+        """
+        choices = tuple(self.get_choice(choice) for choice in choices)
+        return self.share(("choices", tuple(map(id, choices))), choices)
+
+    def get_action(self, action):
+        """
+        Возвращает общее действие при входе в сцену
+
+        :param action: Словарь действия
+        :return: Неизменяемый словарь действия (MappingProxyType)
+        """
+        key = ("action", freeze(action))
+        shared = self.shared.get(key)
+        if shared is None:
+            shared = self.shared[key] = read_only(action)
+        return shared
+
+    def get_actions(self, actions):
+        """
+        Возвращает общий кортеж действий при входе в сцену
+
+        :param actions: Список действий (словари)
+        :return: Кортеж общих неизменяемых словарей действий
+        """
+        actions = tuple(self.get_action(action) for action in actions)
+        return self.share(("actions", tuple(map(id, actions))), actions)
+
 class Scene:
     """
     Класс для представления сцены в визуальной новелле.
     Содержит текст, информацию о персонаже и фоне.
+    Сцена хранится компактно: без __dict__, с общим оформлением (Presentation)
+    и неизменяемыми кортежами вариантов выбора и действий. Поля оформления
+    (character, background...) доступны только для чтения.
     """
-    def __init__(self, text, character=None, background=None, character_position=None, 
+    __slots__ = ("text", "presentation", "choices", "scene_id", "next_scene_id", "on_enter")
+
+    def __init__(self, text, character=None, background=None, character_position=None,
                  character_scale=None, character_name=None, choices=None, scene_id=None, next_scene_id=None,
-                 on_enter=None):
+                 on_enter=None, interner=None):
         """
         Инициализация сцены.
-        
+
         :param text: Текст диалога
         :param character: Имя персонажа в словаре персонажей
         :param background: Имя фона в словаре фонов
@@ -19,52 +258,102 @@ class Scene:
         :param scene_id: Уникальный идентификатор сцены для переходов
         :param next_scene_id: Идентификатор следующей сцены для автоматического перехода
         :param on_enter: Список действий, выполняемых при входе в сцену, например [{"action": "set_variable", "variable": "visited_lab", "value": True}]
+        :param interner: Таблица общих объектов сюжета (SceneInterner) или None
         """
         self.text = text
-        self.character = character
-        self.background = background
-        self.character_position = character_position
-        self.character_scale = character_scale
-        self.character_name = character_name if character_name else character
-        self.choices = choices or []
-        self.scene_id = scene_id
-        self.next_scene_id = next_scene_id
-        self.on_enter = on_enter or []
-        
+        fields = (character, background, character_position, character_scale,
+                  character_name if character_name else character)
+        self.scene_id = intern_string(scene_id)
+        self.next_scene_id = intern_string(next_scene_id)
+        if interner is not None:
+            self.presentation = interner.get_presentation(*fields)
+            self.choices = interner.get_choices(choices or ())
+            self.on_enter = interner.get_actions(on_enter or ())
+        else:
+            self.presentation = make_presentation(*fields)
+            self.choices = tuple(make_choice(choice) for choice in choices or ())
+            self.on_enter = tuple(read_only(action) for action in on_enter or ())
+
+    @property
+    def character(self):
+        """
+        Имя персонажа в словаре персонажей
+        """
+        return self.presentation.character
+
+    @property
+    def background(self):
+        """
+        Имя фона в словаре фонов
+        """
+        return self.presentation.background
+
+    @property
+    def character_position(self):
+        """
+        Позиция персонажа (left, center, right)
+        """
+        return self.presentation.character_position
+
+    @property
+    def character_scale(self):
+        """
+        Масштаб персонажа
+        """
+        return self.presentation.character_scale
+
+    @property
+    def character_name(self):
+        """
+        Отображаемое имя персонажа (по умолчанию - ключ персонажа)
+        """
+        return self.presentation.character_name
+
     def add_choice(self, text, next_scene, condition=None):
         """
-        Добавляет вариант выбора к сцене
-        
+        Добавляет вариант выбора к сцене. Используется при создании сцены, до
+        компиляции сюжета: граф переходов об этом не узнает, поэтому к сценам
+        игры варианты добавляются через Game.add_choice.
+
         :param text: Текст варианта выбора
         :param next_scene: ID сцены, к которой ведет этот выбор
         :param condition: Условие для отображения варианта выбора
         """
-        if self.choices is None:
-            self.choices = []
-        self.choices.append({"text": text, "next_scene": next_scene, "condition": condition})
-        
+        self.choices += (Choice(text, next_scene, condition),)
+
     def has_choices(self):
         """
         Проверяет, есть ли у сцены варианты выбора
-        
+
         :return: True, если есть варианты выбора, иначе False
         """
         return bool(self.choices)
-        
+
     def get_filtered_choices(self, game):
         """
         Возвращает список вариантов выбора, отфильтрованный по условиям
-        
+
         :param game: Экземпляр класса Game для проверки условий
         :return: Список вариантов выбора, удовлетворяющих условиям
         """
         if not self.choices:
             return []
-            
+
         filtered_choices = []
         for choice in self.choices:
-            condition = choice.get("condition")
+            condition = choice.condition
             if not condition or game.check_condition(condition):
                 filtered_choices.append(choice)
-                
-        return filtered_choices 
\ No newline at end of file
+
+        return filtered_choices
+
+    def to_record(self):
+        """
+        Возвращает поля сцены в порядке SCENE_FIELDS простыми типами
+        (для кэша сюжета и базы сцен); Scene(*record) восстанавливает сцену
+
+        :return: Кортеж полей сцены
+        """
+        return (self.text, *self.presentation,
+                [choice.to_dict() for choice in self.choices] or None,
+                self.scene_id, self.next_scene_id, to_plain(self.on_enter) or None)
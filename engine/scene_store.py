@@ -0,0 +1,474 @@
+import marshal
+import os
+import sqlite3
+from array import array
+
+from engine.cache import LRUCache
+from engine.scene import SCENE_FIELDS, Scene, SceneInterner
+from engine.story_graph import NO_SCENE, StoryError, StoryGraph, get_action_errors
+
+# Схема базы сцен:
+#   scenes - номер сцены в порядке добавления, ID сцены (с индексом для поиска при переходах),
+#            ID следующей сцены, есть ли выбор, поля сцены в порядке SCENE_FIELDS (marshal)
+#   choices - ID сцен вариантов выбора (для построения графа)
+#   assets - изображения, которые используют сцены, и первая использующая сцена (для проверки)
+#   story - сведения о сюжете (marshal): ключ файлов сюжета, фоны, персонажи, переменные, граф
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenes (number INTEGER PRIMARY KEY, scene_id TEXT, next_scene_id TEXT,
+                                   has_choices INTEGER NOT NULL, data BLOB NOT NULL);
+CREATE INDEX IF NOT EXISTS scenes_scene_id ON scenes (scene_id);
+CREATE TABLE IF NOT EXISTS choices (number INTEGER, position INTEGER, next_scene TEXT,
+                                    PRIMARY KEY (number, position)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS assets (category TEXT, name TEXT, number INTEGER,
+                                   PRIMARY KEY (category, name)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS story (name TEXT PRIMARY KEY, value BLOB);
+"""
+
+# Версия формата базы: база другой версии собирается заново
+STORE_VERSION = 1
+
+# Номер сцены с указанным ID (при повторяющихся ID - первой, как в графе сюжета)
+FIRST_SCENE_QUERY = "SELECT MIN(number) FROM scenes WHERE scene_id = ?"
+
+# Количество добавленных сцен, которые записываются в базу одним запросом
+INSERT_BATCH_SIZE = 1000
+
+# Сколько общих объектов (оформлений, вариантов выбора, действий) хранится для
+# загруженных из базы сцен; при превышении таблица начинается заново
+SHARED_OBJECTS_LIMIT = 4096
+
+# Названия категорий изображений в сообщениях об ошибках
+ASSET_NAMES = {"background": "фон", "character": "персонаж"}
+
+def unpack_scene(data, interner=None):
+    """
+    Восстанавливает сцену из данных базы
+
+    :param data: Данные сцены (bytes)
+    :param interner: Таблица общих объектов (SceneInterner) или None
+    :return: Объект Scene
+    """
+    return Scene(*marshal.loads(data), interner=interner)
+
+class SceneIdIndex:
+    """
+    Поиск номера сцены по ID в базе сцен. Заменяет словарь Game.scene_map:
+    поддерживает "in", [] и get(); запись не нужна, ID хранится в строке сцены.
+    """
+    def __init__(self, store):
+        """
+        Инициализация индекса.
+
+        :param store: Хранилище сцен (SQLiteSceneStore)
+        """
+        self.store = store
+
+    def get(self, scene_id, default=None):
+        """
+        Возвращает номер сцены по ID
+
+        :param scene_id: ID сцены
+        :param default: Значение, если сцены нет
+        :return: Номер сцены или значение по умолчанию
+        """
+        number = self.store.find(scene_id)
+        return default if number is None else number
+
+    def __contains__(self, scene_id):
+        return self.store.find(scene_id) is not None
+
+    def __getitem__(self, scene_id):
+        number = self.store.find(scene_id)
+        if number is None:
+            raise KeyError(scene_id)
+        return number
+
+    def __setitem__(self, scene_id, number):
+        # ID уже записан вместе со сценой в add_scene
+        pass
+
+class SQLiteSceneStore:
+    """
+    Хранилище сцен в файле SQLite для очень больших сюжетов. Заменяет список
+    Game.scenes (len(), [] по номеру, перебор, append()): в памяти остаются только
+    недавно использованные сцены (LRU) и массивы графа переходов, остальное
+    читается из базы по требованию. При загрузке сцены из базы вместе с ней
+    загружаются следующие сцены цепочки переходов, к которым, скорее всего, перейдет игрок.
+
+    База собирается из файлов сюжета один раз (build_scene_store) и используется
+    при следующих запусках, пока файлы сюжета не изменятся (open_scene_store).
+    """
+    def __init__(self, path, cache_size, prefetch_depth, temporary=False):
+        """
+        Открывает базу сцен (пустая база создается, если файла нет).
+
+        :param path: Путь к файлу базы
+        :param cache_size: Количество сцен в кэше
+        :param prefetch_depth: Сколько следующих сцен загружать вместе со сценой
+        :param temporary: Удалить файл базы при закрытии
+        """
+        self.path = path
+        self.temporary = temporary
+        self.prefetch_depth = prefetch_depth
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.length = self.connection.execute("SELECT COALESCE(MAX(number) + 1, 0) FROM scenes").fetchone()[0]
+        self.key = self.get_info("key")
+        graph = self.get_info("graph")
+        self.graph = StoryGraph.from_bytes(graph) if graph is not None else None
+        self.assets = set(self.connection.execute("SELECT category, name FROM assets"))
+        self.errors = []  # Ошибки в действиях добавленных сцен (выводятся при построении графа)
+        self.cache = LRUCache(max_items=cache_size)
+        self.interner = SceneInterner()
+        # Добавленные, но еще не записанные в базу строки таблиц
+        self.pending = []
+        self.pending_choices = []
+        self.pending_assets = []
+        self.id_index = SceneIdIndex(self)
+
+    def get_info(self, name):
+        """
+        Возвращает сведение о сюжете из базы
+
+        :param name: Название сведения
+        :return: Значение или None, если его нет
+        """
+        row = self.connection.execute("SELECT value FROM story WHERE name = ?", (name,)).fetchone()
+        return marshal.loads(row[0]) if row is not None else None
+
+    def set_info(self, name, value):
+        """
+        Записывает сведение о сюжете в базу
+
+        :param name: Название сведения
+        :param value: Значение (простые типы, которые сохраняет marshal)
+        """
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO story VALUES (?, ?)", (name, marshal.dumps(value)))
+
+    def append(self, scene):
+        """
+        Добавляет сцену в конец хранилища (Game.add_scene). Собранная из файлов
+        сюжета база общая для всех запусков, поэтому сцены добавляются в личную
+        копию базы, которая удаляется при закрытии.
+
+        :param scene: Объект Scene
+        """
+        if not self.temporary:
+            self.detach()
+        self.append_record(scene.to_record())
+
+    def detach(self):
+        """
+        Переключает хранилище на личную копию базы, не изменяя общую
+        """
+        self.flush()
+        path = f"{self.path}.{os.getpid()}.added.tmp"
+        copy = sqlite3.connect(path)
+        self.connection.backup(copy)
+        self.connection.close()
+        self.connection = copy
+        self.path = path
+        self.temporary = True
+
+    def append_record(self, record):
+        """
+        Добавляет сцену в конец хранилища по полям сцены, не создавая объект Scene
+
+        :param record: Кортеж полей сцены в порядке SCENE_FIELDS
+        """
+        fields = dict(zip(SCENE_FIELDS, record))
+        number = self.length
+        scene_id = fields["scene_id"]
+        choices = fields["choices"] or ()
+        source = f"сцена '{scene_id}'" if scene_id is not None else f"сцена #{number}"
+        self.errors.extend(get_action_errors(fields["on_enter"] or (), source))
+
+        self.pending.append((number, scene_id, fields["next_scene_id"], bool(choices), marshal.dumps(record)))
+        for position, choice in enumerate(choices):
+            self.pending_choices.append((number, position, choice["next_scene"]))
+        for category in ASSET_NAMES:
+            asset = (category, fields[category])
+            if asset[1] is not None and asset not in self.assets:
+                self.assets.add(asset)
+                self.pending_assets.append((category, asset[1], number))
+
+        self.length += 1
+        self.graph = None
+        if len(self.pending) >= INSERT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """
+        Записывает добавленные сцены в базу
+        """
+        if self.pending:
+            with self.connection:
+                self.connection.executemany("INSERT INTO scenes VALUES (?, ?, ?, ?, ?)", self.pending)
+                self.connection.executemany("INSERT INTO choices VALUES (?, ?, ?)", self.pending_choices)
+                self.connection.executemany("INSERT INTO assets VALUES (?, ?, ?)", self.pending_assets)
+            self.pending = []
+            self.pending_choices = []
+            self.pending_assets = []
+
+    def find(self, scene_id):
+        """
+        Ищет номер сцены по ID (при повторяющихся ID - первой, как в графе сюжета)
+
+        :param scene_id: ID сцены
+        :return: Номер сцены или None, если сцены нет
+        """
+        self.flush()
+        return self.connection.execute(FIRST_SCENE_QUERY, (scene_id,)).fetchone()[0]
+
+    def get_source(self, number):
+        """
+        Возвращает описание сцены для сообщений об ошибках (как в compile_story)
+
+        :param number: Номер сцены
+        :return: Строка описания
+        """
+        scene_id = self.connection.execute("SELECT scene_id FROM scenes WHERE number = ?", (number,)).fetchone()[0]
+        if scene_id is not None and self.connection.execute(FIRST_SCENE_QUERY, (scene_id,)).fetchone()[0] == number:
+            return f"сцена '{scene_id}'"
+        return f"сцена #{number}"
+
+    def compile_graph(self):
+        """
+        Проверяет переходы между сценами и строит граф сюжета запросами к базе,
+        не загружая сцены в память. Граф сохраняется в базе.
+
+        :return: Объект StoryGraph
+        :raises StoryError: Если в сюжете есть повторяющиеся ID, переходы
+                            к несуществующим сценам или неверные действия
+        """
+        self.flush()
+        errors = list(self.errors)
+        if not self.length:
+            errors.append("в сюжете нет сцен")
+
+        for number, scene_id, first in self.connection.execute(
+                "SELECT scenes.number, scenes.scene_id, first.number FROM scenes JOIN "
+                "(SELECT scene_id, MIN(number) AS number FROM scenes WHERE scene_id IS NOT NULL "
+                "GROUP BY scene_id HAVING COUNT(*) > 1) AS first "
+                "ON scenes.scene_id = first.scene_id AND scenes.number > first.number ORDER BY scenes.number"):
+            errors.append(f"сцена #{number}: ID '{scene_id}' уже используется сценой #{first}")
+
+        # Переход вперед: к next_scene_id, а если он не задан - к следующей сцене по номеру
+        next_scene = array("i")
+        for number, next_scene_id, has_choices, target in self.connection.execute(
+                "SELECT number, next_scene_id, has_choices, "
+                "(SELECT MIN(target.number) FROM scenes AS target WHERE target.scene_id = scenes.next_scene_id) "
+                "FROM scenes ORDER BY number"):
+            if has_choices:
+                next_scene.append(NO_SCENE)
+            elif next_scene_id:
+                if target is None:
+                    errors.append(f"{self.get_source(number)}: переход к несуществующей сцене '{next_scene_id}'")
+                    target = NO_SCENE
+                next_scene.append(target)
+            else:
+                next_scene.append(number + 1 if number < self.length - 1 else NO_SCENE)
+
+        # Варианты выбора всех сцен подряд; choice_offsets[i + 1] - конец вариантов сцены i
+        choice_offsets = array("i", bytes(4 * (self.length + 1)))
+        choice_targets = array("i")
+        for number, position, next_scene_id, target in self.connection.execute(
+                "SELECT number, position, next_scene, "
+                "(SELECT MIN(target.number) FROM scenes AS target WHERE target.scene_id = choices.next_scene) "
+                "FROM choices ORDER BY number, position"):
+            if target is None:
+                text = self[number].choices[position].text
+                errors.append(f"{self.get_source(number)}, вариант '{text}': "
+                              f"переход к несуществующей сцене '{next_scene_id}'")
+                target = NO_SCENE
+            choice_targets.append(target)
+            choice_offsets[number + 1] = len(choice_targets)
+        for number in range(1, self.length + 1):
+            # У сцен без выбора варианты заканчиваются там же, где у предыдущей сцены
+            if choice_offsets[number] < choice_offsets[number - 1]:
+                choice_offsets[number] = choice_offsets[number - 1]
+
+        if errors:
+            raise StoryError(errors)
+        self.graph = StoryGraph(next_scene, choice_offsets, choice_targets)
+        self.set_info("graph", self.graph.to_bytes())
+        return self.graph
+
+    def get_asset_errors(self, asset_paths):
+        """
+        Проверяет, что изображения сцен зарегистрированы
+
+        :param asset_paths: Зарегистрированные изображения: (категория, имя) -> путь
+        :return: Список ошибок
+        """
+        self.flush()
+        errors = []
+        for category, name, number in self.connection.execute(
+                "SELECT category, name, number FROM assets ORDER BY number"):
+            if (category, name) not in asset_paths:
+                errors.append(f"{self.get_source(number)}: {ASSET_NAMES[category]} '{name}' не зарегистрирован")
+        return errors
+
+    def compile_story(self, asset_paths):
+        """
+        Возвращает граф сюжета (строит его заново, если сцены добавлялись)
+        и проверяет, что изображения сцен зарегистрированы
+
+        :param asset_paths: Зарегистрированные изображения: (категория, имя) -> путь
+        :return: Объект StoryGraph
+        :raises StoryError: Если в сюжете есть ошибки
+        """
+        try:
+            graph = self.graph if self.graph is not None else self.compile_graph()
+        except StoryError as e:
+            raise StoryError(e.errors + self.get_asset_errors(asset_paths))
+        errors = self.get_asset_errors(asset_paths)
+        if errors:
+            raise StoryError(errors)
+        return graph
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, number):
+        if number < 0:
+            number += self.length
+        if not 0 <= number < self.length:
+            raise IndexError("номер сцены вне диапазона")
+
+        scene = self.cache.get(number)
+        if scene is None:
+            scene = self.load(number)
+            self.prefetch_chain(number)
+        return scene
+
+    def load(self, number):
+        """
+        Загружает сцену из базы в кэш
+
+        :param number: Номер сцены
+        :return: Объект Scene
+        """
+        self.flush()
+        row = self.connection.execute("SELECT data FROM scenes WHERE number = ?", (number,)).fetchone()
+        if len(self.interner) >= SHARED_OBJECTS_LIMIT:
+            # Сцены загружаются всю игру, поэтому таблица общих объектов ограничена
+            self.interner = SceneInterner()
+        scene = unpack_scene(row[0], self.interner)
+        self.cache.put(number, scene)
+        return scene
+
+    def prefetch_chain(self, number):
+        """
+        Загружает в кэш следующие сцены цепочки переходов вперед по графу сюжета
+        (до сцены с выбором или без перехода)
+
+        :param number: Номер загруженной сцены
+        """
+        if self.graph is None:
+            return
+        for _ in range(self.prefetch_depth):
+            number = self.graph.next_scene[number]
+            if number == NO_SCENE:
+                return
+            if number not in self.cache:
+                self.load(number)
+
+    def __iter__(self):
+        """
+        Перебирает все сцены по порядку, не занимая ими кэш
+        (например, для проверки сюжета)
+        """
+        self.flush()
+        for (data,) in self.connection.execute("SELECT data FROM scenes ORDER BY number"):
+            yield unpack_scene(data)
+
+    def print_report(self):
+        """
+        Выводит статистику хранилища в консоль
+        """
+        print(f"Сцены в базе {self.path}: {self.length}, в кэше {len(self.cache)}, "
+              f"попаданий в кэш {self.cache.hit_rate() * 100:.1f}%")
+
+    def close(self):
+        """
+        Закрывает базу
+        """
+        self.flush()
+        self.connection.close()
+        if self.temporary:
+            os.remove(self.path)
+
+def open_scene_store(path, key, cache_size, prefetch_depth):
+    """
+    Открывает собранную ранее базу сцен, если она собрана из тех же файлов сюжета
+
+    :param path: Путь к файлу базы
+    :param key: Ключ файлов сюжета (хэш содержимого)
+    :param cache_size: Количество сцен в кэше
+    :param prefetch_depth: Сколько следующих сцен загружать вместе со сценой
+    :return: Объект SQLiteSceneStore или None, если базы нет или она устарела
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        store = SQLiteSceneStore(path, cache_size, prefetch_depth)
+        if store.get_info("version") == STORE_VERSION and store.key == key and store.graph is not None:
+            return store
+        store.close()
+    except (sqlite3.DatabaseError, ValueError, EOFError) as e:
+        print(f"Ошибка при открытии базы сцен {path}: {e}")
+    return None
+
+def build_scene_store(path, key, info, chapters, asset_paths, cache_size, prefetch_depth):
+    """
+    Собирает базу сцен, записывая сцены глав по мере их компиляции. База
+    собирается во временном файле и заменяет старую, только если в сюжете
+    нет ошибок, поэтому другие запущенные экземпляры игры не видят её недостроенной.
+
+    :param path: Путь к файлу базы
+    :param key: Ключ файлов сюжета (хэш содержимого)
+    :param info: Сведения о сюжете {"backgrounds", "characters", "variables"}
+    :param chapters: Последовательность пар (кортежи полей сцен главы, список ошибок)
+    :param asset_paths: Изображения, которые будут зарегистрированы в игре (для сообщений об ошибках,
+                        чтобы все ошибки сюжета выводились вместе, как при компиляции в памяти)
+    :param cache_size: Количество сцен в кэше
+    :param prefetch_depth: Сколько следующих сцен загружать вместе со сценой
+    :return: Объект SQLiteSceneStore
+    :raises StoryError: Если в сюжете есть ошибки
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    store = SQLiteSceneStore(temp_path, cache_size, prefetch_depth, temporary=True)
+    try:
+        # Файл заменяет базу только целиком собранным, поэтому надежность записи не нужна
+        store.connection.execute("PRAGMA journal_mode = OFF")
+        store.connection.execute("PRAGMA synchronous = OFF")
+        errors = []
+        for records, chapter_errors in chapters:
+            errors.extend(chapter_errors)
+            for record in records:
+                store.append_record(record)
+        if errors:
+            raise StoryError(errors + store.errors)
+        store.compile_story(asset_paths)
+        for name, value in info.items():
+            store.set_info(name, value)
+        store.set_info("version", STORE_VERSION)
+        store.set_info("key", key)
+    except BaseException:
+        store.close()
+        raise
+    store.temporary = False
+    store.close()
+
+    try:
+        os.replace(temp_path, path)
+    except OSError as e:
+        # Старую базу не удалось заменить (например, в Windows она открыта другим
+        # экземпляром игры): до конца игры используется новая база из временного файла
+        print(f"Ошибка при сохранении базы сцен {path}: {e}")
+        return SQLiteSceneStore(temp_path, cache_size, prefetch_depth, temporary=True)
+    return SQLiteSceneStore(path, cache_size, prefetch_depth)
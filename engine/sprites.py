@@ -0,0 +1,94 @@
+import pygame
+from engine.assets import enable_rle
+from engine.cache import LRUCache, surface_bytes
+from engine.config import CHARACTER_HEIGHT
+
+class SpriteCache:
+    """
+    Кэш масштабированных изображений персонажей, готовых к выводу на экран.
+    Ключ - (персонаж, способ масштабирования, размер поверхности, качество),
+    вытеснение - по LRU в пределах бюджета памяти.
+    """
+    def __init__(self, max_bytes, smooth=True, variant_loader=None):
+        """
+        Инициализация кэша.
+
+        :param max_bytes: Бюджет памяти кэша в байтах
+        :param smooth: Использовать сглаживающее масштабирование (smoothscale)
+        :param variant_loader: Функция variant_loader(имя, размер), возвращающая
+                               заранее уменьшенный вариант изображения не меньше
+                               указанного размера или None
+        """
+        self.cache = LRUCache(max_bytes=max_bytes, sizeof=surface_bytes)
+        self.smooth = smooth
+        self.variant_loader = variant_loader
+
+    def get_sprite(self, name, image, scale, surface_size):
+        """
+        Возвращает масштабированное изображение персонажа, масштабируя его только при промахе кэша
+
+        :param name: Имя персонажа
+        :param image: Исходное изображение персонажа
+        :param scale: Масштаб персонажа (float) или None для масштабирования по высоте
+        :param surface_size: Размер игровой поверхности
+        :return: Масштабированная поверхность
+        """
+        # Масштаб и подгонка по высоте - разные части ключа, иначе масштаб,
+        # равный CHARACTER_HEIGHT, совпал бы с подгонкой по высоте
+        mode = ("scale", scale) if scale else ("height",)
+        key = (name, mode, surface_size, self.smooth)
+        sprite = self.cache.get(key)
+        if sprite is None:
+            sprite = self.scale_image(image, scale, name)
+            self.cache.put(key, sprite)
+        return sprite
+
+    def scale_image(self, image, scale, name=None):
+        """
+        Масштабирует изображение персонажа. Если есть заранее уменьшенный
+        вариант изображения, масштабируется он.
+
+        :param image: Исходное изображение
+        :param scale: Масштаб (float) или None для масштабирования по высоте
+        :param name: Имя персонажа (для поиска уменьшенного варианта)
+        :return: Масштабированная поверхность
+        """
+        original_size = image.get_size()
+        if scale:
+            new_size = (int(original_size[0] * scale), int(original_size[1] * scale))
+        else:
+            # Масштабируем персонажа по высоте
+            height_ratio = CHARACTER_HEIGHT / original_size[1]
+            new_size = (int(original_size[0] * height_ratio), CHARACTER_HEIGHT)
+
+        if self.variant_loader is not None and name is not None:
+            image = self.variant_loader(name, new_size) or image
+
+        sprite = None
+        if self.smooth:
+            try:
+                sprite = pygame.transform.smoothscale(image, new_size)
+            except ValueError:
+                # smoothscale работает только с 24- и 32-битными поверхностями
+                pass
+        if sprite is None:
+            sprite = pygame.transform.scale(image, new_size)
+        
+        # Готовое изображение только выводится на экран, поэтому прозрачность кодируем RLE
+        return enable_rle(sprite)
+
+    def set_smooth(self, smooth):
+        """
+        Переключает качество масштабирования
+
+        :param smooth: Использовать сглаживающее масштабирование
+        """
+        if smooth != self.smooth:
+            self.smooth = smooth
+            self.invalidate()
+
+    def invalidate(self):
+        """
+        Сбрасывает все масштабированные изображения (при изменении размера или режима экрана)
+        """
+        self.cache.clear()
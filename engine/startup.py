@@ -0,0 +1,130 @@
+import json
+import time
+from contextlib import contextmanager
+
+class StartupProfiler:
+    """
+    Замер времени запуска игры: от вызова main() до вывода первого кадра.
+    Для каждого этапа записывается реальное время и процессорное время
+    всего процесса, для каждого изображения - время загрузки и масштабирования
+    (процессорное время - только потока, в котором оно обрабатывалось).
+    """
+    def __init__(self):
+        """
+        Инициализация профилировщика. Отсчет времени начинается с момента создания.
+        """
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        # Процессорное время, потраченное интерпретатором до создания профилировщика
+        self.interpreter_cpu = self.start_cpu
+        self.phases = []  # [(имя, уровень вложенности, реальное_мс, процессорное_мс), ...]
+        self.assets = {}  # Имя изображения -> {этап: [реальное_мс, процессорное_мс]}
+        self.depth = 0
+        self.total = None  # (реальное_мс, процессорное_мс) до первого кадра
+
+    def begin(self, name):
+        """
+        Начинает замер этапа запуска. Этапы могут быть вложенными.
+
+        :param name: Название этапа
+        :return: Метка этапа для end()
+        """
+        self.phases.append((name, self.depth, 0.0, 0.0))
+        self.depth += 1
+        return len(self.phases) - 1, time.perf_counter(), time.process_time()
+
+    def end(self, token):
+        """
+        Завершает замер этапа запуска
+
+        :param token: Метка, которую вернул begin()
+        """
+        index, wall, cpu = token
+        name, depth, _, _ = self.phases[index]
+        self.depth = depth
+        self.phases[index] = (name, depth, (time.perf_counter() - wall) * 1000,
+                              (time.process_time() - cpu) * 1000)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Замеряет этап запуска внутри блока with
+
+        :param name: Название этапа
+        """
+        token = self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(token)
+
+    @contextmanager
+    def asset(self, name, stage):
+        """
+        Замеряет обработку изображения. Повторные замеры одного этапа суммируются.
+
+        :param name: Имя изображения (например, "background:bg_lab")
+        :param stage: Этап обработки ("load" или "scale")
+        """
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            times = self.assets.setdefault(name, {}).setdefault(stage, [0.0, 0.0])
+            times[0] += (time.perf_counter() - wall) * 1000
+            times[1] += (time.thread_time() - cpu) * 1000
+
+    def finish(self):
+        """
+        Завершает замер (вызывается после вывода первого кадра)
+        """
+        if self.total is None:
+            self.total = ((time.perf_counter() - self.start_wall) * 1000,
+                          (time.process_time() - self.start_cpu) * 1000)
+
+    def to_dict(self):
+        """
+        Возвращает результаты замера для сохранения в JSON
+
+        :return: Словарь с этапами и изображениями
+        """
+        self.finish()
+        return {
+            "total": {"wall_ms": round(self.total[0], 3), "cpu_ms": round(self.total[1], 3)},
+            "interpreter_cpu_ms": round(self.interpreter_cpu * 1000, 3),
+            "phases": [
+                {"name": name, "depth": depth, "wall_ms": round(wall, 3), "cpu_ms": round(cpu, 3)}
+                for name, depth, wall, cpu in self.phases
+            ],
+            "assets": {
+                name: {stage: {"wall_ms": round(wall, 3), "cpu_ms": round(cpu, 3)}
+                       for stage, (wall, cpu) in stages.items()}
+                for name, stages in self.assets.items()
+            },
+        }
+
+    def save(self, path):
+        """
+        Сохраняет результаты замера в JSON-файл
+
+        :param path: Путь к файлу
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, ensure_ascii=False, indent=2)
+
+    def print_report(self):
+        """
+        Выводит результаты замера в консоль
+        """
+        self.finish()
+        print(f"Запуск до первого кадра: {self.total[0]:.1f} мс (CPU {self.total[1]:.1f} мс), "
+              f"интерпретатор до main(): CPU {self.interpreter_cpu * 1000:.1f} мс")
+        for name, depth, wall, cpu in self.phases:
+            indent = "  " * (depth + 1)
+            print(f"{indent}{name}: {wall:.1f} мс (CPU {cpu:.1f} мс)")
+        if self.assets:
+            print("Изображения:")
+            for name, stages in self.assets.items():
+                parts = [f"{stage} {wall:.1f} мс (CPU {cpu:.1f} мс)" for stage, (wall, cpu) in stages.items()]
+                print(f"  {name}: {', '.join(parts)}")
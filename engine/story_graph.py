@@ -0,0 +1,204 @@
+from array import array
+
+# Индекс, означающий отсутствие перехода
+NO_SCENE = -1
+
+# Действия при входе в сцену и их обязательные поля
+SCENE_ACTIONS = {
+    "set_variable": ("variable", "value"),
+}
+
+class StoryError(Exception):
+    """
+    Ошибка в сюжете, найденная при компиляции. Содержит все найденные ошибки,
+    чтобы их можно было исправить за один раз.
+    """
+    def __init__(self, errors):
+        """
+        Инициализация ошибки.
+
+        :param errors: Список описаний ошибок
+        """
+        self.errors = errors
+        super().__init__("Ошибки в сюжете:\n" + "\n".join(f"  - {error}" for error in errors))
+
+class StoryGraph:
+    """
+    Скомпилированный граф сюжета: все переходы между сценами заранее разрешены
+    в индексы сцен и хранятся в плоских массивах целых чисел (4 байта на переход),
+    поэтому переход во время игры - это обращение к массиву по индексу.
+    Индексы сцен вариантов выбора всех сцен идут в одном массиве подряд,
+    choice_offsets[i]:choice_offsets[i + 1] - варианты сцены i.
+    """
+    def __init__(self, next_scene, choice_offsets, choice_targets):
+        """
+        Инициализация графа.
+
+        :param next_scene: Для каждой сцены - индекс следующей сцены или NO_SCENE (array("i"))
+        :param choice_offsets: Для каждой сцены - начало её вариантов в choice_targets,
+                               и в конце - общее количество вариантов (array("i"))
+        :param choice_targets: Индексы сцен вариантов выбора всех сцен (array("i"))
+        """
+        self.next_scene = next_scene
+        self.choice_offsets = choice_offsets
+        self.choice_targets = choice_targets
+
+    def __len__(self):
+        return len(self.next_scene)
+
+    def get_choice_targets(self, index):
+        """
+        Возвращает индексы сцен вариантов выбора сцены (в порядке вариантов)
+
+        :param index: Индекс сцены
+        :return: Массив индексов сцен (пустой, если у сцены нет выбора)
+        """
+        return self.choice_targets[self.choice_offsets[index]:self.choice_offsets[index + 1]]
+
+    def get_choice_count(self, index):
+        """
+        Возвращает количество вариантов выбора сцены при компиляции
+
+        :param index: Индекс сцены
+        :return: Количество вариантов
+        """
+        return self.choice_offsets[index + 1] - self.choice_offsets[index]
+
+    def has_choices(self, index):
+        """
+        Проверяет, есть ли у сцены варианты выбора
+
+        :param index: Индекс сцены
+        :return: True, если есть варианты выбора
+        """
+        return self.choice_offsets[index] != self.choice_offsets[index + 1]
+
+    def can_advance(self, index):
+        """
+        Проверяет, можно ли перейти вперед из сцены
+
+        :param index: Индекс сцены
+        :return: True, если у сцены есть варианты выбора или следующая сцена
+        """
+        return self.has_choices(index) or self.next_scene[index] != NO_SCENE
+
+    def get_successors(self, index):
+        """
+        Возвращает индексы сцен, в которые можно перейти вперед из сцены
+        (все варианты выбора, без учета условий)
+
+        :param index: Индекс сцены
+        :return: Последовательность индексов сцен
+        """
+        if self.has_choices(index):
+            return self.get_choice_targets(index)
+        if self.next_scene[index] != NO_SCENE:
+            return (self.next_scene[index],)
+        return ()
+
+    def to_bytes(self):
+        """
+        Возвращает массивы графа для сохранения
+
+        :return: Кортеж (next_scene, choice_offsets, choice_targets) в байтах
+        """
+        return self.next_scene.tobytes(), self.choice_offsets.tobytes(), self.choice_targets.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Восстанавливает граф из сохраненных массивов
+
+        :param data: Кортеж, возвращенный to_bytes
+        :return: Объект StoryGraph
+        """
+        arrays = []
+        for item in data:
+            values = array("i")
+            values.frombytes(item)
+            arrays.append(values)
+        return cls(*arrays)
+
+def get_action_errors(actions, source):
+    """
+    Проверяет действия при входе в сцену
+
+    :param actions: Действия сцены (словари)
+    :param source: Описание сцены для сообщений об ошибках
+    :return: Список ошибок
+    """
+    errors = []
+    for action in actions:
+        fields = SCENE_ACTIONS.get(action.get("action"))
+        if fields is None:
+            errors.append(f"{source}: неизвестное действие при входе '{action.get('action')}'")
+        elif any(field not in action for field in fields):
+            errors.append(f"{source}: у действия '{action['action']}' должны быть поля {', '.join(fields)}")
+    return errors
+
+def compile_story(scenes, asset_paths):
+    """
+    Проверяет сюжет и строит граф переходов. Вызывается один раз после загрузки сюжета.
+
+    Переход вперед из сцены без вариантов выбора ведет к сцене next_scene_id,
+    а если он не задан - к следующей сцене в списке (у последней сцены перехода нет).
+
+    :param scenes: Список сцен (объекты Scene) в порядке добавления
+    :param asset_paths: Зарегистрированные изображения: (категория, имя) -> путь
+    :return: Объект StoryGraph
+    :raises StoryError: Если в сюжете есть повторяющиеся ID, переходы
+                        к несуществующим сценам или неизвестные ресурсы
+    """
+    errors = []
+    if not scenes:
+        errors.append("в сюжете нет сцен")
+
+    # Словарь ID -> индекс нужен только на время компиляции
+    index = {}
+    for i, scene in enumerate(scenes):
+        if scene.scene_id is None:
+            continue
+        if scene.scene_id in index:
+            errors.append(f"сцена #{i}: ID '{scene.scene_id}' уже используется сценой #{index[scene.scene_id]}")
+        else:
+            index[scene.scene_id] = i
+
+    def resolve(scene_id, source):
+        if scene_id in index:
+            return index[scene_id]
+        errors.append(f"{source}: переход к несуществующей сцене '{scene_id}'")
+        return NO_SCENE
+
+    next_scene = array("i")
+    choice_offsets = array("i", [0])
+    choice_targets = array("i")
+    for i, scene in enumerate(scenes):
+        if scene.scene_id is not None and index.get(scene.scene_id) == i:
+            source = f"сцена '{scene.scene_id}'"
+        else:
+            source = f"сцена #{i}"
+
+        choice_targets.extend(resolve(choice.next_scene, f"{source}, вариант '{choice.text}'")
+                              for choice in scene.choices)
+        choice_offsets.append(len(choice_targets))
+
+        if scene.choices:
+            # Из сцены с выбором переходят только через варианты
+            next_scene.append(NO_SCENE)
+        elif scene.next_scene_id:
+            next_scene.append(resolve(scene.next_scene_id, source))
+        elif i < len(scenes) - 1:
+            next_scene.append(i + 1)
+        else:
+            next_scene.append(NO_SCENE)
+
+        if scene.background is not None and ("background", scene.background) not in asset_paths:
+            errors.append(f"{source}: фон '{scene.background}' не зарегистрирован")
+        if scene.character is not None and ("character", scene.character) not in asset_paths:
+            errors.append(f"{source}: персонаж '{scene.character}' не зарегистрирован")
+
+        errors.extend(get_action_errors(scene.on_enter, source))
+
+    if errors:
+        raise StoryError(errors)
+    return StoryGraph(next_scene, choice_offsets, choice_targets)
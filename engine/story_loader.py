@@ -0,0 +1,349 @@
+import hashlib
+import json
+import marshal
+import multiprocessing
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from engine.config import (BACKGROUNDS_PATH, CHARACTERS_PATH, SCENE_CACHE_SIZE, SCENE_PREFETCH_DEPTH, SCENE_STORE,
+                           STORY_CACHE_ENABLED, STORY_COMPILE_PROCESSES, STORY_PARALLEL_MIN_BYTES)
+from engine.scene import SCENE_FIELDS, Scene, SceneInterner
+from engine.scene_store import build_scene_store, open_scene_store
+from engine.story_graph import StoryError
+
+# Формат файла сюжета (JSON):
+#   главный файл: {"backgrounds": {имя: файл в BACKGROUNDS_PATH},
+#                  "characters": {имя: файл в CHARACTERS_PATH},
+#                  "variables": {имя: начальное значение},
+#                  "chapters": [пути к файлам глав относительно главного файла],
+#                  "scenes": [...]}  - сцены можно задать и прямо в главном файле
+#   файл главы: {"scenes": [{"text": ..., "scene_id": ..., ...}, ...]}
+#   поля сцены совпадают с параметрами Scene (SCENE_FIELDS)
+#
+# Формат кэша (рядом с главным файлом, расширение STORY_CACHE_EXTENSION):
+#   заголовок: сигнатура, версия, SHA-256 содержимого всех файлов сюжета (CACHE_HEADER)
+#   данные: marshal {"backgrounds", "characters", "variables", "scenes": [кортежи полей сцены]}
+# Кэш используется, только если хэш совпадает, иначе сюжет компилируется заново
+#
+# При хранении сцен в базе SQLite (SCENE_STORE = "sqlite") вместо кэша используется
+# база рядом с главным файлом (расширение SCENE_DATABASE_EXTENSION) с тем же хэшем
+CACHE_MAGIC = b"NVST"
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct("<4sI32s")
+STORY_CACHE_EXTENSION = ".storycache"
+SCENE_DATABASE_EXTENSION = ".scenes.db"
+
+# Размер части файла при вычислении хэша
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Разделы главного файла, которые переносятся в скомпилированный сюжет
+STORY_SECTIONS = ("backgrounds", "characters", "variables")
+
+def parse_json(name, content, errors):
+    """
+    Разбирает JSON-файл сюжета
+
+    :param name: Имя файла (для сообщений об ошибках)
+    :param content: Содержимое файла (bytes)
+    :param errors: Список, в который добавляются ошибки
+    :return: Разобранный объект или None при ошибке
+    """
+    try:
+        data = json.loads(content.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError) as e:
+        errors.append(f"{name}: ошибка разбора JSON: {e}")
+        return None
+    if not isinstance(data, dict):
+        errors.append(f"{name}: файл сюжета должен содержать объект JSON")
+        return None
+    return data
+
+def compile_chapter(name, content):
+    """
+    Компилирует файл главы в кортежи полей сцен. Выполняется в процессе пула,
+    поэтому ошибки возвращаются списком, а не исключением.
+
+    :param name: Имя файла (для сообщений об ошибках)
+    :param content: Содержимое файла (bytes)
+    :return: Пара (список кортежей полей сцен, список ошибок)
+    """
+    errors = []
+    data = parse_json(name, content, errors)
+    if data is None:
+        return [], errors
+
+    scenes = data.get("scenes", [])
+    if not isinstance(scenes, list):
+        return [], [f"{name}: поле scenes должно быть списком"]
+
+    records = []
+    for number, scene in enumerate(scenes, 1):
+        source = f"{name}, сцена {number}"
+        if not isinstance(scene, dict):
+            errors.append(f"{source}: сцена должна быть объектом")
+            continue
+        unknown = [field for field in scene if field not in SCENE_FIELDS]
+        if unknown:
+            errors.append(f"{source}: неизвестные поля {', '.join(unknown)}")
+        if not isinstance(scene.get("text"), str):
+            errors.append(f"{source}: нет текста сцены")
+        for field in ("choices", "on_enter"):
+            items = scene.get(field)
+            if items is None:
+                continue
+            if not isinstance(items, list):
+                errors.append(f"{source}: поле {field} должно быть списком")
+            elif not all(isinstance(item, dict) for item in items):
+                errors.append(f"{source}: элементы поля {field} должны быть объектами")
+        for choice in scene.get("choices") or []:
+            if isinstance(choice, dict) and ("text" not in choice or "next_scene" not in choice):
+                errors.append(f"{source}: у варианта выбора нет текста или следующей сцены")
+        records.append(tuple(scene.get(field) for field in SCENE_FIELDS))
+    return records, errors
+
+def compile_chapter_file(name):
+    """
+    Читает и компилирует файл со сценами. Выполняется в процессе пула:
+    файл читает сам процесс, чтобы не передавать содержимое между процессами.
+
+    :param name: Путь к файлу
+    :return: Пара (список кортежей полей сцен, список ошибок)
+    """
+    try:
+        with open(name, "rb") as file:
+            content = file.read()
+    except OSError as e:
+        return [], [f"не удалось прочитать главу {name}: {e}"]
+    return compile_chapter(name, content)
+
+def read_sources(path):
+    """
+    Читает главный файл сюжета и находит файлы со сценами
+    (файлы глав читаются по одному при вычислении ключа и компиляции)
+
+    :param path: Путь к главному файлу сюжета
+    :return: Кортеж (разобранный главный файл, содержимое главного файла,
+             список путей к файлам со сценами)
+    :raises StoryError: Если главный файл не удалось прочитать или разобрать
+    """
+    errors = []
+    try:
+        with open(path, "rb") as file:
+            content = file.read()
+    except OSError as e:
+        raise StoryError([f"не удалось прочитать файл сюжета: {e}"])
+    manifest = parse_json(path, content, errors)
+    if manifest is None:
+        raise StoryError(errors)
+
+    chapters = manifest.get("chapters", [])
+    if not isinstance(chapters, list):
+        raise StoryError([f"{path}: поле chapters должно быть списком"])
+
+    sources = []
+    if "scenes" in manifest:
+        sources.append(path)
+    base_path = os.path.dirname(path)
+    for chapter in chapters:
+        sources.append(os.path.join(base_path, chapter))
+    return manifest, content, sources
+
+def get_cache_key(manifest_content, sources):
+    """
+    Вычисляет ключ кэша: хэш содержимого всех файлов сюжета и версий форматов
+
+    :param manifest_content: Содержимое главного файла сюжета
+    :param sources: Список путей к файлам со сценами
+    :return: SHA-256 (32 байта)
+    :raises StoryError: Если файлы глав не удалось прочитать
+    """
+    digest = hashlib.sha256(f"{CACHE_VERSION}:{marshal.version}:{sys.version_info[:2]}".encode())
+    digest.update(manifest_content)
+    errors = []
+    for name in sources:
+        try:
+            with open(name, "rb") as file:
+                # Файл хэшируется по частям, чтобы не держать большие главы в памяти
+                size = os.fstat(file.fileno()).st_size
+                digest.update(f"\0{os.path.basename(name)}:{size}\0".encode("utf-8"))
+                for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+                    digest.update(block)
+        except OSError as e:
+            errors.append(f"не удалось прочитать главу {name}: {e}")
+    if errors:
+        raise StoryError(errors)
+    return digest.digest()
+
+def read_cache(cache_path, key):
+    """
+    Загружает скомпилированный сюжет из кэша
+
+    :param cache_path: Путь к файлу кэша
+    :param key: Ожидаемый ключ кэша
+    :return: Скомпилированный сюжет или None, если кэша нет или он устарел
+    """
+    try:
+        with open(cache_path, "rb") as file:
+            header = file.read(CACHE_HEADER.size)
+            if len(header) != CACHE_HEADER.size:
+                return None
+            magic, version, cached_key = CACHE_HEADER.unpack(header)
+            if magic != CACHE_MAGIC or version != CACHE_VERSION or cached_key != key:
+                return None
+            return marshal.loads(file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+def write_cache(cache_path, key, story):
+    """
+    Сохраняет скомпилированный сюжет в кэш
+
+    :param cache_path: Путь к файлу кэша
+    :param key: Ключ кэша
+    :param story: Скомпилированный сюжет
+    """
+    temp_path = cache_path + ".tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, key))
+            file.write(marshal.dumps(story))
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"Ошибка при сохранении кэша сюжета {cache_path}: {e}")
+
+def get_process_count():
+    """
+    Возвращает количество процессов для компиляции глав
+
+    :return: Количество процессов (1 - компиляция в текущем процессе)
+    """
+    return STORY_COMPILE_PROCESSES or os.cpu_count() or 1
+
+def compile_sources(sources):
+    """
+    Компилирует файлы со сценами по одному и возвращает результаты по мере
+    готовности, чтобы главы можно было сохранять, не собирая весь сюжет в памяти.
+    Большие сюжеты из нескольких файлов компилируются в пуле процессов, по файлу на задачу.
+
+    :param sources: Список путей к файлам со сценами
+    :return: Генератор пар (кортежи полей сцен файла, список ошибок) в порядке файлов
+    """
+    processes = min(get_process_count(), len(sources))
+    total_size = sum(os.path.getsize(name) for name in sources)
+    if processes > 1 and total_size >= STORY_PARALLEL_MIN_BYTES:
+        # Процессы запускаются заново (spawn), а не копируют игру с её потоками
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+            yield from pool.map(compile_chapter_file, sources)
+    else:
+        for name in sources:
+            yield compile_chapter_file(name)
+
+def get_story_sections(path, manifest, errors):
+    """
+    Возвращает разделы главного файла, которые переносятся в скомпилированный сюжет
+
+    :param path: Путь к главному файлу сюжета (для сообщений об ошибках)
+    :param manifest: Разобранный главный файл
+    :param errors: Список, в который добавляются ошибки
+    :return: Словарь {"backgrounds", "characters", "variables"}
+    """
+    sections = {}
+    for field in STORY_SECTIONS:
+        sections[field] = manifest.get(field, {})
+        if not isinstance(sections[field], dict):
+            errors.append(f"{path}: поле {field} должно быть объектом")
+    return sections
+
+def read_story(path, use_cache=STORY_CACHE_ENABLED):
+    """
+    Возвращает скомпилированный сюжет: из кэша, если файлы сюжета не менялись,
+    иначе компилирует его и сохраняет кэш
+
+    :param path: Путь к главному файлу сюжета
+    :param use_cache: Использовать кэш рядом с главным файлом
+    :return: Словарь {"backgrounds", "characters", "variables", "scenes"}
+    :raises StoryError: Если в файлах сюжета есть ошибки
+    """
+    manifest, manifest_content, sources = read_sources(path)
+    cache_path = os.path.splitext(path)[0] + STORY_CACHE_EXTENSION
+    key = get_cache_key(manifest_content, sources)
+    if use_cache:
+        story = read_cache(cache_path, key)
+        if story is not None:
+            return story
+
+    errors = []
+    story = get_story_sections(path, manifest, errors)
+    story["scenes"] = []
+    for records, chapter_errors in compile_sources(sources):
+        story["scenes"].extend(records)
+        errors.extend(chapter_errors)
+    if errors:
+        raise StoryError(errors)
+
+    if use_cache:
+        write_cache(cache_path, key, story)
+    return story
+
+def read_story_store(path, asset_paths=(), cache_size=SCENE_CACHE_SIZE, prefetch_depth=SCENE_PREFETCH_DEPTH):
+    """
+    Возвращает базу сцен сюжета: собранную ранее, если файлы сюжета не менялись,
+    иначе собирает её заново, сохраняя сцены каждой главы сразу после её компиляции
+
+    :param path: Путь к главному файлу сюжета
+    :param asset_paths: Изображения, уже зарегистрированные в игре (кроме изображений из главного файла)
+    :param cache_size: Количество сцен в кэше базы
+    :param prefetch_depth: Сколько следующих сцен загружать вместе со сценой
+    :return: Объект SQLiteSceneStore со сведениями о сюжете (get_info)
+    :raises StoryError: Если в файлах сюжета есть ошибки
+    """
+    manifest, manifest_content, sources = read_sources(path)
+    database_path = os.path.splitext(path)[0] + SCENE_DATABASE_EXTENSION
+    key = get_cache_key(manifest_content, sources)
+    store = open_scene_store(database_path, key, cache_size, prefetch_depth)
+    if store is not None:
+        return store
+
+    errors = []
+    sections = get_story_sections(path, manifest, errors)
+    if errors:
+        raise StoryError(errors)
+    # Изображения из главного файла регистрируются в игре после сборки базы
+    registered = set(asset_paths)
+    registered.update(("background", name) for name in sections["backgrounds"])
+    registered.update(("character", name) for name in sections["characters"])
+    return build_scene_store(database_path, key, sections, compile_sources(sources), registered,
+                             cache_size, prefetch_depth)
+
+def load_story_file(game, path, scene_store=SCENE_STORE):
+    """
+    Загружает сюжет из файла в игру: регистрирует фоны и персонажей,
+    задает начальные значения переменных и добавляет сцены
+
+    :param game: Экземпляр класса Game
+    :param path: Путь к главному файлу сюжета
+    :param scene_store: Хранилище сцен: "memory" - список в памяти, "sqlite" - база сцен сюжета
+    :raises StoryError: Если в файлах сюжета есть ошибки
+    """
+    if scene_store == "sqlite":
+        store = read_story_store(path, game.asset_paths)
+        story = {field: store.get_info(field) for field in STORY_SECTIONS}
+    else:
+        story = read_story(path)
+    for name, file_name in story["backgrounds"].items():
+        game.add_background(name, f"{BACKGROUNDS_PATH}{file_name}")
+    for name, file_name in story["characters"].items():
+        game.add_character(name, f"{CHARACTERS_PATH}{file_name}")
+    for name, value in story["variables"].items():
+        game.set_variable(name, value)
+    if scene_store == "sqlite":
+        game.set_scene_store(store)
+        return
+
+    # Одинаковые варианты выбора и действия разных сцен хранятся в одном экземпляре
+    interner = SceneInterner()
+    for record in story["scenes"]:
+        game.add_scene(Scene(*record, interner=interner))
@@ -0,0 +1,217 @@
+from collections import OrderedDict
+
+from engine.cache import surface_bytes
+
+class SurfaceCategory:
+    """
+    Представление одной категории хранилища в виде словаря имя -> поверхность
+    (например, Game.characters или Game.backgrounds).
+    """
+    def __init__(self, store, category):
+        """
+        Инициализация представления.
+
+        :param store: Хранилище поверхностей (SurfaceStore)
+        :param category: Имя категории
+        """
+        self.store = store
+        self.category = category
+
+    def get(self, name, default=None):
+        """
+        Возвращает поверхность и отмечает её как недавно использованную
+
+        :param name: Имя изображения
+        :param default: Значение, если изображения нет в хранилище
+        :return: Поверхность или значение по умолчанию
+        """
+        return self.store.get((self.category, name), default)
+
+    def peek(self, name, default=None):
+        """
+        Возвращает поверхность, не меняя порядок вытеснения
+
+        :param name: Имя изображения
+        :param default: Значение, если изображения нет в хранилище
+        :return: Поверхность или значение по умолчанию
+        """
+        return self.store.items.get((self.category, name), default)
+
+    def pop(self, name, default=None):
+        """
+        Удаляет изображение из хранилища
+
+        :param name: Имя изображения
+        :param default: Значение, если изображения нет в хранилище
+        :return: Удаленная поверхность или значение по умолчанию
+        """
+        return self.store.remove((self.category, name), default)
+
+    def keys(self):
+        """
+        Возвращает имена изображений категории
+
+        :return: Список имен
+        """
+        return [name for category, name in self.store.items if category == self.category]
+
+    def items(self):
+        """
+        Возвращает изображения категории, не меняя порядок вытеснения
+
+        :return: Список пар (имя, поверхность)
+        """
+        return [(name, surface) for (category, name), surface in self.store.items.items()
+                if category == self.category]
+
+    def __getitem__(self, name):
+        surface = self.store.get((self.category, name))
+        if surface is None:
+            raise KeyError(name)
+        return surface
+
+    def __setitem__(self, name, surface):
+        self.store.put((self.category, name), surface)
+
+    def __delitem__(self, name):
+        if self.store.remove((self.category, name)) is None:
+            raise KeyError(name)
+
+    def __contains__(self, name):
+        return (self.category, name) in self.store.items
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+class SurfaceStore:
+    """
+    Общее хранилище загруженных изображений с бюджетом памяти.
+    При превышении бюджета вытесняются давно не использованные изображения (LRU),
+    кроме закрепленных (изображения текущей и следующих сцен).
+    Вытесненное изображение загружается заново при следующем использовании.
+    """
+    def __init__(self, max_bytes, on_evict=None):
+        """
+        Инициализация хранилища.
+
+        :param max_bytes: Бюджет памяти в байтах (None - без ограничения)
+        :param on_evict: Функция on_evict(категория, имя), вызываемая при вытеснении
+        """
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.items = OrderedDict()  # (категория, имя) -> поверхность
+        self.sizes = {}
+        self.total_bytes = 0
+        self.pinned = set()
+        self.evictions = 0
+
+    def category(self, category):
+        """
+        Возвращает представление категории в виде словаря
+
+        :param category: Имя категории
+        :return: Объект SurfaceCategory
+        """
+        return SurfaceCategory(self, category)
+
+    def get(self, key, default=None):
+        """
+        Возвращает поверхность и отмечает её как недавно использованную
+
+        :param key: Ключ (категория, имя)
+        :param default: Значение, если поверхности нет в хранилище
+        :return: Поверхность или значение по умолчанию
+        """
+        if key not in self.items:
+            return default
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key, surface):
+        """
+        Добавляет поверхность, вытесняя давно не использованные при превышении бюджета
+
+        :param key: Ключ (категория, имя)
+        :param surface: Поверхность Pygame
+        """
+        if key in self.items:
+            self.total_bytes -= self.sizes.pop(key)
+        self.items[key] = surface
+        self.items.move_to_end(key)
+        self.sizes[key] = surface_bytes(surface)
+        self.total_bytes += self.sizes[key]
+        self.evict(keep=key)
+
+    def remove(self, key, default=None):
+        """
+        Удаляет поверхность из хранилища
+
+        :param key: Ключ (категория, имя)
+        :param default: Значение, если поверхности нет в хранилище
+        :return: Удаленная поверхность или значение по умолчанию
+        """
+        if key not in self.items:
+            return default
+        self.total_bytes -= self.sizes.pop(key)
+        return self.items.pop(key)
+
+    def evict(self, keep=None):
+        """
+        Вытесняет давно не использованные незакрепленные поверхности,
+        пока не будет соблюден бюджет
+
+        :param keep: Ключ, который нельзя вытеснять (только что добавленный)
+        """
+        if self.max_bytes is None:
+            return
+        for key in list(self.items):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if key == keep or key in self.pinned:
+                continue
+            self.remove(key)
+            self.evictions += 1
+            if self.on_evict:
+                self.on_evict(*key)
+
+    def has_room(self, size):
+        """
+        Проверяет, поместится ли в бюджет изображение без вытеснения других
+
+        :param size: Размер изображения в байтах
+        :return: True, если бюджет позволяет
+        """
+        return self.max_bytes is None or self.total_bytes + size <= self.max_bytes
+
+    def pin(self, keys):
+        """
+        Закрепляет поверхности, которые нельзя вытеснять. Заменяет прежний набор.
+
+        :param keys: Ключи (категория, имя)
+        """
+        self.pinned = set(keys)
+        self.evict()
+
+    def usage(self):
+        """
+        Возвращает объем памяти, занимаемый каждой категорией
+
+        :return: Словарь {категория: байты}
+        """
+        usage = {}
+        for (category, name), size in self.sizes.items():
+            usage[category] = usage.get(category, 0) + size
+        return usage
+
+    def print_report(self):
+        """
+        Выводит использование памяти в консоль
+        """
+        budget = f"{self.max_bytes / 1024 / 1024:.1f} МБ" if self.max_bytes is not None else "без ограничения"
+        print(f"Память изображений: {self.total_bytes / 1024 / 1024:.1f} МБ (бюджет: {budget}), "
+              f"вытеснено {self.evictions}")
+        for category, size in sorted(self.usage().items()):
+            print(f"  {category}: {size / 1024 / 1024:.1f} МБ")
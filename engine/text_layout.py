@@ -0,0 +1,246 @@
+import re
+from bisect import bisect_right
+from itertools import accumulate
+
+from engine.cache import LRUCache
+from engine.config import BLACK
+
+# Диапазоны письменностей без пробелов между словами (китайский, японский, корейский),
+# где строку можно переносить после любого символа
+CJK_RANGES = "\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef"
+CJK_PATTERN = re.compile(f"[{CJK_RANGES}]")
+
+# Сколько раз повторять символ при измерении его ширины
+ADVANCE_SAMPLE_LENGTH = 16
+
+class FontMetrics:
+    """
+    Измерение текста без отрисовки: таблица ширин символов одного шрифта,
+    заполняемая через Font.size() по мере появления новых символов.
+    """
+    def __init__(self, font):
+        """
+        Инициализация таблицы.
+
+        :param font: Шрифт Pygame
+        """
+        self.font = font
+        self.advances = {}
+
+    def advance(self, char):
+        """
+        Возвращает ширину символа
+
+        :param char: Символ
+        :return: Ширина в пикселях
+        """
+        width = self.advances.get(char)
+        if width is None:
+            # Ширина символа дробная, а Font.size() округляет её для одиночного символа,
+            # поэтому измеряем строку из повторов символа и делим на их количество
+            width = self.font.size(char * ADVANCE_SAMPLE_LENGTH)[0] / ADVANCE_SAMPLE_LENGTH
+            self.advances[char] = width
+        return width
+
+    def width(self, text):
+        """
+        Возвращает ширину текста как сумму ширин символов
+
+        :param text: Текст
+        :return: Ширина в пикселях (дробная)
+        """
+        return sum(self.widths(text))
+
+    def widths(self, text):
+        """
+        Возвращает ширины всех символов текста
+
+        :param text: Текст
+        :return: Итератор ширин символов
+        """
+        self.prepare(text)
+        return map(self.advances.__getitem__, text)
+
+    def prepare(self, text):
+        """
+        Заносит в таблицу ширины всех символов текста, которых в ней еще нет
+
+        :param text: Текст
+        """
+        for char in set(text).difference(self.advances):
+            self.advance(char)
+
+def is_cjk(char):
+    """
+    Проверяет, относится ли символ к письменностям без пробелов между словами
+    (китайский, японский, корейский), где строку можно переносить до и после символа
+
+    :param char: Символ
+    :return: True, если символ относится к CJK
+    """
+    return CJK_PATTERN.match(char) is not None
+
+def find_break(text, start, limit, has_cjk):
+    """
+    Ищет место переноса строки, начинающейся с позиции start
+
+    :param text: Текст с одиночными пробелами между словами
+    :param start: Начало строки
+    :param limit: Позиция, до которой (не включая) строка помещается по ширине
+    :param has_cjk: Есть ли в тексте символы CJK
+    :return: Пара (конец строки, начало следующей строки)
+    """
+    # Строка заканчивается ровно перед пробелом
+    if text[limit] == " ":
+        return limit, limit + 1
+
+    space = text.rfind(" ", start, limit)
+
+    # Перед символом CJK и после него переносить можно и без пробела
+    if has_cjk:
+        for index in range(limit, max(space, start), -1):
+            if is_cjk(text[index]) or is_cjk(text[index - 1]):
+                return index, index
+
+    if space > start:
+        return space, space + 1
+
+    # Слово длиннее всей строки: разбиваем его по символам
+    return limit, limit
+
+def wrap_text(font, text, width, metrics=None, max_lines=None):
+    """
+    Разбивает текст на строки, помещающиеся в заданную ширину.
+    Жадный перенос за линейное время: ширины символов берутся из таблицы,
+    ширина любого отрезка текста - разность накопленных сумм, поверхности
+    при этом не создаются.
+
+    :param font: Шрифт для измерения текста
+    :param text: Исходный текст
+    :param width: Доступная ширина в пикселях
+    :param metrics: Таблица ширин символов шрифта (FontMetrics)
+    :param max_lines: Максимальное количество строк (None - без ограничения)
+    :return: Список строк
+    """
+    if metrics is None:
+        metrics = FontMetrics(font)
+
+    # Схлопываем пробельные символы, как при разбиении текста на слова
+    text = " ".join(text.split())
+    if not text:
+        return []
+
+    # offsets[i] - ширина первых i символов текста
+    offsets = [0.0]
+    try:
+        offsets.extend(accumulate(map(metrics.advances.__getitem__, text)))
+    except KeyError:
+        # В тексте есть символы, которых еще нет в таблице
+        offsets = [0.0]
+        offsets.extend(accumulate(metrics.widths(text)))
+    has_cjk = CJK_PATTERN.search(text) is not None
+
+    lines = []
+    start = 0
+    while start < len(text) and (max_lines is None or len(lines) < max_lines):
+        # Самая дальняя позиция, до которой строка помещается по ширине
+        limit = max(bisect_right(offsets, offsets[start] + width) - 1, start + 1)
+        if limit >= len(text):
+            end = next_start = len(text)
+        else:
+            end, next_start = find_break(text, start, limit, has_cjk)
+
+        # Таблица не учитывает кернинг пар символов, поэтому готовую строку
+        # проверяем через Font.size() и при необходимости переносим раньше
+        while end > start + 1 and font.size(text[start:end])[0] > width:
+            end, next_start = find_break(text, start, end - 1, has_cjk)
+
+        lines.append(text[start:end])
+        start = next_start
+
+    return lines
+
+class TextLayout:
+    """
+    Готовая раскладка текста: строки и отрисованные поверхности строк.
+    """
+    def __init__(self, lines, surfaces):
+        """
+        Инициализация раскладки.
+
+        :param lines: Список строк текста
+        :param surfaces: Список поверхностей с отрисованными строками
+        """
+        self.lines = lines
+        self.surfaces = surfaces
+
+class TextLayoutCache:
+    """
+    Кэш раскладок текста по ключу (текст, шрифт, ширина).
+    Шрифт входит в ключ, поэтому после смены шрифта старые раскладки
+    не используются и вытесняются по LRU.
+    """
+    def __init__(self, max_items):
+        """
+        Инициализация кэша.
+
+        :param max_items: Максимальное количество раскладок в кэше
+        """
+        self.cache = LRUCache(max_items)
+        self.metrics = {}  # Таблицы ширин символов по шрифтам
+
+    def get_metrics(self, font):
+        """
+        Возвращает таблицу ширин символов для шрифта
+
+        :param font: Шрифт
+        :return: Объект FontMetrics
+        """
+        metrics = self.metrics.get(font)
+        if metrics is None:
+            metrics = FontMetrics(font)
+            self.metrics[font] = metrics
+        return metrics
+
+    def get_layout(self, text, font, width, max_lines=None, color=BLACK):
+        """
+        Возвращает раскладку текста, вычисляя её только при промахе кэша
+
+        :param text: Текст
+        :param font: Шрифт
+        :param width: Доступная ширина в пикселях
+        :param max_lines: Максимальное количество строк (None - без ограничения)
+        :param color: Цвет текста
+        :return: Объект TextLayout
+        """
+        key = (text, font, width, max_lines, color)
+        layout = self.cache.get(key)
+        if layout is None:
+            lines = wrap_text(font, text, width, self.get_metrics(font), max_lines)
+            surfaces = [font.render(line, True, color) for line in lines]
+            layout = TextLayout(lines, surfaces)
+            self.cache.put(key, layout)
+        return layout
+
+    def render(self, text, font, color=BLACK):
+        """
+        Возвращает поверхность с однострочным текстом, отрисовывая её только при промахе кэша
+
+        :param text: Текст
+        :param font: Шрифт
+        :param color: Цвет текста
+        :return: Поверхность с текстом
+        """
+        key = (text, font, color)
+        surface = self.cache.get(key)
+        if surface is None:
+            surface = font.render(text, True, color)
+            self.cache.put(key, surface)
+        return surface
+
+    def invalidate(self):
+        """
+        Сбрасывает все раскладки (при изменении размера или шрифтов)
+        """
+        self.cache.clear()
+        self.metrics.clear()
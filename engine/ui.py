@@ -0,0 +1,220 @@
+import pygame
+from engine.cache import LRUCache
+from engine.config import *
+
+# Параметры диалога подтверждения выхода
+DIALOG_WIDTH = 400
+DIALOG_HEIGHT = 150
+DIALOG_BUTTON_WIDTH = 100
+DIALOG_BUTTON_HEIGHT = 40
+DIALOG_PADDING = 20
+
+def get_navigation_buttons(surface_size):
+    """
+    Вычисляет прямоугольники кнопок навигации без отрисовки
+
+    :param surface_size: Размер игровой поверхности (ширина, высота)
+    :return: Пара прямоугольников (кнопка "Назад", кнопка "Вперед")
+    """
+    game_width, game_height = surface_size
+    button_y = game_height - TEXT_BOX_HEIGHT // 2 - BUTTON_HEIGHT // 2
+    back_button = pygame.Rect(BUTTON_PADDING, button_y, BUTTON_WIDTH, BUTTON_HEIGHT)
+    forward_button = pygame.Rect(game_width - BUTTON_WIDTH - BUTTON_PADDING,
+                                 button_y, BUTTON_WIDTH, BUTTON_HEIGHT)
+    return back_button, forward_button
+
+def get_dialog_rect(surface_size):
+    """
+    Вычисляет прямоугольник окна диалога подтверждения выхода
+
+    :param surface_size: Размер игровой поверхности (ширина, высота)
+    :return: Прямоугольник окна диалога
+    """
+    game_width, game_height = surface_size
+    return pygame.Rect((game_width - DIALOG_WIDTH) // 2, (game_height - DIALOG_HEIGHT) // 2,
+                       DIALOG_WIDTH, DIALOG_HEIGHT)
+
+def get_dialog_buttons(surface_size):
+    """
+    Вычисляет прямоугольники кнопок диалога подтверждения выхода без отрисовки
+
+    :param surface_size: Размер игровой поверхности (ширина, высота)
+    :return: Пара прямоугольников (кнопка "Да", кнопка "Нет")
+    """
+    dialog = get_dialog_rect(surface_size)
+    button_y = dialog.bottom - DIALOG_BUTTON_HEIGHT - DIALOG_PADDING
+    yes_button = pygame.Rect(dialog.x + DIALOG_PADDING, button_y,
+                             DIALOG_BUTTON_WIDTH, DIALOG_BUTTON_HEIGHT)
+    no_button = pygame.Rect(dialog.right - DIALOG_BUTTON_WIDTH - DIALOG_PADDING, button_y,
+                            DIALOG_BUTTON_WIDTH, DIALOG_BUTTON_HEIGHT)
+    return yes_button, no_button
+
+def get_condition_variables(condition, names=None):
+    """
+    Собирает имена переменных, от которых зависит условие (включая вложенные "and" и "or")
+
+    :param condition: Словарь с условием
+    :param names: Множество, в которое добавляются имена
+    :return: Множество имен переменных
+    """
+    if names is None:
+        names = set()
+    if not condition:
+        return names
+    if "variable" in condition:
+        names.add(condition["variable"])
+    for operator in ("and", "or"):
+        for sub_condition in condition.get(operator, []):
+            get_condition_variables(sub_condition, names)
+    return names
+
+def darken(surface, alpha):
+    """
+    Затемняет поверхность так же, как наложение черного цвета с заданной
+    непрозрачностью, но без создания полноэкранной полупрозрачной поверхности
+
+    :param surface: Поверхность для затемнения
+    :param alpha: Непрозрачность затемнения (0-255)
+    """
+    level = 255 - alpha
+    surface.fill((level, level, level), special_flags=pygame.BLEND_MULT)
+
+class UIChrome:
+    """
+    Заранее построенные элементы интерфейса: текстовое окно, кнопки
+    и диалог подтверждения выхода. Каждый элемент строится
+    один раз для своего размера и состояния и затем берется из кэша.
+    """
+    def __init__(self, font, button_font):
+        """
+        Инициализация слоя интерфейса.
+
+        :param font: Шрифт текста диалогов
+        :param button_font: Шрифт надписей на кнопках
+        """
+        self.font = font
+        self.button_font = button_font
+        self.cache = LRUCache(UI_CACHE_SIZE)
+
+    def get_text_box(self, width):
+        """
+        Возвращает поверхность текстового окна: полупрозрачная подложка
+        с белой внутренней частью
+
+        :param width: Ширина текстового окна
+        :return: Поверхность текстового окна
+        """
+        key = ("text_box", width)
+        surface = self.cache.get(key)
+        if surface is None:
+            surface = pygame.Surface((width, TEXT_BOX_HEIGHT), pygame.SRCALPHA)
+            surface.fill(TEXT_BOX_COLOR)
+            surface.fill(WHITE, (TEXT_BOX_PADDING, TEXT_BOX_PADDING,
+                                 width - 2 * TEXT_BOX_PADDING,
+                                 TEXT_BOX_HEIGHT - 2 * TEXT_BOX_PADDING))
+            self.cache.put(key, surface)
+        return surface
+
+    def get_button(self, label, size, color, border=2, font=None):
+        """
+        Возвращает поверхность кнопки с надписью
+
+        :param label: Надпись на кнопке
+        :param size: Размер кнопки (ширина, высота)
+        :param color: Цвет кнопки (зависит от состояния: обычная, под курсором, недоступная)
+        :param border: Толщина рамки (0 - без рамки)
+        :param font: Шрифт надписи (по умолчанию шрифт кнопок)
+        :return: Поверхность кнопки
+        """
+        font = font or self.button_font
+        key = ("button", label, size, color, border, font)
+        surface = self.cache.get(key)
+        if surface is None:
+            surface = pygame.Surface(size)
+            surface.fill(color)
+            rect = surface.get_rect()
+            if border:
+                pygame.draw.rect(surface, BLACK, rect, border)
+            text = font.render(label, True, BLACK)
+            surface.blit(text, text.get_rect(center=rect.center))
+            self.cache.put(key, surface)
+        return surface
+
+    def get_dialog_panel(self):
+        """
+        Возвращает поверхность окна диалога подтверждения выхода без кнопок
+
+        :return: Поверхность окна диалога
+        """
+        key = ("dialog_panel",)
+        surface = self.cache.get(key)
+        if surface is None:
+            surface = pygame.Surface((DIALOG_WIDTH, DIALOG_HEIGHT))
+            surface.fill(WHITE)
+            pygame.draw.rect(surface, BLACK, surface.get_rect(), 2)
+            text = self.font.render("Вы хотите выйти из игры?", True, BLACK)
+            surface.blit(text, text.get_rect(center=(DIALOG_WIDTH // 2, 40)))
+            self.cache.put(key, surface)
+        return surface
+
+    def invalidate(self):
+        """
+        Сбрасывает все построенные элементы (при изменении шрифтов)
+        """
+        self.cache.clear()
+
+class ChoiceMenu:
+    """
+    Меню выбора, вычисленное один раз при открытии: отфильтрованные по условиям
+    варианты и прямоугольники их кнопок. Меню нужно пересоздать, если изменилась
+    переменная из его условий или размер игровой поверхности.
+    """
+    def __init__(self, choices, filtered_choices, surface_size):
+        """
+        Инициализация меню.
+
+        :param choices: Исходный список вариантов выбора сцены
+        :param filtered_choices: Варианты, удовлетворяющие условиям, в формате [(вариант, индекс_сцены), ...]
+        :param surface_size: Размер игровой поверхности (ширина, высота)
+        """
+        self.choices = choices
+        self.surface_size = surface_size
+
+        # Переменные, изменение которых может поменять состав меню
+        self.dependencies = set()
+        for choice in choices:
+            get_condition_variables(choice.condition, self.dependencies)
+
+        game_width, game_height = surface_size
+
+        # Параметры кнопок выбора
+        choice_width = game_width * 0.8
+        choice_height = 50
+        choice_padding = 10
+
+        # Вычисляем общую высоту всех кнопок
+        total_height = len(filtered_choices) * (choice_height + choice_padding) - choice_padding
+
+        # Начальная позиция Y для первой кнопки
+        start_y = (game_height - total_height) // 2
+
+        # Прямоугольники кнопок в формате [(прямоугольник, вариант), ...]
+        self.buttons = []
+        # Кнопки для обработки кликов в формате [(прямоугольник, индекс_сцены), ...]
+        self.choice_buttons = []
+        for i, (choice, target) in enumerate(filtered_choices):
+            button_x = (game_width - choice_width) // 2
+            button_y = start_y + i * (choice_height + choice_padding)
+            rect = pygame.Rect(button_x, button_y, choice_width, choice_height)
+            self.buttons.append((rect, choice))
+            self.choice_buttons.append((rect, target))
+
+    def is_valid(self, choices, surface_size):
+        """
+        Проверяет, подходит ли меню для указанных вариантов и размера поверхности
+
+        :param choices: Список вариантов выбора сцены
+        :param surface_size: Размер игровой поверхности
+        :return: True, если меню можно использовать повторно
+        """
+        return self.choices is choices and self.surface_size == surface_size
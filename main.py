@@ -2,8 +2,11 @@
 NovelEngine - движок для создания визуальных новелл на Python с использованием Pygame.
 """
 
+import argparse
+import multiprocessing
 import os
 import sys
+from contextlib import nullcontext
 
 def resource_path(relative_path):
     """
@@ -18,10 +21,59 @@ def resource_path(relative_path):
 
     return os.path.join(base_path, relative_path)
 
+def profile_phase(profiler, name):
+    """
+    Замеряет этап запуска, если замер включен
+    
+    :param profiler: Профилировщик запуска (StartupProfiler) или None
+    :param name: Название этапа
+    :return: Контекстный менеджер для блока with
+    """
+    if profiler is None:
+        return nullcontext()
+    return profiler.phase(name)
+
 def main():
     """
     Основная функция для запуска игры.
     """
+    parser = argparse.ArgumentParser(description="NovelEngine")
+    parser.add_argument("--profile-startup", nargs="?", const="", metavar="JSON",
+                        help="Замерить время запуска до первого кадра, вывести результат "
+                             "в консоль или в JSON-файл и завершить работу")
+    parser.add_argument("--frame-stats", metavar="CSV",
+                        help="Сохранить при выходе перцентили времени этапов кадра в CSV-файл")
+    parser.add_argument("--record", metavar="PATH",
+                        help="Записать ввод игровой сессии в файл для воспроизведения")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="Воспроизвести записанный ввод без окна и вывести отчет о производительности")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Воспроизводить с записанными паузами (по умолчанию - с максимальной скоростью)")
+    parser.add_argument("--no-prefetch-wait", action="store_true",
+                        help="Не ждать окончания предзагрузки перед вводом при воспроизведении: "
+                             "задержки из-за незагруженных изображений войдут в задержку смены сцены")
+    parser.add_argument("--replay-report", metavar="JSON",
+                        help="Сохранить отчет о воспроизведении в JSON-файл")
+    args = parser.parse_args()
+    frame_stats_path = os.path.abspath(args.frame_stats) if args.frame_stats else None
+    record_path = os.path.abspath(args.record) if args.record else None
+    replay_path = os.path.abspath(args.replay) if args.replay else None
+    replay_report_path = os.path.abspath(args.replay_report) if args.replay_report else None
+    
+    if replay_path:
+        # Воспроизведение идет без окна и звука, если драйвер не задан явно
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    
+    # Профилировщик создается как можно раньше, путь к отчету - до смены директории
+    profiler = None
+    profile_path = None
+    if args.profile_startup is not None:
+        from engine.startup import StartupProfiler
+        profiler = StartupProfiler()
+        if args.profile_startup:
+            profile_path = os.path.abspath(args.profile_startup)
+    
     # Добавляем текущую директорию в путь поиска модулей
     if getattr(sys, 'frozen', False):
         # Если запущено из PyInstaller
@@ -31,17 +83,64 @@ def main():
         os.chdir(os.path.dirname(os.path.abspath(__file__)))
     
     # Импортируем модули после настройки путей
-    from engine.game import Game
-    from story.story import load_story
+    with profile_phase(profiler, "импорт модулей"):
+        from engine.game import Game
+        from engine.replay import InputRecorder, InputReplayer
+        from engine.story_graph import StoryError
+        from story.story import load_story
     
     # Создание экземпляра игры
-    game = Game()
+    with profile_phase(profiler, "Game.__init__"):
+        game = Game(profiler)
+    game.exit_after_first_frame = profiler is not None
+    if record_path:
+        game.recorder = InputRecorder(record_path)
+    if replay_path:
+        game.replayer = InputReplayer(replay_path, args.realtime, not args.no_prefetch_wait)
     
-    # Загрузка сюжета
-    load_story(game)
+    # Загрузка сюжета (изображения загружаются по мере показа сцен)
+    # Проверка сюжета и построение графа переходов: ошибки в сюжете
+    # обнаруживаются при загрузке, а не при переходе к сцене
+    try:
+        with profile_phase(profiler, "load_story"):
+            load_story(game)
+        with profile_phase(profiler, "компиляция сюжета"):
+            game.compile_story()
+    except StoryError as e:
+        print(e)
+        if game.prefetcher is not None:
+            game.prefetcher.stop()
+        sys.exit(1)
     
     # Запуск игры
-    game.run()
+    try:
+        game.run()
+    finally:
+        if profiler is not None:
+            if profile_path:
+                profiler.save(profile_path)
+                print(f"Замер запуска сохранен: {profile_path}")
+            else:
+                profiler.print_report()
+        if game.recorder is not None:
+            game.recorder.save()
+        if game.replayer is not None:
+            game.replayer.print_report()
+            if replay_report_path:
+                game.replayer.save_report(replay_report_path)
+                print(f"Отчет о воспроизведении сохранен: {replay_report_path}")
+        if frame_stats_path and game.frame_profiler is not None:
+            game.frame_profiler.dump_csv(frame_stats_path)
+            print(f"Время этапов кадра сохранено: {frame_stats_path}")
+        game.asset_report.print_report()
+        game.surface_store.print_report()
+        if game.scene_store is not None:
+            game.scene_store.print_report()
+            game.scene_store.close()
+        if game.prefetcher is not None:
+            game.prefetcher.print_report()
 
 if __name__ == "__main__":
+    # Компиляция сюжета может запускать процессы (в том числе из исполняемого файла PyInstaller)
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
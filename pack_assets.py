@@ -0,0 +1,61 @@
+import argparse
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+def find_images(assets_dir, skip):
+    """
+    Находит все изображения в директории ресурсов
+
+    :param assets_dir: Директория ресурсов
+    :param skip: Путь, который нужно пропустить (сам архив)
+    :return: Отсортированный список путей к изображениям
+    """
+    from engine.archive import IMAGE_EXTENSIONS
+
+    paths = []
+    for root, dirs, files in os.walk(assets_dir):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            if file_name.lower().endswith(IMAGE_EXTENSIONS) and os.path.abspath(path) != skip:
+                paths.append(path)
+    return sorted(paths)
+
+def pack_assets():
+    """
+    Упаковка изображений из директории ресурсов в архив с готовыми пикселями
+    """
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    from engine.archive import normalize_path, write_archive
+    from engine.config import ASSET_ARCHIVE_PATH, ASSET_VARIANT_HEIGHTS, BACKGROUNDS_PATH
+
+    parser = argparse.ArgumentParser(description="Упаковка изображений NovelEngine в архив")
+    parser.add_argument("--assets", default="Assets", help="Директория с изображениями")
+    parser.add_argument("--output", default=ASSET_ARCHIVE_PATH, help="Путь к архиву")
+    args = parser.parse_args()
+
+    # Для приведения изображений к формату экрана нужен экран
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+
+    # Фонам нужны варианты под распространенные высоты экрана
+    backgrounds_dir = normalize_path(BACKGROUNDS_PATH) + "/"
+
+    def variant_heights(path):
+        if normalize_path(path).startswith(backgrounds_dir):
+            return ASSET_VARIANT_HEIGHTS
+        return ()
+
+    paths = find_images(args.assets, os.path.abspath(args.output))
+    count = write_archive(args.output, paths, variant_heights)
+    size = os.path.getsize(args.output)
+    print(f"Упаковано изображений: {count}, размер архива: {size / 1024 / 1024:.1f} МБ ({args.output})")
+    pygame.quit()
+
+if __name__ == "__main__":
+    pack_assets()